@@ -0,0 +1,109 @@
+import os
+from typing import Tuple
+import numpy as np
+
+CHUNK_ROWS = 20000  # rows hashed per matrix product while building
+
+class LSHIndex:
+    """Approximate cosine nearest neighbours by random-hyperplane LSH.
+
+    Every vector gets an n_bits code per table (the signs of its projections
+    on random hyperplanes). A query collects the rows sharing its bucket, or
+    a bucket one bit away, in each table; rows found in the most tables are
+    re-ranked exactly against the stored vectors. Vectors are stored as int8
+    with a scale per row (see quantize()), a quarter of their float32 size.
+    All arrays are saved as .npy files and memory-mapped on load, so opening
+    an index of 500k titles reads almost nothing until it is queried.
+    """
+
+    def __init__(self, vectors: np.ndarray, scales: np.ndarray, planes: np.ndarray,
+                 sorted_codes: np.ndarray, order: np.ndarray):
+        self.vectors = vectors
+        self.scales = scales
+        self.planes = planes
+        self.sorted_codes = sorted_codes
+        self.order = order
+        self.n_tables, self.n_bits = planes.shape[0], planes.shape[1]
+        self._bit_values = (1 << np.arange(self.n_bits)).astype(np.uint32)
+        # Probe the query's own bucket plus every bucket differing in one bit
+        self._probe_masks = np.concatenate(([0], self._bit_values)).astype(np.uint32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, scales: np.ndarray, n_tables: int = 24, n_bits: int = 14,
+              seed: int = 0) -> 'LSHIndex':
+        """Hash quantized vectors (arrays or memory-mapped .npy files) chunk by chunk"""
+        rng = np.random.default_rng(seed)
+        planes = rng.standard_normal((n_tables, n_bits, vectors.shape[1])).astype(np.float32)
+        codes = np.empty((n_tables, len(vectors)), dtype=np.uint16)
+        index = cls(vectors, scales, planes, codes, None)
+
+        for start in range(0, len(vectors), CHUNK_ROWS):
+            # The sign of a projection doesn't depend on the row's scale
+            chunk = np.asarray(vectors[start:start + CHUNK_ROWS], dtype=np.float32)
+            codes[:, start:start + len(chunk)] = index._codes(chunk).T
+
+        index.order = np.argsort(codes, axis=1, kind='stable').astype(np.int32)
+        index.sorted_codes = np.take_along_axis(codes, index.order, axis=1)
+        return index
+
+    def save(self, directory: str):
+        """Write the hash tables; the vectors are expected at directory/vectors.npy and scales.npy"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "lsh_planes.npy"), self.planes)
+        np.save(os.path.join(directory, "lsh_codes.npy"), self.sorted_codes)
+        np.save(os.path.join(directory, "lsh_order.npy"), self.order)
+
+    @classmethod
+    def load(cls, directory: str) -> 'LSHIndex':
+        return cls(*(load_mapped(os.path.join(directory, name)) for name in (
+            "vectors.npy", "scales.npy", "lsh_planes.npy", "lsh_codes.npy", "lsh_order.npy"
+        )))
+
+    def query(self, vector: np.ndarray, k: int = 200, max_candidates: int = 2000) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of (approximately) the k nearest vectors and their cosine scores, best first"""
+        if not len(self.vectors) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query_codes = self._codes(vector[np.newaxis, :].astype(np.float32))[0]
+        hits = []
+        for table in range(self.n_tables):
+            # Same dtype as the codes, or searchsorted converts the whole table on every call
+            probes = (query_codes[table] ^ self._probe_masks).astype(np.uint16)
+            codes = self.sorted_codes[table]
+            starts = np.searchsorted(codes, probes, side='left')
+            ends = np.searchsorted(codes, probes, side='right')
+            order = self.order[table]
+            hits.extend(order[start:end] for start, end in zip(starts, ends) if end > start)
+        if not hits:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Rows colliding with the query in more tables are more likely to be close to it
+        counts = np.bincount(np.concatenate(hits), minlength=len(self.vectors))
+        candidates = np.flatnonzero(counts)
+        if len(candidates) > max_candidates:
+            keep = np.argpartition(-counts[candidates], max_candidates - 1)[:max_candidates]
+            candidates = np.sort(candidates[keep])
+
+        scores = (self.vectors[candidates] @ vector.astype(np.float32)) * self.scales[candidates]
+        k = min(k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return candidates[best], scores[best]
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        """(rows, n_tables) bucket codes"""
+        projections = np.einsum('nd,tbd->ntb', vectors, self.planes)
+        return ((projections > 0) @ self._bit_values).astype(np.uint16)
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """int8 rows and the float32 scale restoring each (row ~= int8 row * scale)"""
+    peaks = np.abs(vectors).max(axis=1)
+    scales = np.where(peaks > 0, peaks / 127, 1).astype(np.float32)
+    return np.round(vectors / scales[:, np.newaxis]).astype(np.int8), scales
+
+def load_mapped(path: str) -> np.ndarray:
+    """Memory-map a .npy file read-only, as a plain ndarray (np.memmap adds overhead to every slice)"""
+    return np.load(path, mmap_mode="r").view(np.ndarray)
@@ -0,0 +1,140 @@
+import re
+import json
+import math
+import threading
+from collections import deque
+from typing import Dict
+
+# Upper bounds (milliseconds) of the latency histogram buckets; slower calls go in "+inf"
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def endpoint_name(path: str) -> str:
+    """Collapse ids so /movie/27205/recommendations is reported as /movie/{id}/recommendations"""
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+class _EndpointStats:
+    __slots__ = ("calls", "errors", "retries", "bytes", "cache_hits", "cache_misses",
+                 "coalesced", "latency_total", "latency_max", "samples", "histogram")
+
+    def __init__(self, sample_size: int):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.samples = deque(maxlen=sample_size)
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+class ApiMetrics:
+    """Thread-safe per-endpoint counters for TMDB traffic.
+
+    Percentiles are computed over the most recent sample_size calls of each
+    endpoint; counts, bytes and the histogram cover the whole session.
+    """
+
+    def __init__(self, sample_size: int = 1024):
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _stats(self, endpoint: str) -> _EndpointStats:
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = _EndpointStats(self.sample_size)
+        return stats
+
+    def record_request(self, endpoint: str, seconds: float, nbytes: int, status: int = None):
+        """Record one HTTP attempt; a missing status (connection failure) or >= 400 counts as an error"""
+        latency_ms = seconds * 1000
+        bucket = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                bucket = i
+                break
+
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats.calls += 1
+            stats.bytes += nbytes
+            stats.latency_total += latency_ms
+            stats.latency_max = max(stats.latency_max, latency_ms)
+            stats.samples.append(latency_ms)
+            stats.histogram[bucket] += 1
+            if status is None or status >= 400:
+                stats.errors += 1
+
+    def record_retry(self, endpoint: str):
+        with self._lock:
+            self._stats(endpoint).retries += 1
+
+    def record_cache(self, endpoint: str, hit: bool):
+        with self._lock:
+            stats = self._stats(endpoint)
+            if hit:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+
+    def record_coalesced(self, endpoint: str):
+        """Record a caller that shared another caller's in-flight request"""
+        with self._lock:
+            self._stats(endpoint).coalesced += 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def snapshot(self) -> Dict:
+        """Return a JSON-serializable copy of all counters"""
+        with self._lock:
+            endpoints = {name: self._summarize(stats) for name, stats in sorted(self._endpoints.items())}
+
+        totals = {
+            key: sum(e[key] for e in endpoints.values())
+            for key in ("calls", "errors", "retries", "bytes", "cache_hits", "cache_misses", "coalesced")
+        }
+        lookups = totals["cache_hits"] + totals["cache_misses"]
+        totals["cache_hit_ratio"] = round(totals["cache_hits"] / lookups, 3) if lookups else None
+        return {"endpoints": endpoints, "totals": totals}
+
+    def dump(self, path: str):
+        """Write the snapshot to a JSON file"""
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=2)
+        except OSError as e:
+            print(f"Could not write API metrics to {path}: {e}")
+
+    def _summarize(self, stats: _EndpointStats) -> Dict:
+        samples = sorted(stats.samples)
+        lookups = stats.cache_hits + stats.cache_misses
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + ["+inf"]
+        return {
+            "calls": stats.calls,
+            "errors": stats.errors,
+            "retries": stats.retries,
+            "bytes": stats.bytes,
+            "cache_hits": stats.cache_hits,
+            "cache_misses": stats.cache_misses,
+            "cache_hit_ratio": round(stats.cache_hits / lookups, 3) if lookups else None,
+            "coalesced": stats.coalesced,
+            "latency_ms": {
+                "mean": round(stats.latency_total / stats.calls, 2) if stats.calls else None,
+                "p50": self._percentile(samples, 50),
+                "p95": self._percentile(samples, 95),
+                "p99": self._percentile(samples, 99),
+                "max": round(stats.latency_max, 2) if stats.calls else None,
+                "histogram": dict(zip(labels, stats.histogram)),
+            },
+        }
+
+    def _percentile(self, samples, percentile: float):
+        """Nearest-rank percentile of an already sorted list"""
+        if not samples:
+            return None
+        rank = max(math.ceil(percentile / 100 * len(samples)), 1)
+        return round(samples[rank - 1], 2)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Headless batch recommendations for Entertainment Suggester
+
+Generates recommendations for many watchlist databases (one per profile)
+without opening the GUI, and stores them in each database's
+recommendations table. Profiles run in a pool of worker processes, so the
+run scales with the number of cores; all workers share one on-disk TMDB
+response cache, so a title fetched for one profile is not fetched again for
+the next.
+
+Usage:
+    python batch_recommendations.py profiles/*.db [--workers 4] [--limit 10] [--cache tmdb_cache.db]
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+from config import (
+    RECOMMENDATION_LIMIT, TMDB_CACHE_TTL, TMDB_CACHE_MAX_ENTRIES, TMDB_SHARED_CACHE_PATH, RECOMMENDATION_GRAPH_PATH
+)
+from database import DatabaseManager
+from tmdb_api import TMDBApi
+from recommendation_engine import RecommendationEngine, content_index_directory, build_content_index
+from content_model import ContentIndex
+from local_catalog import open_default_catalog
+from response_cache import SQLiteResponseCache
+from recommendation_graph import RecommendationGraph
+
+_worker_api = None  # one TMDBApi per worker process, reused for every profile it handles
+_worker_graph = None  # likewise the recommendation graph, which all profiles grow together
+
+def _init_worker(cache_path: str, base_url: str = None, graph_path: str = RECOMMENDATION_GRAPH_PATH):
+    global _worker_api, _worker_graph
+    cache = SQLiteResponseCache(cache_path, TMDB_CACHE_TTL, TMDB_CACHE_MAX_ENTRIES)
+    _worker_api = TMDBApi(base_url=base_url, cache=cache, metrics_file=None)
+    _worker_graph = RecommendationGraph(graph_path) if graph_path else None
+
+def recommend_profile(db_path: str, limit: int = RECOMMENDATION_LIMIT) -> Dict:
+    """Recommend for one database and save the result into it; runs in a worker process"""
+    started = time.perf_counter()
+    result = {'db_path': db_path, 'recommendations': 0, 'seconds': 0.0, 'stages': {}, 'error': None}
+    engine = None
+    try:
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"no such database: {db_path}")
+        db = DatabaseManager(db_path)
+        engine = RecommendationEngine(db, _worker_api, snapshot_path=f"{db_path}.snapshot", graph=_worker_graph)
+        recommendations = engine.get_recommendations(limit)
+        result['recommendations'] = db.save_recommendations(recommendations)
+        result['stages'] = engine.last_stage_timings
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        if engine is not None:
+            engine.close()
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+def run_batch(db_paths: List[str], workers: int = None, limit: int = RECOMMENDATION_LIMIT,
+              cache_path: str = TMDB_SHARED_CACHE_PATH, base_url: str = None, progress_callback=None,
+              graph_path: str = RECOMMENDATION_GRAPH_PATH) -> List[Dict]:
+    """Recommend for every database; returns one result dict per database, in completion order"""
+    # Create the cache and the graph (and their WAL mode) once, before the workers race to do it
+    SQLiteResponseCache(cache_path, TMDB_CACHE_TTL, TMDB_CACHE_MAX_ENTRIES)
+    if graph_path:
+        RecommendationGraph(graph_path)
+    # Likewise the catalog's content index: built here once rather than by every worker
+    catalog = open_default_catalog()
+    if catalog and catalog.has_data():
+        version = catalog.version()
+        if ContentIndex.load(content_index_directory(catalog), version) is None:
+            build_content_index(catalog, version)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(cache_path, base_url, graph_path)) as pool:
+        futures = [pool.submit(recommend_profile, db_path, limit) for db_path in db_paths]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if progress_callback:
+                progress_callback(results[-1])
+    return results
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate recommendations for several watchlist databases")
+    parser.add_argument("databases", nargs="+", help="watchlist.db files, one per profile")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--limit", type=int, default=RECOMMENDATION_LIMIT, help="Recommendations per profile")
+    parser.add_argument("--cache", default=TMDB_SHARED_CACHE_PATH, help="Shared TMDB response cache file")
+    parser.add_argument("--graph", default=RECOMMENDATION_GRAPH_PATH, help="Shared recommendation graph file")
+    args = parser.parse_args(argv)
+
+    if not TMDBApi(metrics_file=None).api_key:
+        print("TMDB API key not configured - nothing to do.")
+        return 1
+
+    def report(result):
+        if result['error']:
+            print(f"{result['db_path']}: failed after {result['seconds']:.2f}s - {result['error']}")
+        else:
+            print(f"{result['db_path']}: {result['recommendations']} recommendations in {result['seconds']:.2f}s")
+
+    started = time.perf_counter()
+    results = run_batch(args.databases, args.workers, args.limit, args.cache, progress_callback=report,
+                        graph_path=args.graph)
+    elapsed = time.perf_counter() - started
+
+    failed = sum(1 for result in results if result['error'])
+    busy = sum(result['seconds'] for result in results)
+    print(f"{len(results) - failed}/{len(results)} profiles in {elapsed:.2f}s "
+          f"({busy:.2f}s of profile time, {busy / max(elapsed, 1e-9):.1f}x parallel)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
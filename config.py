@@ -6,11 +6,22 @@ This file contains application settings and configuration options.
 Modify these values to customize the application behavior.
 """
 
+import os
+
 # TMDB API Configuration
 # Get your free API key from: https://www.themoviedb.org/settings/api
 # Replace the placeholder below with your actual API key
 TMDB_API_KEY = "4442a3c5164c166f59a9c39c70633dfb"
 
+# Base URL of the TMDB API. Point this (or the TMDB_BASE_URL environment
+# variable) at mock_tmdb_server.py to run without the live service.
+TMDB_BASE_URL = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+TMDB_TIMEOUT = 10       # seconds per HTTP request
+TMDB_MAX_RETRIES = 2    # retries for rate-limited (429) and 5xx responses
+TMDB_CACHE_TTL = 600    # seconds a TMDB response is reused before fetching it again
+TMDB_CACHE_MAX_ENTRIES = 2000
+TMDB_SHARED_CACHE_PATH = "tmdb_cache.db"  # response cache shared by the processes of batch_recommendations.py
+
 # Database Configuration
 DATABASE_PATH = "watchlist.db"
 
@@ -23,6 +34,43 @@ RECOMMENDATION_LIMIT = 10
 RATING_THRESHOLD = 7.0  # Minimum rating to consider as "liked"
 TRENDING_WEIGHT = 0.3   # Weight for trending content in recommendations
 GENRE_WEIGHT = 0.7      # Weight for genre preferences in recommendations
+PREFERENCE_HALF_LIFE_DAYS = 365  # A title's influence on preferences halves every this many days since it was watched
+RECOMMENDATION_MAX_PAGES = 5  # Most TMDB list pages a source may pull while looking for candidates
+RECOMMENDATION_DEADLINE = 8.0  # Seconds the TMDB-backed sources get, together, per recommendation run
+RECOMMENDATION_POOL_FACTOR = 5  # Candidates kept for re-ranking, as a multiple of the number shown
+RECOMMENDATION_DIVERSITY = 0.3  # 0 ranks by score alone; higher values favour variety (MMR trade-off)
+RECOMMENDATIONS_PER_GENRE = 3  # Unwatched titles the genre source looks for in each favourite genre
+RECOMMENDATION_FAVOURITES = 5  # Highly rated titles the similar-content source wants recommendations for
+RECOMMENDATIONS_PER_FAVOURITE = 2  # Unwatched recommendations it looks for per highly rated title
+RECOMMENDATION_GRAPH_PATH = "recommendation_graph.db"  # graph of TMDB recommendation lists shared by the profiles of batch_recommendations.py
+RECOMMENDATION_GRAPH_TTL = 7 * 24 * 3600  # Seconds a title's stored recommendations are used before fetching them again
+RECOMMENDATION_GRAPH_RESTART = 0.15  # Chance per step that the graph walk jumps back to a favourite
+CONTENT_MODEL_DIM = 1024                 # Hashed feature dimensions of the content-based model
+CONTENT_MODEL_MAX_CANDIDATES = 50000    # Most popular offline catalog titles loaded into the model without an index
+CONTENT_INDEX_MAX_ITEMS = 500000        # Most popular offline catalog titles in the persisted vector index
+CONTENT_INDEX_DIR = None                # Where that index is kept; defaults to <catalog path>.content_index
+ANN_TABLES = 24                         # LSH hash tables of the vector index
+ANN_BITS = 14                           # Hyperplanes (code bits) per table
+ANN_MAX_CANDIDATES = 2000               # Most index rows re-ranked exactly per query
+
+# Offline Catalog Settings
+# Path of a catalog built with local_catalog.py from TMDB's daily ID exports.
+# When set (and the file exists) search, discover and trending are answered locally.
+LOCAL_CATALOG_PATH = None
+CATALOG_BATCH_SIZE = 10000  # Rows per bulk insert transaction while ingesting
+
+# Metadata Backfill Settings
+BACKFILL_WORKERS = 4           # Concurrent TMDB lookups
+BACKFILL_BATCH_SIZE = 25       # Rows written (and checkpointed) per transaction
+BACKFILL_MATCH_THRESHOLD = 85  # Minimum fuzzy title score to accept a search match
+
+# Poster Cache Settings
+POSTER_CACHE_DIR = "poster_cache"
+POSTER_CACHE_MAX_MB = 200          # Disk cap; least recently used posters are evicted
+POSTER_MEMORY_CACHE_MB = 32        # QPixmapCache limit for decoded posters
+POSTER_THUMBNAIL_SIZE = (92, 138)  # Width, height of pre-scaled thumbnails
+POSTER_DOWNLOAD_WORKERS = 4
+POSTER_RETRY_SECONDS = 300         # A poster that failed to download is tried again after this; 404s never are
 
 # UI Settings
 AUTO_REFRESH_INTERVAL = 30000  # milliseconds (30 seconds)
@@ -103,7 +151,8 @@ MAX_RATING = 10.0
 
 # Debug Settings
 DEBUG_MODE = False
-LOG_API_REQUESTS = False
+LOG_API_REQUESTS = False  # Print every TMDB request with its status, latency and size
+API_METRICS_FILE = None   # e.g. "api_metrics.json" to dump TMDBApi.metrics() on exit
 VERBOSE_RECOMMENDATIONS = False
 
 # Feature Flags
@@ -163,6 +212,10 @@ def get_tmdb_api_key():
     """Get the TMDB API key from configuration"""
     return TMDB_API_KEY if TMDB_API_KEY != "YOUR_TMDB_API_KEY_HERE" else None
 
+def get_tmdb_base_url():
+    """Get the TMDB API base URL"""
+    return TMDB_BASE_URL
+
 def is_tmdb_configured():
     """Check if TMDB API key is properly configured"""
     return get_tmdb_api_key() is not None
@@ -0,0 +1,340 @@
+import os
+import re
+import json
+import math
+import zlib
+import mmap
+import shutil
+import itertools
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from numpy.lib.format import open_memmap
+from ann_index import LSHIndex, quantize, load_mapped
+from config import CONTENT_MODEL_DIM, ANN_TABLES, ANN_BITS, ANN_MAX_CANDIDATES
+
+# Relative weight of each feature block in the combined vector (each block is L2-normalized first)
+BLOCK_WEIGHTS = {'genre': 1.0, 'people': 0.8, 'overview': 0.6, 'language': 0.3, 'year': 0.3}
+YEAR_BUCKET = 5  # years per bucket of the era feature
+BUILD_CHUNK_ROWS = 1000  # items vectorized per write while building a ContentIndex
+
+STOP_WORDS = frozenset("""
+    the and for with that this from his her their they them who what when where which while into
+    after before about over under will has have had was were are been being its it's one two
+    new own out off all any but not can find must only more most than then there these those your
+    life world man woman young story film series show time year years day days way back
+""".split())
+
+def item_from_library(row: Dict) -> Dict:
+    """Model item for a row of the content table"""
+    people = []
+    for field in ('director', 'actors'):
+        people.extend(name.strip() for name in (row.get(field) or '').split(',') if name.strip())
+    return {
+        'key': (row.get('type'), row.get('tmdb_id') or f"library:{row.get('id')}"),
+        'genres': [g.strip() for g in (row.get('genre') or '').split(',') if g.strip()],
+        'people': people,
+        'language': row.get('language') or '',
+        'year': row.get('year'),
+        'overview': row.get('overview') or ''
+    }
+
+def item_from_result(result: Dict, genre_map: Dict[int, str]) -> Dict:
+    """Model item for a TMDB list result; the result itself is kept for formatting recommendations"""
+    content_type = result.get('media_type') or ('movie' if 'title' in result else 'tv')
+    date_field = result.get('release_date') or result.get('first_air_date') or ''
+    return {
+        'key': (content_type, result.get('id')),
+        'genres': [genre_map[g] for g in result.get('genre_ids', []) if g in genre_map],
+        'people': [],
+        'language': result.get('original_language') or '',
+        'year': int(date_field[:4]) if date_field[:4].isdigit() else None,
+        'overview': result.get('overview') or '',
+        'result': result
+    }
+
+def encode_key(key) -> Optional[int]:
+    """(type, tmdb_id) as one int64; None for keys without a TMDB id"""
+    content_type, tmdb_id = key
+    if not isinstance(tmdb_id, int):
+        return None
+    return tmdb_id * 2 + (content_type == 'tv')
+
+def _feature_index(feature: str, dim: int) -> int:
+    # crc32 rather than hash(): string hashes are salted per process
+    return zlib.crc32(feature.encode('utf-8')) % dim
+
+class ContentModel:
+    """Content-based similarity over hashed metadata features and TF-IDF of overviews.
+
+    Items are dicts as built by item_from_library() / item_from_result().
+    Features are hashed into a fixed number of dimensions, so items can be
+    appended without re-vectorizing the rest; only when the collection has
+    doubled since the last fit are the IDF weights recomputed for all rows.
+
+    A ContentIndex can be attached as the base collection: its items are
+    searched through the index, the items added here are searched by brute
+    force, and the IDF weights are the base's (frozen).
+    """
+
+    def __init__(self, dim: int = CONTENT_MODEL_DIM, base: Optional['ContentIndex'] = None):
+        self.dim = base.dim if base is not None else dim
+        self.base = base
+        self.items = []
+        self._rows = {}  # item key -> row of the matrix
+        self._terms = []
+        self._doc_freq = np.zeros(self.dim, dtype=np.int32)
+        self._idf = base.idf if base is not None else None
+        self._idf_docs = 0
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.items) + (len(self.base) if self.base is not None else 0)
+
+    def __contains__(self, key):
+        return key in self._rows or (self.base is not None and key in self.base)
+
+    def add_items(self, items: Iterable[Dict]) -> int:
+        """Append items not already in the model; returns how many were added"""
+        new_items = []
+        for item in items:
+            if item['key'] not in self:
+                self._rows[item['key']] = len(self.items) + len(new_items)
+                new_items.append(item)
+        if not new_items:
+            return 0
+
+        new_terms = [self._overview_terms(item['overview']) for item in new_items]
+        for indices, _ in new_terms:
+            self._doc_freq[indices] += 1
+        self.items.extend(new_items)
+        self._terms.extend(new_terms)
+
+        if self._idf is None or (self.base is None and len(self.items) >= 2 * self._idf_docs):
+            self._fit()
+        else:
+            rows = np.stack([self._vectorize(item, terms) for item, terms in zip(new_items, new_terms)])
+            self._append_rows(rows)
+        return len(new_items)
+
+    def vectorize(self, item: Dict) -> np.ndarray:
+        """Unit-length feature vector of an item (which need not be in the model)"""
+        if self._idf is None:
+            self._fit()
+        return self._vectorize(item, self._overview_terms(item['overview']))
+
+    def vectorize_many(self, items: Sequence[Dict]) -> np.ndarray:
+        if not items:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.vectorize(item) for item in items])
+
+    def profile(self, vectors: np.ndarray, weights: Optional[Sequence[float]] = None) -> np.ndarray:
+        """Unit-length weighted mean of item vectors, e.g. of everything a user rated highly"""
+        if not len(vectors):
+            return np.zeros(self.dim, dtype=np.float32)
+        weights = np.ones(len(vectors), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        return _normalize(weights @ vectors)
+
+    def top_k(self, query: np.ndarray, k: int, exclude: Iterable = ()) -> List[Tuple[Dict, float]]:
+        """The k items most similar (cosine) to query, best first, skipping items whose key is in exclude"""
+        exclude = set(exclude)
+        matches = self._top_k_added(query, k, exclude)
+        if self.base is not None:
+            matches = sorted(matches + self.base.top_k(query, k, exclude), key=lambda match: -match[1])[:k]
+        return matches
+
+    def similar(self, item: Dict, k: int = 10) -> List[Tuple[Dict, float]]:
+        return self.top_k(self.vectorize(item), k, exclude={item['key']})
+
+    def _top_k_added(self, query: np.ndarray, k: int, exclude: set) -> List[Tuple[Dict, float]]:
+        size = len(self.items)
+        if not size or k <= 0:
+            return []
+
+        scores = self._matrix[:size] @ query
+        excluded = [self._rows[key] for key in exclude if key in self._rows]
+        if excluded:
+            scores[excluded] = -np.inf
+        k = min(k, size - len(excluded))
+        if k <= 0:
+            return []
+
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.items[i], float(scores[i])) for i in best]
+
+    def _fit(self):
+        """(Re)compute IDF weights and every row vector"""
+        self._idf_docs = max(len(self.items), 1)
+        self._idf = _idf(self._doc_freq, self._idf_docs)
+        self._matrix = np.zeros((max(len(self.items), 16), self.dim), dtype=np.float32)
+        for row, (item, terms) in enumerate(zip(self.items, self._terms)):
+            self._matrix[row] = self._vectorize(item, terms)
+
+    def _append_rows(self, rows: np.ndarray):
+        start = len(self.items) - len(rows)
+        if len(self.items) > len(self._matrix):
+            # Grow geometrically so repeated appends stay amortized O(1) per row
+            grown = np.zeros((max(len(self.items), 2 * len(self._matrix)), self.dim), dtype=np.float32)
+            grown[:start] = self._matrix[:start]
+            self._matrix = grown
+        self._matrix[start:len(self.items)] = rows
+
+    def _overview_terms(self, overview: str):
+        counts = {}
+        for word in re.findall(r"[a-z]{3,}", overview.lower()):
+            if word not in STOP_WORDS:
+                index = _feature_index(f"w:{word}", self.dim)
+                counts[index] = counts.get(index, 0) + 1
+        return np.fromiter(counts.keys(), dtype=np.int64, count=len(counts)), \
+            np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+    def _vectorize(self, item: Dict, terms) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        year = item.get('year')
+        blocks = {
+            'genre': [f"g:{g.lower()}" for g in item.get('genres', [])],
+            'people': [f"p:{p.lower()}" for p in item.get('people', [])],
+            'language': [f"l:{item['language'].lower()}"] if item.get('language') else [],
+            'year': [f"y:{year // YEAR_BUCKET}"] if year else []
+        }
+        for block, features in blocks.items():
+            if features:
+                indices = [_feature_index(f, self.dim) for f in features]
+                np.add.at(vector, indices, BLOCK_WEIGHTS[block] / math.sqrt(len(features)))
+
+        indices, counts = terms
+        if len(indices):
+            weights = counts * self._idf[indices]
+            vector[indices] += BLOCK_WEIGHTS['overview'] * weights / np.linalg.norm(weights)
+        return _normalize(vector)
+
+class ContentIndex:
+    """Item vectors of a large collection (the offline catalog), persisted to a directory.
+
+    build() streams the items twice: once to store them and count document
+    frequencies, once to write their (int8-quantized) vectors into a
+    memory-mapped array, in a directory of its own that then replaces
+    the old index, so concurrent builds and readers never see a mix of
+    files. load() maps the arrays instead of reading them, and top_k() asks
+    an LSHIndex for candidates, so a query touches a few thousand stored
+    rows rather than all of them.
+    """
+
+    def __init__(self, directory: str, lsh: LSHIndex, meta: Dict):
+        self.directory = directory
+        self.lsh = lsh
+        self.meta = meta
+        self.dim = meta['dim']
+        self.idf = np.load(os.path.join(directory, "idf.npy"))
+        self._keys = load_mapped(os.path.join(directory, "keys.npy"))
+        self._sorted_keys = load_mapped(os.path.join(directory, "sorted_keys.npy"))
+        self._offsets = load_mapped(os.path.join(directory, "item_offsets.npy"))
+        self._items = None  # items.jsonl, mapped on the first query and kept open
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        encoded = encode_key(key)
+        if encoded is None or not len(self._sorted_keys):
+            return False
+        position = np.searchsorted(self._sorted_keys, encoded)
+        return position < len(self._sorted_keys) and self._sorted_keys[position] == encoded
+
+    @classmethod
+    def build(cls, directory: str, items: Iterable[Dict], dim: int = CONTENT_MODEL_DIM,
+              version: Optional[str] = None) -> 'ContentIndex':
+        """Write an index of items (those with a TMDB id) to directory and load it"""
+        target = directory
+        directory = f"{target}.build-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        meta_path = os.path.join(directory, "meta.json")
+        model = ContentModel(dim)
+        items_path = os.path.join(directory, "items.jsonl")
+
+        keys, offsets, seen = [], [0], set()
+        doc_freq = np.zeros(dim, dtype=np.int64)
+        with open(items_path, 'wb') as f:
+            for item in items:
+                encoded = encode_key(item['key'])
+                if encoded is None or encoded in seen:
+                    continue
+                seen.add(encoded)
+                doc_freq[model._overview_terms(item['overview'])[0]] += 1
+                keys.append(encoded)
+                offsets.append(offsets[-1] + f.write(json.dumps(item).encode('utf-8') + b"\n"))
+
+        keys = np.array(keys, dtype=np.int64)
+        np.save(os.path.join(directory, "keys.npy"), keys)
+        np.save(os.path.join(directory, "sorted_keys.npy"), np.sort(keys))
+        np.save(os.path.join(directory, "item_offsets.npy"), np.array(offsets, dtype=np.int64))
+        model._idf = _idf(doc_freq, max(len(keys), 1))
+        np.save(os.path.join(directory, "idf.npy"), model._idf)
+
+        vectors = open_memmap(os.path.join(directory, "vectors.npy"), mode='w+',
+                              dtype=np.int8, shape=(len(keys), dim))
+        scales = np.empty(len(keys), dtype=np.float32)
+        with open(items_path, 'rb') as f:
+            start = 0
+            while start < len(keys):
+                chunk = model.vectorize_many([json.loads(line) for line in itertools.islice(f, BUILD_CHUNK_ROWS)])
+                vectors[start:start + len(chunk)], scales[start:start + len(chunk)] = quantize(chunk)
+                start += len(chunk)
+        vectors.flush()
+        np.save(os.path.join(directory, "scales.npy"), scales)
+
+        LSHIndex.build(vectors, scales, ANN_TABLES, ANN_BITS).save(directory)
+        del vectors
+        with open(meta_path, 'w') as f:
+            json.dump({'dim': dim, 'count': len(keys), 'version': version}, f)
+
+        # Swap the finished index in; if another build got there first in between, theirs is kept
+        replaced = f"{directory}.old"
+        try:
+            os.rename(target, replaced)
+        except FileNotFoundError:
+            pass
+        try:
+            os.rename(directory, target)
+        except OSError:
+            if not os.path.exists(target):
+                raise
+            shutil.rmtree(directory, ignore_errors=True)
+        shutil.rmtree(replaced, ignore_errors=True)
+        return cls.load(target)
+
+    @classmethod
+    def load(cls, directory: str, version: Optional[str] = None) -> Optional['ContentIndex']:
+        """The index stored in directory, or None if there is none (or it was built from another version)"""
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if version is not None and meta.get('version') != version:
+            return None
+        return cls(directory, LSHIndex.load(directory), meta)
+
+    def top_k(self, query: np.ndarray, k: int, exclude: Iterable = ()) -> List[Tuple[Dict, float]]:
+        """Approximately the k stored items most similar to query, best first"""
+        excluded = sum(1 for key in exclude if key in self)
+        rows, scores = self.lsh.query(query, k + excluded, ANN_MAX_CANDIDATES)
+        if len(rows) and self._items is None:
+            with open(os.path.join(self.directory, "items.jsonl"), 'rb') as f:
+                self._items = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        matches = []
+        for row, score in zip(rows, scores):
+            item = json.loads(self._items[self._offsets[row]:self._offsets[row + 1]])
+            item['key'] = tuple(item['key'])
+            if item['key'] not in exclude:
+                matches.append((item, float(score)))
+        return matches[:k]
+
+def _idf(doc_freq: np.ndarray, docs: int) -> np.ndarray:
+    return (np.log((1 + docs) / (1 + doc_freq)) + 1).astype(np.float32)
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -1,11 +1,27 @@
 import sqlite3
 import json
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from datetime import datetime, date
+from typing import List, Dict, Optional, Sequence, Tuple
+from people_index import ROLES, split_people, credited_people, person_ids
+from preference_model import OVERALL, preference_values, decay_factor, parse_day
+from config import PREFERENCE_HALF_LIFE_DAYS
+
+# Columns that decide which preference totals a content row counts towards
+PREFERENCE_FIELDS = frozenset(('genre', 'language', 'platform', 'year', 'rating', 'status', 'date_watched'))
+# Columns the people index is built from
+PEOPLE_FIELDS = frozenset(('director', 'actors'))
+# Rows the metadata backfill still has to look up
+INCOMPLETE_CONTENT_WHERE = """
+    id > ? AND (
+        tmdb_id IS NULL OR poster_url IS NULL OR poster_url = ''
+        OR director IS NULL OR director = '' OR duration IS NULL
+    )
+"""
 
 class DatabaseManager:
     def __init__(self, db_path: str = "watchlist.db"):
         self.db_path = db_path
+        self.half_life_days = PREFERENCE_HALF_LIFE_DAYS
         self.init_database()
     
     def init_database(self):
@@ -61,7 +77,76 @@ class DatabaseManager:
             )
         """)
         
+        # Key/value state for background jobs (checkpoints etc.)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS app_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+        
+        # Running decayed rating totals per genre, language, platform and decade of rated watched content,
+        # kept current on every write; weights are relative to the day in app_state 'preference_stats_day'
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS preference_stats (
+                dimension TEXT NOT NULL,
+                value TEXT NOT NULL,
+                weight_sum REAL NOT NULL DEFAULT 0,
+                rating_sum REAL NOT NULL DEFAULT 0,
+                titles INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, value)
+            ) WITHOUT ROWID
+        """)
+        # The genre-only totals they replace
+        cursor.execute("DROP TABLE IF EXISTS genre_stats")
+        cursor.execute("DELETE FROM app_state WHERE key = 'genre_stats_ready'")
+        
+        # Bump a version counter on every library change so caches know when to rebuild
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS content_version_{event.lower()}
+                AFTER {event} ON content
+                BEGIN
+                    INSERT INTO app_state (key, value) VALUES ('content_version', '1')
+                    ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1;
+                END
+            """)
+        
+        # Directors/creators and main actors of every title, one row per credit
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS people (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                name_key TEXT NOT NULL UNIQUE
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS content_people (
+                person_id INTEGER NOT NULL,
+                content_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                PRIMARY KEY (person_id, role, content_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_content_people_content ON content_people (content_id)")
+        
+        # Random id of this database, so state saved elsewhere for it is never taken for another's
+        cursor.execute("INSERT OR IGNORE INTO app_state (key, value) VALUES ('database_id', lower(hex(randomblob(8))))")
+        
         conn.commit()
+        
+        # Databases created before preference_stats existed (or with another half-life) get them computed once
+        cursor.execute("SELECT value FROM app_state WHERE key = 'preference_stats_ready'")
+        row = cursor.fetchone()
+        if row is None or float(row[0]) != self.half_life_days:
+            self._rebuild_preference_stats(cursor)
+            conn.commit()
+        
+        # Likewise the people index
+        cursor.execute("SELECT 1 FROM app_state WHERE key = 'people_index_ready'")
+        if cursor.fetchone() is None:
+            self._rebuild_people_index(cursor)
+            conn.commit()
         conn.close()
     
     def add_content(self, content_data: Dict) -> int:
@@ -69,6 +154,32 @@ class DatabaseManager:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        content_id = self._insert_row(cursor, content_data)
+        conn.commit()
+        conn.close()
+        return content_id
+    
+    def add_content_batch(self, contents: List[Dict]) -> int:
+        """Add several movies or TV shows in a single transaction"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        added = 0
+        
+        try:
+            for content_data in contents:
+                self._insert_row(cursor, content_data)
+                added += 1
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return added
+    
+    def _insert_row(self, cursor, content_data: Dict) -> int:
+        """INSERT one content row and index its people"""
         cursor.execute("""
             INSERT INTO content (
                 title, type, genre, language, rating, platform, date_watched,
@@ -93,8 +204,8 @@ class DatabaseManager:
         ))
         
         content_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        self._apply_preference_stats(cursor, self._preference_row(cursor, content_id), 1)
+        self._index_people(cursor, content_id, content_data.get('director'), content_data.get('actors'))
         return content_id
     
     def get_all_content(self, status: str = None) -> List[Dict]:
@@ -118,21 +229,252 @@ class DatabaseManager:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        success = self._update_row(cursor, content_id, content_data)
+        conn.commit()
+        conn.close()
+        return success
+    
+    def update_content_batch(self, updates: List[Tuple[int, Dict]]) -> int:
+        """Apply several (content_id, content_data) updates in a single transaction"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        updated = 0
+        
+        try:
+            for content_id, content_data in updates:
+                if not content_data:
+                    continue
+                updated += self._update_row(cursor, content_id, content_data)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return updated
+    
+    def _update_row(self, cursor, content_id: int, content_data: Dict) -> bool:
+        """UPDATE one content row, moving it between preference totals and re-indexing its people if needed"""
+        tracked = not PREFERENCE_FIELDS.isdisjoint(content_data)
+        if tracked:
+            self._apply_preference_stats(cursor, self._preference_row(cursor, content_id), -1)
+        
         set_clause = ", ".join([f"{key} = ?" for key in content_data.keys()])
         values = list(content_data.values()) + [content_id]
-        
         cursor.execute(f"UPDATE content SET {set_clause} WHERE id = ?", values)
-        
         success = cursor.rowcount > 0
+        
+        if tracked:
+            self._apply_preference_stats(cursor, self._preference_row(cursor, content_id), 1)
+        if success and not PEOPLE_FIELDS.isdisjoint(content_data):
+            cursor.execute("SELECT director, actors FROM content WHERE id = ?", (content_id,))
+            self._index_people(cursor, content_id, *cursor.fetchone())
+        return success
+    
+    def _preference_row(self, cursor, content_id: int) -> Optional[Tuple]:
+        cursor.execute("""
+            SELECT genre, language, platform, year, rating, COALESCE(NULLIF(date_watched, ''), created_at), status
+            FROM content WHERE id = ?
+        """, (content_id,))
+        return cursor.fetchone()
+    
+    def _apply_preference_stats(self, cursor, row: Optional[Tuple], sign: int):
+        """Add (sign=1) or remove (sign=-1) one row's decayed rating from its preference totals"""
+        if not row:
+            return
+        genre, language, platform, year, rating, watched, status = row
+        if status != 'watched' or not rating or float(rating) <= 0:
+            return
+        
+        weight = decay_factor(self._preference_day(cursor) - parse_day(watched), self.half_life_days)
+        cursor.executemany("""
+            INSERT INTO preference_stats (dimension, value, weight_sum, rating_sum, titles) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (dimension, value) DO UPDATE SET
+                weight_sum = weight_sum + excluded.weight_sum,
+                rating_sum = rating_sum + excluded.rating_sum,
+                titles = titles + excluded.titles
+        """, [(dimension, value, sign * weight, sign * weight * float(rating), sign)
+              for dimension, value in preference_values(genre, language, platform, year) + [(OVERALL, '')]])
+        if sign < 0:
+            cursor.execute("DELETE FROM preference_stats WHERE titles <= 0")
+    
+    def _preference_day(self, cursor) -> int:
+        """Day the stored weights are relative to; moved to today, rescaling them, once a half-life old"""
+        today = date.today().toordinal()
+        cursor.execute("SELECT value FROM app_state WHERE key = 'preference_stats_day'")
+        row = cursor.fetchone()
+        if row is not None and today - int(row[0]) < self.half_life_days:
+            return int(row[0])
+        if row is not None:
+            # Keeps the sums near 1 rather than letting new titles' weights grow without bound
+            factor = decay_factor(today - int(row[0]), self.half_life_days)
+            cursor.execute("UPDATE preference_stats SET weight_sum = weight_sum * ?, rating_sum = rating_sum * ?",
+                           (factor, factor))
+        cursor.execute("INSERT OR REPLACE INTO app_state (key, value) VALUES ('preference_stats_day', ?)", (str(today),))
+        return today
+    
+    def _rebuild_preference_stats(self, cursor):
+        cursor.execute("DELETE FROM preference_stats")
+        cursor.execute("""
+            SELECT genre, language, platform, year, rating, COALESCE(NULLIF(date_watched, ''), created_at), status
+            FROM content WHERE status = 'watched'
+        """)
+        for row in cursor.fetchall():
+            self._apply_preference_stats(cursor, row, 1)
+        cursor.execute("INSERT OR REPLACE INTO app_state (key, value) VALUES ('preference_stats_ready', ?)",
+                       (str(self.half_life_days),))
+    
+    def _index_people(self, cursor, content_id: int, director: Optional[str], actors: Optional[str]):
+        """Replace one content row's people with those named in its director and actors columns"""
+        cursor.execute("DELETE FROM content_people WHERE content_id = ?", (content_id,))
+        credits = credited_people(split_people(director), split_people(actors))
+        ids = person_ids(cursor, [name for _, name in credits])
+        cursor.executemany(
+            "INSERT OR IGNORE INTO content_people (person_id, content_id, role) VALUES (?, ?, ?)",
+            [(person_id, content_id, role) for person_id, (role, _) in zip(ids, credits)]
+        )
+    
+    def _rebuild_people_index(self, cursor):
+        cursor.execute("DELETE FROM content_people")
+        cursor.execute("SELECT id, director, actors FROM content")
+        for content_id, director, actors in cursor.fetchall():
+            self._index_people(cursor, content_id, director, actors)
+        cursor.execute("INSERT OR REPLACE INTO app_state (key, value) VALUES ('people_index_ready', '1')")
+    
+    def rebuild_preference_stats(self):
+        """Recompute the preference totals from the whole history"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        self._rebuild_preference_stats(cursor)
         conn.commit()
         conn.close()
-        return success
+    
+    def get_preference_stats(self, today: Optional[date] = None) -> Dict[str, Dict[str, Tuple[float, float]]]:
+        """{dimension: {value: (decayed title count, decayed rating sum)}} as of today.
+        
+        The totals over all rated titles are under preference_model.OVERALL;
+        see preference_model.preferences_from_stats().
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM app_state WHERE key = 'preference_stats_day'")
+        row = cursor.fetchone()
+        cursor.execute("SELECT dimension, value, weight_sum, rating_sum FROM preference_stats")
+        rows = cursor.fetchall()
+        conn.close()
+        
+        stats = {}
+        if row is None:
+            return stats
+        factor = decay_factor((today or date.today()).toordinal() - int(row[0]), self.half_life_days)
+        for dimension, value, weight_sum, rating_sum in rows:
+            stats.setdefault(dimension, {})[value] = (weight_sum * factor, rating_sum * factor)
+        return stats
+    
+    def get_rating_history(self) -> List[Tuple]:
+        """(genre, language, platform, year, rating, date watched) of every rated watched title.
+        
+        Titles without a watch date are dated by when they were added.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT genre, language, platform, year, rating, COALESCE(NULLIF(date_watched, ''), created_at)
+            FROM content
+            WHERE status = 'watched' AND rating IS NOT NULL AND rating > 0
+        """)
+        history = cursor.fetchall()
+        conn.close()
+        return history
+    
+    def get_favourite_people(self, min_rating: float, roles: Sequence[str] = ROLES) -> List[Dict]:
+        """People credited on watched titles rated at least min_rating, most loved first.
+        
+        Each entry has the person's name and role, how many such titles they
+        are credited on, and the best rated of them (title and rating).
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT p.name, cp.role, COUNT(*), c.title, MAX(c.rating)
+            FROM content c
+            JOIN content_people cp ON cp.content_id = c.id
+            JOIN people p ON p.id = cp.person_id
+            WHERE c.status = 'watched' AND c.rating >= ? AND cp.role IN ({', '.join('?' * len(roles))})
+            GROUP BY cp.person_id, cp.role
+            ORDER BY MAX(c.rating) DESC, COUNT(*) DESC, p.name
+        """, [min_rating, *roles])
+        
+        columns = ('name', 'role', 'titles', 'title', 'rating')
+        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        conn.close()
+        return results
+    
+    def get_incomplete_content(self, after_id: int = 0, limit: int = None) -> List[Dict]:
+        """Get content missing TMDB metadata (tmdb_id, poster, director or duration), ordered by id"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        query = f"SELECT * FROM content WHERE {INCOMPLETE_CONTENT_WHERE} ORDER BY id"
+        params = [after_id]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        cursor.execute(query, params)
+        
+        columns = [description[0] for description in cursor.description]
+        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        conn.close()
+        return results
+    
+    def count_incomplete_content(self, after_id: int = 0) -> int:
+        """Count the rows get_incomplete_content(after_id) would return"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(f"SELECT COUNT(*) FROM content WHERE {INCOMPLETE_CONTENT_WHERE}", (after_id,))
+        count = cursor.fetchone()[0]
+        
+        conn.close()
+        return count
+    
+    def get_state(self, key: str, default: str = None) -> Optional[str]:
+        """Get a value from the app_state table"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM app_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else default
+    
+    def set_state(self, key: str, value: Optional[str]):
+        """Store a value in the app_state table (None removes the key)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        if value is None:
+            cursor.execute("DELETE FROM app_state WHERE key = ?", (key,))
+        else:
+            cursor.execute(
+                "INSERT OR REPLACE INTO app_state (key, value) VALUES (?, ?)",
+                (key, str(value))
+            )
+        conn.commit()
+        conn.close()
+    
+    def get_content_version(self) -> str:
+        """Token that changes whenever a content row is added, updated or deleted"""
+        return self.get_state('content_version', '0')
     
     def delete_content(self, content_id: int) -> bool:
         """Delete content from database"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        self._apply_preference_stats(cursor, self._preference_row(cursor, content_id), -1)
+        cursor.execute("DELETE FROM content_people WHERE content_id = ?", (content_id,))
         cursor.execute("DELETE FROM content WHERE id = ?", (content_id,))
         
         success = cursor.rowcount > 0
@@ -140,6 +482,42 @@ class DatabaseManager:
         conn.close()
         return success
     
+    def save_recommendations(self, recommendations: List[Dict]) -> int:
+        """Replace the stored recommendations with a new list, in one transaction"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("DELETE FROM recommendations")
+            cursor.executemany("""
+                INSERT INTO recommendations (title, type, reason, score, tmdb_id, poster_url, overview)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (rec['title'], rec['type'], rec.get('reason'), rec.get('score'), rec.get('tmdb_id'),
+                 rec.get('poster_url'), rec.get('overview'))
+                for rec in recommendations
+            ])
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return len(recommendations)
+    
+    def get_saved_recommendations(self) -> List[Dict]:
+        """Get the stored recommendations, best first"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM recommendations ORDER BY score DESC, id")
+        columns = [description[0] for description in cursor.description]
+        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        conn.close()
+        return results
+    
     def get_stats(self) -> Dict:
         """Get viewing statistics"""
         conn = sqlite3.connect(self.db_path)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of Entertainment Suggester recommendations
+
+Builds synthetic watch histories, hides the most recently watched titles of
+each, asks RecommendationEngine for recommendations based on the rest and
+checks how many of the hidden titles it finds (precision@k, recall@k) and
+how much of the candidate catalog it ever recommends (coverage). Per-source
+latency and ranked candidates per second are measured alongside. TMDB is
+served by the mock server, so runs are repeatable and comparable; results
+are written as JSON so two versions can be diffed.
+
+Usage:
+    python evaluate_recommendations.py [--sizes 1000 10000 100000] [--users 3] [--k 9]
+                                       [--latency-ms 20] [--output evaluation.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import statistics
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+from config import APP_VERSION, RECOMMENDATION_MAX_PAGES
+from database import DatabaseManager
+from tmdb_api import TMDBApi
+from recommendation_engine import RecommendationEngine
+from mock_tmdb_server import MockTMDBServer
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+HOLDOUT_SIZE = 10       # most recent titles of each history hidden from the engine
+FAVOURITE_GENRES = 3    # genres each synthetic user prefers
+HISTORY_START = date(2015, 1, 1)
+
+def collect_universe(api: TMDBApi) -> List[Dict]:
+    """Every TMDB result the recommendation sources can reach, one per (id, type)"""
+    results = list(api.iter_trending('all', 'week', max_pages=RECOMMENDATION_MAX_PAGES))
+    for genre_id in api.get_genre_mapping():
+        results += api.get_discover('movie', genres=[genre_id]) + api.get_discover('tv', genres=[genre_id])
+    results += api.get_recommendations(1, 'movie') + api.get_recommendations(1, 'tv')
+
+    universe = {}
+    for result in results:
+        universe.setdefault(result_key(result), result)
+    return list(universe.values())
+
+def result_key(result: Dict) -> Tuple[int, str]:
+    # The same rule scoring.format_recommendation uses to tell movies from shows
+    return (result.get('id'), 'movie' if 'title' in result else 'tv')
+
+def synthetic_history(universe: List[Dict], genre_map: Dict[int, str], size: int,
+                      rng: random.Random, holdout: int = HOLDOUT_SIZE) -> Tuple[List[Dict], List[Dict]]:
+    """(training rows, held-out rows) of a watch history of `size` rows, oldest first.
+
+    The user prefers a few genres. The held-out rows are the latest watches:
+    catalog titles in those genres. Earlier rows mix other such titles with
+    filler titles that exist only in the library.
+    """
+    genre_ids = sorted({g for result in universe for g in result.get('genre_ids', []) if g in genre_map})
+    favourites = set(rng.sample(genre_ids, min(FAVOURITE_GENRES, len(genre_ids))))
+    relevant = [r for r in universe if favourites.intersection(r.get('genre_ids', []))]
+    rng.shuffle(relevant)
+
+    held_out = relevant[:min(holdout, len(relevant), size // 2)]
+    seen = relevant[len(held_out):len(held_out) + (size - len(held_out)) // 2]
+    rows = [_library_row(result, genre_map, rng.uniform(8, 10)) for result in seen]
+    favourite_names = [genre_map[g] for g in sorted(favourites)]
+    other_names = [name for g, name in sorted(genre_map.items()) if g not in favourites]
+    for i in range(size - len(held_out) - len(seen)):
+        liked = rng.random() < 0.7
+        genres = [rng.choice(favourite_names if liked or not other_names else other_names)]
+        if rng.random() < 0.5:
+            genres.append(rng.choice(other_names or favourite_names))
+        rows.append({
+            'title': f"Library Title {i}",
+            'type': rng.choice(['movie', 'tv']),
+            'genre': ", ".join(dict.fromkeys(genres)),
+            'rating': round(rng.uniform(7, 10) if liked else rng.uniform(3, 7), 1),
+            'year': rng.randint(1970, 2024),
+            'status': 'watched'
+        })
+    rng.shuffle(rows)
+
+    history = rows + [_library_row(result, genre_map, rng.uniform(8, 10)) for result in held_out]
+    for day, row in enumerate(history):
+        row['date_watched'] = (HISTORY_START + timedelta(days=day * 3650 // len(history))).isoformat()
+    return history[:len(rows)], history[len(rows):]
+
+def _library_row(result: Dict, genre_map: Dict[int, str], rating: float) -> Dict:
+    tmdb_id, content_type = result_key(result)
+    date_field = result.get('release_date') or result.get('first_air_date') or ''
+    return {
+        'title': result.get('title') or result.get('name'),
+        'type': content_type,
+        'genre': ", ".join(genre_map[g] for g in result.get('genre_ids', []) if g in genre_map),
+        'language': result.get('original_language'),
+        'rating': round(rating, 1),
+        'year': int(date_field[:4]) if date_field[:4].isdigit() else None,
+        'tmdb_id': tmdb_id,
+        'overview': result.get('overview'),
+        'status': 'watched'
+    }
+
+def evaluate_user(base_url: str, universe: List[Dict], genre_map: Dict[int, str], size: int, k: int,
+                  rng: random.Random) -> Dict:
+    """Replay one synthetic history and measure the recommendations made from it"""
+    training, held_out = synthetic_history(universe, genre_map, size, rng)
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = tmp.name
+    engine = None
+    try:
+        db = DatabaseManager(db_path)
+        started = time.perf_counter()
+        db.add_content_batch(training)
+        load_seconds = time.perf_counter() - started
+
+        # A fresh client per run, so no run is answered from another one's response cache
+        engine = RecommendationEngine(db, TMDBApi(api_key="evaluation", base_url=base_url, metrics_file=None))
+        started = time.perf_counter()
+        recommendations = engine.get_recommendations(k)
+        seconds = time.perf_counter() - started
+    finally:
+        if engine is not None:
+            engine.close()
+        os.unlink(db_path)
+
+    wanted = {(row['tmdb_id'], row['type']) for row in held_out}
+    recommended = [(rec['tmdb_id'], rec['type']) for rec in recommendations]
+    hits = len(wanted.intersection(recommended))
+    return {
+        'precision': hits / k,
+        'recall': hits / len(wanted) if wanted else 0.0,
+        'recommended': recommended,
+        'seconds': seconds,
+        'load_seconds': load_seconds,
+        'stages': engine.last_stage_timings,
+        'candidates': engine.last_ranking_counters.get('generated', 0)
+    }
+
+def run_evaluation(sizes: List[int] = DEFAULT_SIZES, users: int = 3, k: int = 9, latency_ms: float = 20,
+                   seed: int = 0, progress=print) -> Dict:
+    """Evaluate every library size; returns the JSON-serializable report"""
+    report = {
+        'app_version': APP_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'settings': {'sizes': sizes, 'users': users, 'k': k, 'latency_ms': latency_ms,
+                     'holdout': HOLDOUT_SIZE, 'seed': seed},
+        'results': []
+    }
+    with MockTMDBServer(latency_ms=latency_ms, synthetic_pages=RECOMMENDATION_MAX_PAGES, seed=seed) as server:
+        api = TMDBApi(api_key="evaluation", base_url=server.base_url, metrics_file=None)
+        universe = collect_universe(api)
+        genre_map = api.get_genre_mapping()
+        rng = random.Random(seed)
+
+        for size in sizes:
+            runs = [evaluate_user(server.base_url, universe, genre_map, size, k, rng) for _ in range(users)]
+            result = summarize(size, runs, len(universe))
+            report['results'].append(result)
+            if progress:
+                progress(f"{size:>7} rows: precision@{k} {result['precision_at_k']:.3f}, "
+                         f"recall@{k} {result['recall_at_k']:.3f}, coverage {result['coverage']:.3f}, "
+                         f"p50 {result['latency']['p50_seconds']:.2f}s, "
+                         f"{result['candidates_per_second']:.0f} candidates/s")
+    return report
+
+def summarize(size: int, runs: List[Dict], universe_size: int) -> Dict:
+    seconds = sorted(run['seconds'] for run in runs)
+    stage_names = sorted({name for run in runs for name in run['stages']})
+    return {
+        'library_size': size,
+        'users': len(runs),
+        'precision_at_k': statistics.mean(run['precision'] for run in runs),
+        'recall_at_k': statistics.mean(run['recall'] for run in runs),
+        # Share of the reachable catalog recommended to anyone
+        'coverage': len({key for run in runs for key in run['recommended']}) / max(universe_size, 1),
+        'latency': {
+            'p50_seconds': statistics.median(seconds),
+            'max_seconds': seconds[-1],
+            'stages': {
+                name: statistics.mean(run['stages'][name]['seconds'] for run in runs if name in run['stages'])
+                for name in stage_names
+            }
+        },
+        'load_seconds': statistics.mean(run['load_seconds'] for run in runs),
+        'candidates_per_second': sum(run['candidates'] for run in runs) / max(sum(seconds), 1e-9)
+    }
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure recommendation quality and speed on synthetic histories")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Library sizes (rows)")
+    parser.add_argument("--users", type=int, default=3, help="Synthetic histories per library size")
+    parser.add_argument("--k", type=int, default=9, help="Recommendations requested per history")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latency added to every mock TMDB request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of printing it")
+    args = parser.parse_args(argv)
+
+    # Progress, and anything the engine prints, goes to stderr: stdout is only the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_evaluation(args.sizes, args.users, args.k, args.latency_ms, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Offline title catalog for Entertainment Suggester
+
+Loads TMDB's daily ID export files (movie_ids_MM_DD_YYYY.json.gz and
+tv_series_ids_MM_DD_YYYY.json.gz from http://files.tmdb.org/p/exports/)
+and cached /movie/{id} or /tv/{id} detail payloads into a local SQLite
+catalog, so search, genre discovery and popularity ranking can be answered
+without calling TMDB. Files are streamed line by line and written in
+batches, so memory use does not grow with the size of the export.
+
+Usage:
+    python local_catalog.py --movies movie_ids_10_18_2026.json.gz \\
+        --tv tv_series_ids_10_18_2026.json.gz --details details_cache/
+"""
+
+import os
+import sys
+import gzip
+import json
+import sqlite3
+import argparse
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from config import LOCAL_CATALOG_PATH, CATALOG_BATCH_SIZE
+from tmdb_records import TitleDetails, decode_json, parse_title_details
+from people_index import ROLES, person_key, credited_people, person_ids
+
+PAGE_SIZE = 20  # results per page, as TMDB returns them
+
+class LocalCatalog:
+    def __init__(self, db_path: str = LOCAL_CATALOG_PATH):
+        self.db_path = db_path
+        self._has_data = None
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    def init_database(self):
+        """Initialize the catalog tables"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS catalog (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL CHECK (type IN ('movie', 'tv')),
+                tmdb_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                popularity REAL DEFAULT 0,
+                year INTEGER,
+                language TEXT,
+                overview TEXT,
+                poster_path TEXT,
+                vote_average REAL,
+                adult INTEGER DEFAULT 0,
+                UNIQUE (type, tmdb_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_genres (
+                genre_id INTEGER NOT NULL,
+                catalog_id INTEGER NOT NULL,
+                PRIMARY KEY (genre_id, catalog_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS genres (
+                genre_id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL
+            )
+        """)
+        # Credits from detail payloads: directors/creators and main actors
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS people (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                name_key TEXT NOT NULL UNIQUE
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_people (
+                person_id INTEGER NOT NULL,
+                catalog_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                PRIMARY KEY (person_id, role, catalog_id)
+            ) WITHOUT ROWID
+        """)
+        # Bumped by every write, so data derived from the catalog knows when it is out of date
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO catalog_state (key, value) VALUES ('version', 0)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_catalog_popularity ON catalog (popularity DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_catalog_type_popularity ON catalog (type, popularity DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_catalog_genres_catalog ON catalog_genres (catalog_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_catalog_people_catalog ON catalog_people (catalog_id)")
+
+        conn.commit()
+        conn.close()
+
+    def has_data(self) -> bool:
+        """Whether anything has been ingested (cached after the first check)"""
+        if self._has_data is None:
+            conn = self._connect()
+            self._has_data = conn.execute("SELECT 1 FROM catalog LIMIT 1").fetchone() is not None
+            conn.close()
+        return self._has_data
+
+    def count(self) -> int:
+        conn = self._connect()
+        total = conn.execute("SELECT COUNT(*) FROM catalog").fetchone()[0]
+        conn.close()
+        return total
+
+    def version(self) -> str:
+        """Changes whenever the catalog is written to; derived data keyed by it is rebuilt"""
+        conn = self._connect()
+        value = conn.execute("SELECT value FROM catalog_state WHERE key = 'version'").fetchone()[0]
+        conn.close()
+        return str(value)
+
+    def _bump_version(self, conn: sqlite3.Connection):
+        conn.execute("UPDATE catalog_state SET value = value + 1 WHERE key = 'version'")
+
+    # Ingestion
+
+    def ingest_id_export(self, path: str, content_type: str, batch_size: int = CATALOG_BATCH_SIZE,
+                         progress_callback: Callable[[int], None] = None) -> int:
+        """Stream a gzipped daily ID export (one JSON object per line) into the catalog.
+
+        Existing rows keep their detail fields; only title and popularity are
+        refreshed. Returns the number of lines ingested.
+        """
+        title_key = "original_title" if content_type == "movie" else "original_name"
+
+        def rows():
+            with gzip.open(path, "rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = decode_json(line)
+                    yield (
+                        content_type, entry["id"], entry.get(title_key) or "",
+                        entry.get("popularity") or 0.0, 1 if entry.get("adult") else 0
+                    )
+
+        return self._write_batches(
+            """
+            INSERT INTO catalog (type, tmdb_id, title, popularity, adult) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (type, tmdb_id) DO UPDATE SET
+                title = excluded.title, popularity = excluded.popularity, adult = excluded.adult
+            """,
+            rows(), batch_size, progress_callback
+        )
+
+    def ingest_detail_files(self, paths: Iterable[str], batch_size: int = CATALOG_BATCH_SIZE,
+                            progress_callback: Callable[[int], None] = None) -> int:
+        """Load cached detail payloads (.json, .json.gz, or JSON-lines files of payloads)"""
+        def records():
+            for path in paths:
+                for payload in self._read_payloads(path):
+                    content_type = "movie" if "title" in payload else "tv"
+                    yield parse_title_details(payload, content_type)
+
+        return self.add_details(records(), batch_size, progress_callback)
+
+    def add_details(self, records: Iterable[TitleDetails], batch_size: int = CATALOG_BATCH_SIZE,
+                    progress_callback: Callable[[int], None] = None) -> int:
+        """Insert or enrich catalog rows from parsed detail records"""
+        conn = self._connect()
+        self._tune_for_bulk_load(conn)
+        cursor = conn.cursor()
+        written = 0
+        pending = 0
+
+        try:
+            for record in records:
+                cursor.execute("""
+                    INSERT INTO catalog (type, tmdb_id, title, popularity, year, language,
+                                         overview, poster_path, vote_average)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (type, tmdb_id) DO UPDATE SET
+                        title = excluded.title, year = excluded.year, language = excluded.language,
+                        overview = excluded.overview, poster_path = excluded.poster_path,
+                        vote_average = excluded.vote_average,
+                        popularity = MAX(catalog.popularity, excluded.popularity)
+                """, (
+                    record.media_type, record.id, record.title, record.popularity, record.year,
+                    record.language, record.overview, record.poster_path, record.vote_average
+                ))
+                catalog_id = cursor.execute(
+                    "SELECT id FROM catalog WHERE type = ? AND tmdb_id = ?", (record.media_type, record.id)
+                ).fetchone()[0]
+
+                cursor.execute("DELETE FROM catalog_genres WHERE catalog_id = ?", (catalog_id,))
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO catalog_genres (genre_id, catalog_id) VALUES (?, ?)",
+                    [(genre_id, catalog_id) for genre_id in record.genre_ids]
+                )
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO genres (genre_id, name) VALUES (?, ?)",
+                    list(zip(record.genre_ids, record.genres))
+                )
+                credits = credited_people(record.directors, record.actors)
+                cursor.execute("DELETE FROM catalog_people WHERE catalog_id = ?", (catalog_id,))
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO catalog_people (person_id, catalog_id, role) VALUES (?, ?, ?)",
+                    [(person_id, catalog_id, role)
+                     for person_id, (role, _) in zip(person_ids(cursor, [name for _, name in credits]), credits)]
+                )
+
+                written += 1
+                pending += 1
+                if pending >= batch_size:
+                    conn.commit()
+                    pending = 0
+                    if progress_callback:
+                        progress_callback(written)
+            self._bump_version(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._has_data = None
+        if progress_callback:
+            progress_callback(written)
+        return written
+
+    def _write_batches(self, statement: str, rows: Iterator[tuple], batch_size: int,
+                       progress_callback: Callable[[int], None] = None) -> int:
+        conn = self._connect()
+        self._tune_for_bulk_load(conn)
+        written = 0
+        batch = []
+
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    conn.executemany(statement, batch)
+                    conn.commit()
+                    written += len(batch)
+                    batch = []
+                    if progress_callback:
+                        progress_callback(written)
+            if batch:
+                conn.executemany(statement, batch)
+                written += len(batch)
+            self._bump_version(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._has_data = None
+        if progress_callback:
+            progress_callback(written)
+        return written
+
+    def _tune_for_bulk_load(self, conn: sqlite3.Connection):
+        # The catalog can always be rebuilt from the export files, so trade durability for speed
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+
+    def _read_payloads(self, path: str) -> Iterator[Dict]:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith((".json", ".json.gz", ".jsonl", ".jsonl.gz")):
+                    yield from self._read_payloads(os.path.join(path, name))
+            return
+
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            if ".jsonl" in path:
+                for line in f:
+                    if line.strip():
+                        yield decode_json(line)
+            else:
+                yield decode_json(f.read())
+
+    # Queries, answered in the same shape as TMDB list results
+
+    def search(self, query: str, content_type: str = "multi", page: int = 1) -> List[Dict]:
+        """Titles containing query, most popular first"""
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where = ["c.title LIKE ? ESCAPE '\\'", "c.adult = 0"]
+        params = [pattern]
+        if content_type in ("movie", "tv"):
+            where.append("c.type = ?")
+            params.append(content_type)
+        return self._query(where, params, page, include_media_type=content_type == "multi")
+
+    def discover(self, content_type: str, genre_ids: List[int] = None, year: int = None,
+                 page: int = 1) -> List[Dict]:
+        """Titles of a type, optionally having all genre_ids and released in year, most popular first"""
+        where = ["c.type = ?", "c.adult = 0"]
+        params = [content_type]
+        for genre_id in genre_ids or []:
+            where.append("c.id IN (SELECT catalog_id FROM catalog_genres WHERE genre_id = ?)")
+            params.append(genre_id)
+        if year:
+            where.append("c.year = ?")
+            params.append(year)
+        return self._query(where, params, page)
+
+    def popular(self, media_type: str = "all", page: int = 1) -> List[Dict]:
+        """Trending-like ranking: the most popular titles"""
+        where = ["c.adult = 0"]
+        params = []
+        if media_type in ("movie", "tv"):
+            where.append("c.type = ?")
+            params.append(media_type)
+        return self._query(where, params, page, include_media_type=True)
+
+    def iter_titles(self) -> Iterator[tuple]:
+        """Stream (type, tmdb_id, title, year, popularity) for every non-adult title"""
+        conn = self._connect()
+        try:
+            yield from conn.execute(
+                "SELECT type, tmdb_id, title, year, popularity FROM catalog WHERE adult = 0"
+            )
+        finally:
+            conn.close()
+
+    def iter_described(self, limit: int = None) -> Iterator[Dict]:
+        """Stream titles that have genres or an overview, most popular first, as TMDB list results"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute("""
+                SELECT c.type, c.tmdb_id, c.title, c.popularity, c.year, c.language, c.overview,
+                       c.poster_path, c.vote_average,
+                       (SELECT GROUP_CONCAT(genre_id) FROM catalog_genres g WHERE g.catalog_id = c.id)
+                FROM catalog c
+                WHERE c.adult = 0 AND (c.overview IS NOT NULL OR
+                      c.id IN (SELECT catalog_id FROM catalog_genres))
+                ORDER BY c.popularity DESC
+                LIMIT ?
+            """, (limit if limit is not None else -1,))
+            for row in cursor:
+                yield self._to_result(row, include_media_type=True)
+        finally:
+            conn.close()
+
+    def sharing_people(self, people: Sequence[Tuple[str, str]], limit: int = PAGE_SIZE) -> List[Dict]:
+        """Titles crediting any of the given (role, name) people, as TMDB list results.
+
+        Each result also has 'shared_people': the given (role, name) pairs it
+        credits. Titles sharing the most people come first, then the most
+        popular.
+        """
+        keys = {(role, person_key(name)) for role, name in people if role in ROLES}
+        if not keys:
+            return []
+        conn = self._connect()
+        try:
+            # Looked up through the person index, so the cost depends on the people's filmographies only
+            name_keys = sorted({key for _, key in keys})
+            shared = {}
+            for start in range(0, len(name_keys), 400):  # stay under SQLite's variable limit
+                chunk = name_keys[start:start + 400]
+                matched = conn.execute(f"""
+                    SELECT cp.catalog_id, cp.role, p.name, p.name_key
+                    FROM people p
+                    JOIN catalog_people cp ON cp.person_id = p.id
+                    WHERE p.name_key IN ({', '.join('?' * len(chunk))})
+                """, chunk)
+                for catalog_id, role, name, name_key in matched:
+                    if (role, name_key) in keys:
+                        shared.setdefault(catalog_id, []).append((role, name))
+            if not shared:
+                return []
+            catalog_ids = list(shared)
+            rows = []
+            for start in range(0, len(catalog_ids), 400):
+                chunk = catalog_ids[start:start + 400]
+                rows += conn.execute(f"""
+                    SELECT c.id, c.type, c.tmdb_id, c.title, c.popularity, c.year, c.language, c.overview,
+                           c.poster_path, c.vote_average,
+                           (SELECT GROUP_CONCAT(genre_id) FROM catalog_genres g WHERE g.catalog_id = c.id)
+                    FROM catalog c
+                    WHERE c.adult = 0 AND c.id IN ({', '.join('?' * len(chunk))})
+                """, chunk).fetchall()
+            rows = sorted(rows, key=lambda row: (-len(shared[row[0]]), -(row[4] or 0)))[:limit]
+        finally:
+            conn.close()
+        results = []
+        for row in rows:
+            result = self._to_result(row[1:], include_media_type=True)
+            result["shared_people"] = shared[row[0]]
+            results.append(result)
+        return results
+
+    def people_of(self, keys: Iterable[Tuple[str, int]], role: str = 'director') -> Dict[Tuple[str, int], Set[str]]:
+        """{(type, tmdb_id): person keys credited in role} for the titles the catalog has credits for"""
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        conn = self._connect()
+        people = {}
+        try:
+            for start in range(0, len(keys), 400):  # stay under SQLite's variable limit
+                chunk = keys[start:start + 400]
+                cursor = conn.execute(f"""
+                    SELECT c.type, c.tmdb_id, p.name_key
+                    FROM catalog c
+                    JOIN catalog_people cp ON cp.catalog_id = c.id
+                    JOIN people p ON p.id = cp.person_id
+                    WHERE cp.role = ? AND ({' OR '.join(['(c.type = ? AND c.tmdb_id = ?)'] * len(chunk))})
+                """, [role] + [value for key in chunk for value in key])
+                for content_type, tmdb_id, name_key in cursor:
+                    people.setdefault((content_type, tmdb_id), set()).add(name_key)
+        finally:
+            conn.close()
+        return people
+
+    def genre_mapping(self) -> Dict[int, str]:
+        conn = self._connect()
+        mapping = dict(conn.execute("SELECT genre_id, name FROM genres").fetchall())
+        conn.close()
+        return mapping
+
+    def _query(self, where: List[str], params: List, page: int, include_media_type: bool = False) -> List[Dict]:
+        conn = self._connect()
+        cursor = conn.execute(f"""
+            SELECT c.type, c.tmdb_id, c.title, c.popularity, c.year, c.language, c.overview,
+                   c.poster_path, c.vote_average,
+                   (SELECT GROUP_CONCAT(genre_id) FROM catalog_genres g WHERE g.catalog_id = c.id)
+            FROM catalog c
+            WHERE {' AND '.join(where)}
+            ORDER BY c.popularity DESC
+            LIMIT ? OFFSET ?
+        """, params + [PAGE_SIZE, (max(page, 1) - 1) * PAGE_SIZE])
+        results = [self._to_result(row, include_media_type) for row in cursor.fetchall()]
+        conn.close()
+        return results
+
+    def _to_result(self, row: tuple, include_media_type: bool) -> Dict:
+        content_type, tmdb_id, title, popularity, year, language, overview, poster_path, vote_average, genres = row
+        is_movie = content_type == "movie"
+        result = {
+            "id": tmdb_id,
+            "title" if is_movie else "name": title,
+            "genre_ids": [int(g) for g in genres.split(",")] if genres else [],
+            "original_language": language or "",
+            "overview": overview or "",
+            "poster_path": poster_path,
+            "popularity": popularity,
+            "vote_average": vote_average or 0,
+        }
+        if year:
+            result["release_date" if is_movie else "first_air_date"] = f"{year}-01-01"
+        if include_media_type:
+            result["media_type"] = content_type
+        return result
+
+def open_default_catalog() -> Optional[LocalCatalog]:
+    """The catalog configured in config.py, if one has been built"""
+    if LOCAL_CATALOG_PATH and os.path.exists(LOCAL_CATALOG_PATH):
+        return LocalCatalog(LOCAL_CATALOG_PATH)
+    return None
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the offline title catalog from TMDB export files")
+    parser.add_argument("--catalog", default=LOCAL_CATALOG_PATH or "catalog.db", help="Catalog database path")
+    parser.add_argument("--movies", action="append", default=[], help="movie_ids_*.json.gz export file")
+    parser.add_argument("--tv", action="append", default=[], help="tv_series_ids_*.json.gz export file")
+    parser.add_argument("--details", action="append", default=[],
+                        help="Detail payload file or directory (.json, .json.gz, .jsonl)")
+    parser.add_argument("--batch-size", type=int, default=CATALOG_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if not (args.movies or args.tv or args.details):
+        parser.error("nothing to ingest - pass --movies, --tv and/or --details")
+
+    catalog = LocalCatalog(args.catalog)
+
+    def report(count):
+        print(f"\r  {count:,} rows", end="", flush=True)
+
+    for content_type, paths in (("movie", args.movies), ("tv", args.tv)):
+        for path in paths:
+            print(f"Ingesting {path}")
+            catalog.ingest_id_export(path, content_type, args.batch_size, report)
+            print()
+    if args.details:
+        print("Ingesting detail payloads")
+        catalog.ingest_detail_files(args.details, args.batch_size, report)
+        print()
+
+    print(f"Catalog {args.catalog} now holds {catalog.count():,} titles")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
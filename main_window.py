@@ -8,24 +8,68 @@ from PyQt6.QtWidgets import (
     QComboBox, QSpinBox, QDoubleSpinBox, QDateEdit, QTextEdit, QLabel,
     QDialog, QFormLayout, QDialogButtonBox, QMessageBox, QFileDialog,
     QProgressBar, QSplitter, QFrame, QScrollArea, QGridLayout,
-    QHeaderView, QAbstractItemView
+    QHeaderView, QAbstractItemView, QListWidget, QListWidgetItem
 )
-from PyQt6.QtCore import Qt, QDate, QThread, pyqtSignal, QTimer
+from PyQt6.QtCore import Qt, QDate, QThread, pyqtSignal, QTimer, QSize
 from PyQt6.QtGui import QPixmap, QFont, QPalette, QColor, QIcon
 import requests
 from database import DatabaseManager
 from tmdb_api import TMDBApi
 from recommendation_engine import RecommendationEngine
+from recommendation_graph import RecommendationGraph
+from metadata_backfill import MetadataBackfill
+from poster_cache import PosterCache
+from title_index import TitleIndex, suggest_titles, merge_suggestions
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import numpy as np
 
+# Worker threads a dialog no longer waits for, kept alive here until they finish
+_finishing_threads = set()
+
+def start_detached(thread):
+    """Start a QThread whose owner may go away before it finishes, without ever waiting for it"""
+    _finishing_threads.add(thread)
+    thread.finished.connect(lambda: _finishing_threads.discard(thread))
+    thread.start()
+
+class SearchThread(QThread):
+    results_ready = pyqtSignal(str, list)
+    
+    def __init__(self, tmdb_api, query):
+        super().__init__()
+        self.tmdb_api = tmdb_api
+        self.query = query
+    
+    def run(self):
+        self.results_ready.emit(self.query, self.tmdb_api.search_content(self.query))
+
+class DetailsThread(QThread):
+    details_ready = pyqtSignal(dict, object)  # the suggestion, its formatted TMDB details or None
+    
+    def __init__(self, tmdb_api, suggestion):
+        super().__init__()
+        self.tmdb_api = tmdb_api
+        self.suggestion = suggestion
+    
+    def run(self):
+        if self.suggestion['type'] == 'movie':
+            details = self.tmdb_api.get_movie_details(self.suggestion['tmdb_id'])
+        else:
+            details = self.tmdb_api.get_tv_details(self.suggestion['tmdb_id'])
+        formatted = self.tmdb_api.format_content_data(details, self.suggestion['type']) if details else None
+        self.details_ready.emit(self.suggestion, formatted)
+
 class ContentDialog(QDialog):
-    def __init__(self, parent=None, content_data=None, tmdb_api=None):
+    def __init__(self, parent=None, content_data=None, tmdb_api=None, title_indexes=None):
         super().__init__(parent)
         self.content_data = content_data or {}
         self.tmdb_api = tmdb_api
+        self.title_indexes = title_indexes or []
+        self.search_thread = None
+        self.details_thread = None
+        self.selected_tmdb = {}
         self.setWindowTitle("Add/Edit Content")
         self.setModal(True)
         self.resize(500, 600)
@@ -41,12 +85,21 @@ class ContentDialog(QDialog):
         search_layout = QHBoxLayout()
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search for movie/TV show...")
+        self.search_input.textEdited.connect(self.update_suggestions)
+        self.search_input.returnPressed.connect(self.search_content)
         self.search_button = QPushButton("Search")
         self.search_button.clicked.connect(self.search_content)
         search_layout.addWidget(self.search_input)
         search_layout.addWidget(self.search_button)
         layout.addLayout(search_layout)
         
+        # Suggestions: instant local matches, extended by TMDB search results
+        self.suggestion_list = QListWidget()
+        self.suggestion_list.setMaximumHeight(160)
+        self.suggestion_list.itemClicked.connect(self.apply_suggestion)
+        self.suggestion_list.hide()
+        layout.addWidget(self.suggestion_list)
+        
         # Form layout
         form_layout = QFormLayout()
         
@@ -105,26 +158,74 @@ class ContentDialog(QDialog):
         
         self.setLayout(layout)
     
+    def update_suggestions(self, text):
+        self.show_suggestions(suggest_titles(self.title_indexes, text))
+    
     def search_content(self):
         query = self.search_input.text().strip()
         if not query or not self.tmdb_api:
             return
         
-        results = self.tmdb_api.search_content(query)
-        if results:
-            # Show first result
-            result = results[0]
-            content_type = 'movie' if 'title' in result else 'tv'
-            
-            # Get detailed information
-            if content_type == 'movie':
-                details = self.tmdb_api.get_movie_details(result['id'])
-            else:
-                details = self.tmdb_api.get_tv_details(result['id'])
-            
-            if details:
-                formatted_data = self.tmdb_api.format_content_data(details, content_type)
-                self.populate_from_tmdb(formatted_data)
+        # A search still running is not waited for; on_search_results() drops its results
+        self.search_thread = SearchThread(self.tmdb_api, query)
+        self.search_thread.results_ready.connect(self.on_search_results)
+        start_detached(self.search_thread)
+    
+    def on_search_results(self, query, results):
+        if query != self.search_input.text().strip():
+            return  # the query changed while this search was running
+        local = suggest_titles(self.title_indexes, query)
+        self.show_suggestions(merge_suggestions(local, results, limit=20))
+    
+    def show_suggestions(self, suggestions):
+        self.suggestion_list.clear()
+        for suggestion in suggestions:
+            label = suggestion['title']
+            if suggestion['year']:
+                label += f" ({suggestion['year']})"
+            label += " · TV" if suggestion['type'] == 'tv' else " · Movie"
+            if suggestion['source'] == 'library':
+                label += " · in your library"
+            item = QListWidgetItem(label)
+            item.setData(Qt.ItemDataRole.UserRole, suggestion)
+            self.suggestion_list.addItem(item)
+        self.suggestion_list.setVisible(bool(suggestions))
+    
+    def apply_suggestion(self, item):
+        suggestion = item.data(Qt.ItemDataRole.UserRole)
+        self.suggestion_list.hide()
+        
+        self.title_input.setText(suggestion['title'])
+        self.type_combo.setCurrentText(suggestion['type'])
+        if suggestion['year']:
+            self.year_input.setValue(suggestion['year'])
+        
+        # The rest of the details come from TMDB, off the UI thread
+        self.selected_tmdb = {}
+        if suggestion['tmdb_id'] and self.tmdb_api:
+            self.details_thread = DetailsThread(self.tmdb_api, suggestion)
+            self.details_thread.details_ready.connect(self.on_details)
+            start_detached(self.details_thread)
+    
+    def on_details(self, suggestion, formatted_data):
+        if not formatted_data or self.details_thread is None or suggestion != self.details_thread.suggestion:
+            return  # another title was picked while these details were fetched
+        self.selected_tmdb = {
+            'tmdb_id': formatted_data.get('tmdb_id'),
+            'poster_url': formatted_data.get('poster_url')
+        }
+        self.populate_from_tmdb(formatted_data)
+    
+    def done(self, result):
+        # Running workers are left to finish on their own; only their results are dropped
+        for thread, signal, slot in ((self.search_thread, 'results_ready', self.on_search_results),
+                                     (self.details_thread, 'details_ready', self.on_details)):
+            if thread is not None:
+                try:
+                    getattr(thread, signal).disconnect(slot)
+                except TypeError:
+                    pass
+        super().done(result)
     
     def populate_from_tmdb(self, data):
         self.title_input.setText(data.get('title', ''))
@@ -173,7 +274,8 @@ class ContentDialog(QDialog):
             'actors': self.actors_input.text(),
             'year': self.year_input.value(),
             'overview': self.overview_input.toPlainText(),
-            'status': self.status_combo.currentText()
+            'status': self.status_combo.currentText(),
+            **self.selected_tmdb
         }
 
 class StatsWidget(QWidget):
@@ -268,11 +370,28 @@ class StatsWidget(QWidget):
         self.figure.tight_layout()
         self.canvas.draw()
 
+class RecommendationThread(QThread):
+    updated = pyqtSignal(list)
+    
+    def __init__(self, recommendation_engine, limit):
+        super().__init__()
+        self.rec_engine = recommendation_engine
+        self.limit = limit
+    
+    def run(self):
+        for recommendations in self.rec_engine.iter_recommendations(self.limit):
+            self.updated.emit(recommendations)
+
 class RecommendationWidget(QWidget):
-    def __init__(self, recommendation_engine):
+    def __init__(self, recommendation_engine, poster_cache=None):
         super().__init__()
         self.rec_engine = recommendation_engine
+        self.poster_cache = poster_cache
+        self.recommendation_thread = None
         self.setup_ui()
+        if self.rec_engine.last_recommendations:
+            # Shown straight away from the snapshot, then replaced by a fresh run
+            self.show_recommendations(self.rec_engine.last_recommendations)
         self.load_recommendations()
     
     def setup_ui(self):
@@ -282,12 +401,16 @@ class RecommendationWidget(QWidget):
         header_layout = QHBoxLayout()
         title = QLabel("Smart Recommendations")
         title.setStyleSheet("font-size: 18px; font-weight: bold; color: #1976D2;")
-        refresh_btn = QPushButton("Refresh")
-        refresh_btn.clicked.connect(self.load_recommendations)
+        self.refresh_btn = QPushButton("Refresh")
+        self.refresh_btn.clicked.connect(self.load_recommendations)
+        self.loading_label = QLabel("Finding recommendations...")
+        self.loading_label.setStyleSheet("color: #666; font-style: italic;")
+        self.loading_label.hide()
         
         header_layout.addWidget(title)
         header_layout.addStretch()
-        header_layout.addWidget(refresh_btn)
+        header_layout.addWidget(self.loading_label)
+        header_layout.addWidget(self.refresh_btn)
         layout.addLayout(header_layout)
         
         # Recommendations scroll area
@@ -301,11 +424,23 @@ class RecommendationWidget(QWidget):
         self.setLayout(layout)
     
     def load_recommendations(self):
-        # Clear existing recommendations
-        for i in reversed(range(self.recommendations_layout.count())):
-            self.recommendations_layout.itemAt(i).widget().setParent(None)
+        if self.recommendation_thread and self.recommendation_thread.isRunning():
+            return
         
-        recommendations = self.rec_engine.get_recommendations(10)
+        # Cards are filled in as each recommendation source finishes
+        self.refresh_btn.setEnabled(False)
+        self.loading_label.show()
+        self.recommendation_thread = RecommendationThread(self.rec_engine, 10)
+        self.recommendation_thread.updated.connect(self.show_recommendations)
+        self.recommendation_thread.finished.connect(self.on_recommendations_finished)
+        self.recommendation_thread.start()
+    
+    def show_recommendations(self, recommendations):
+        # Clear existing recommendations
+        while self.recommendations_layout.count():
+            item = self.recommendations_layout.takeAt(0)
+            if item.widget():
+                item.widget().setParent(None)
         
         for rec in recommendations:
             rec_widget = self.create_recommendation_widget(rec)
@@ -313,6 +448,14 @@ class RecommendationWidget(QWidget):
         
         self.recommendations_layout.addStretch()
     
+    def on_recommendations_finished(self):
+        self.refresh_btn.setEnabled(True)
+        self.loading_label.hide()
+    
+    def stop(self):
+        if self.recommendation_thread and self.recommendation_thread.isRunning():
+            self.recommendation_thread.wait()
+    
     def create_recommendation_widget(self, rec):
         widget = QFrame()
         widget.setFrameStyle(QFrame.Shape.Box)
@@ -328,6 +471,16 @@ class RecommendationWidget(QWidget):
         
         layout = QHBoxLayout(widget)
         
+        # Poster
+        if self.poster_cache and rec.get('poster_url'):
+            poster_label = QLabel()
+            poster_label.setFixedSize(QSize(*self.poster_cache.thumbnail_size))
+            poster_label.setStyleSheet("border: none; padding: 0px; margin: 0px;")
+            pixmap = self.poster_cache.get_pixmap(rec['poster_url'], callback=poster_label.setPixmap)
+            if pixmap:
+                poster_label.setPixmap(pixmap)
+            layout.addWidget(poster_label)
+        
         # Content info
         info_layout = QVBoxLayout()
         
@@ -382,6 +535,28 @@ class RecommendationWidget(QWidget):
         self.rec_engine.db.add_content(content_data)
         QMessageBox.information(self, "Success", f"'{rec['title']}' added to your watchlist!")
 
+class BackfillThread(QThread):
+    progress = pyqtSignal(int, int)
+    completed = pyqtSignal(dict)
+    
+    def __init__(self, backfill):
+        super().__init__()
+        self.backfill = backfill
+    
+    def run(self):
+        stats = self.backfill.run(progress_callback=self.progress.emit)
+        self.completed.emit(stats)
+
+class TitleIndexThread(QThread):
+    completed = pyqtSignal(object)
+    
+    def __init__(self, catalog):
+        super().__init__()
+        self.catalog = catalog
+    
+    def run(self):
+        self.completed.emit(TitleIndex.from_catalog(self.catalog))
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -391,10 +566,21 @@ class MainWindow(QMainWindow):
         # Initialize components
         self.db = DatabaseManager()
         self.tmdb_api = TMDBApi()
-        self.rec_engine = RecommendationEngine(self.db, self.tmdb_api)
+        # Preferences, watched index and the last recommendations are restored from here when still current
+        # TMDB's recommendation lists are kept as a graph that grows with every run, next to the database
+        self.rec_engine = RecommendationEngine(self.db, self.tmdb_api, snapshot_path=f"{self.db.db_path}.snapshot",
+                                               graph=RecommendationGraph(f"{self.db.db_path}.graph"))
+        self.backfill_thread = None
+        self.poster_cache = PosterCache()
+        self.poster_rows = {}  # table -> {poster URL: rows showing it}, rebuilt with the table
+        self.catalog_index = None
+        self.catalog_index_thread = None
+        self.library_index = None
+        self.library_index_version = None
         
         self.setup_ui()
         self.setup_style()
+        self.build_catalog_index()
         
         # Auto-refresh timer
         self.timer = QTimer()
@@ -419,7 +605,7 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.watchlist_tab, "📋 Watchlist")
         
         # Recommendations tab
-        self.recommendations_tab = RecommendationWidget(self.rec_engine)
+        self.recommendations_tab = RecommendationWidget(self.rec_engine, self.poster_cache)
         self.tabs.addTab(self.recommendations_tab, "🎯 Recommendations")
         
         # Stats tab
@@ -430,6 +616,10 @@ class MainWindow(QMainWindow):
         
         # Status bar
         self.statusBar().showMessage("Ready")
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
     
     def create_watched_tab(self):
         widget = QWidget()
@@ -453,10 +643,14 @@ class MainWindow(QMainWindow):
         import_btn = QPushButton("📥 Import")
         import_btn.clicked.connect(self.import_data)
         
+        self.backfill_btn = QPushButton("🔄 Fill Metadata")
+        self.backfill_btn.clicked.connect(self.start_backfill)
+        
         toolbar_layout.addWidget(add_btn)
         toolbar_layout.addWidget(edit_btn)
         toolbar_layout.addWidget(delete_btn)
         toolbar_layout.addStretch()
+        toolbar_layout.addWidget(self.backfill_btn)
         toolbar_layout.addWidget(export_btn)
         toolbar_layout.addWidget(import_btn)
         
@@ -556,6 +750,7 @@ class MainWindow(QMainWindow):
         self.populate_table(self.watchlist_table, content)
     
     def populate_table(self, table, content):
+        self.poster_rows[table] = poster_rows = {}
         if not content:
             table.setRowCount(0)
             table.setColumnCount(0)
@@ -565,10 +760,21 @@ class MainWindow(QMainWindow):
         table.setColumnCount(len(headers))
         table.setHorizontalHeaderLabels(headers)
         table.setRowCount(len(content))
+        table.setIconSize(QSize(20, 30))
         
         for row, item in enumerate(content):
             table.setItem(row, 0, QTableWidgetItem(str(item['id'])))
-            table.setItem(row, 1, QTableWidgetItem(item['title'] or ''))
+            title_item = QTableWidgetItem(item['title'] or '')
+            table.setItem(row, 1, title_item)
+            if item.get('poster_url'):
+                title_item.setData(Qt.ItemDataRole.UserRole, item['poster_url'])
+                poster_rows.setdefault(item['poster_url'], []).append(row)
+                pixmap = self.poster_cache.get_pixmap(
+                    item['poster_url'],
+                    callback=lambda pixmap, table=table, url=item['poster_url']: self.set_table_poster(table, url, pixmap)
+                )
+                if pixmap:
+                    title_item.setIcon(QIcon(pixmap))
             table.setItem(row, 2, QTableWidgetItem(item['type'] or ''))
             table.setItem(row, 3, QTableWidgetItem(item['genre'] or ''))
             table.setItem(row, 4, QTableWidgetItem(str(item['rating']) if item['rating'] else ''))
@@ -585,8 +791,35 @@ class MainWindow(QMainWindow):
         for i in range(2, len(headers)):
             header.setSectionResizeMode(i, QHeaderView.ResizeMode.ResizeToContents)
     
+    def set_table_poster(self, table, poster_url, pixmap):
+        # The table may have been rebuilt since the download started; poster_rows is rebuilt with it
+        for row in self.poster_rows.get(table, {}).get(poster_url, []):
+            title_item = table.item(row, 1)
+            if title_item and title_item.data(Qt.ItemDataRole.UserRole) == poster_url:
+                title_item.setIcon(QIcon(pixmap))
+    
+    def build_catalog_index(self):
+        # Indexing a large offline catalog takes seconds, so do it off the UI thread
+        if not self.tmdb_api.catalog:
+            return
+        self.catalog_index_thread = TitleIndexThread(self.tmdb_api.catalog)
+        self.catalog_index_thread.completed.connect(self.on_catalog_index_ready)
+        self.catalog_index_thread.start()
+    
+    def on_catalog_index_ready(self, index):
+        self.catalog_index = index
+        self.statusBar().showMessage(f"Title search ready ({len(index)} catalog titles)")
+    
+    def title_indexes(self):
+        # The library index is built again only after the library changed
+        version = self.db.get_content_version()
+        if self.library_index is None or self.library_index_version != version:
+            self.library_index = TitleIndex.from_library(self.db)
+            self.library_index_version = version
+        return [self.library_index, self.catalog_index]
+    
     def add_content(self):
-        dialog = ContentDialog(self, tmdb_api=self.tmdb_api)
+        dialog = ContentDialog(self, tmdb_api=self.tmdb_api, title_indexes=self.title_indexes())
         if dialog.exec() == QDialog.DialogCode.Accepted:
             data = dialog.get_data()
             self.db.add_content(data)
@@ -608,7 +841,7 @@ class MainWindow(QMainWindow):
         content_data = next((c for c in content if c['id'] == content_id), None)
         
         if content_data:
-            dialog = ContentDialog(self, content_data, self.tmdb_api)
+            dialog = ContentDialog(self, content_data, self.tmdb_api, self.title_indexes())
             if dialog.exec() == QDialog.DialogCode.Accepted:
                 data = dialog.get_data()
                 self.db.update_content(content_id, data)
@@ -717,6 +950,47 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Import failed: {str(e)}")
     
+    def start_backfill(self):
+        if not self.tmdb_api.api_key:
+            QMessageBox.warning(self, "Warning", "TMDB API key not configured.")
+            return
+        if self.backfill_thread and self.backfill_thread.isRunning():
+            return
+        
+        self.backfill_thread = BackfillThread(MetadataBackfill(self.db, self.tmdb_api))
+        self.backfill_thread.progress.connect(self.on_backfill_progress)
+        self.backfill_thread.completed.connect(self.on_backfill_completed)
+        self.backfill_btn.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.statusBar().showMessage("Filling in missing metadata...")
+        self.backfill_thread.start()
+    
+    def on_backfill_progress(self, done, total):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+    
+    def on_backfill_completed(self, stats):
+        self.progress_bar.hide()
+        self.backfill_btn.setEnabled(True)
+        self.refresh_data()
+        self.statusBar().showMessage(
+            f"Metadata updated for {stats['updated']} of {stats['scanned']} entries"
+        )
+    
+    def closeEvent(self, event):
+        if self.backfill_thread and self.backfill_thread.isRunning():
+            # Progress is checkpointed per batch, so the next run resumes from here
+            self.backfill_thread.backfill.stop()
+            self.backfill_thread.wait()
+        if self.catalog_index_thread and self.catalog_index_thread.isRunning():
+            self.catalog_index_thread.wait()
+        # Cancel the recommendation run first, so waiting for its thread doesn't sit out the deadline
+        self.rec_engine.close()
+        self.recommendations_tab.stop()
+        self.poster_cache.shutdown()
+        super().closeEvent(event)
+    
     def refresh_data(self):
         self.load_watched_content()
         self.load_watchlist_content()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Metadata backfill for Entertainment Suggester
+
+Finds library entries that are missing TMDB metadata (tmdb_id, poster,
+director or duration), matches them against TMDB and fills in the gaps.
+Progress is checkpointed in the database so an interrupted run resumes
+where it stopped.
+
+Usage:
+    python metadata_backfill.py [--db watchlist.db] [--workers 4] [--restart]
+"""
+
+import sys
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from fuzzywuzzy import fuzz
+from config import (
+    get_database_path, BACKFILL_WORKERS, BACKFILL_BATCH_SIZE, BACKFILL_MATCH_THRESHOLD
+)
+from database import DatabaseManager
+from tmdb_api import TMDBApi
+
+# Fields that may be filled from TMDB; values the user already entered are kept
+BACKFILL_FIELDS = [
+    'tmdb_id', 'poster_url', 'director', 'duration', 'actors',
+    'genre', 'language', 'year', 'overview'
+]
+
+CHECKPOINT_KEY = 'metadata_backfill_last_id'
+
+class MetadataBackfill:
+    def __init__(self, db_manager: DatabaseManager, tmdb_api: TMDBApi,
+                 workers: int = BACKFILL_WORKERS, batch_size: int = BACKFILL_BATCH_SIZE,
+                 match_threshold: int = BACKFILL_MATCH_THRESHOLD):
+        self.db = db_manager
+        self.tmdb = tmdb_api
+        self.workers = workers
+        self.batch_size = batch_size
+        self.match_threshold = match_threshold
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Ask a running backfill to stop after the current batch"""
+        self._stop_event.set()
+
+    def reset(self):
+        """Forget the checkpoint so the next run starts from the first row"""
+        self.db.set_state(CHECKPOINT_KEY, None)
+
+    def run(self, progress_callback: Callable[[int, int], None] = None) -> Dict:
+        """Backfill all incomplete rows after the checkpoint.
+
+        Rows are looked up concurrently and written back one batch per
+        transaction; the checkpoint advances after every committed batch.
+        Returns counts of scanned, updated, unmatched and failed rows.
+        """
+        self._stop_event.clear()
+        last_id = int(self.db.get_state(CHECKPOINT_KEY, 0))
+        total = self.db.count_incomplete_content(after_id=last_id)
+        stats = {'scanned': 0, 'updated': 0, 'unmatched': 0, 'failed': 0, 'total': total}
+
+        if progress_callback:
+            progress_callback(0, total)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not self._stop_event.is_set():
+                batch = self.db.get_incomplete_content(after_id=last_id, limit=self.batch_size)
+                if not batch:
+                    break
+
+                updates = []
+                for row, result in zip(batch, executor.map(self._safe_lookup, batch)):
+                    if result is None:
+                        stats['failed'] += 1
+                    elif not result:
+                        stats['unmatched'] += 1
+                    else:
+                        updates.append((row['id'], result))
+
+                stats['updated'] += self.db.update_content_batch(updates)
+                stats['scanned'] += len(batch)
+                last_id = batch[-1]['id']
+                self.db.set_state(CHECKPOINT_KEY, last_id)
+
+                if progress_callback:
+                    progress_callback(min(stats['scanned'], total), total)
+
+        stats['completed'] = not self._stop_event.is_set()
+        if stats['completed']:
+            self.reset()
+        return stats
+
+    def _safe_lookup(self, row: Dict) -> Optional[Dict]:
+        """Look up a row, returning None on unexpected errors so one bad row can't stop the run"""
+        try:
+            return self.lookup(row)
+        except Exception as e:
+            print(f"Backfill error for '{row.get('title')}': {e}")
+            return None
+
+    def lookup(self, row: Dict) -> Dict:
+        """Return the missing fields for a row ({} if no confident TMDB match)"""
+        content_type = 'tv' if row.get('type') == 'tv' else 'movie'
+        tmdb_id = row.get('tmdb_id') or self._match_tmdb_id(row, content_type)
+        if not tmdb_id:
+            return {}
+
+        if content_type == 'movie':
+            details = self.tmdb.get_movie_details(tmdb_id)
+        else:
+            details = self.tmdb.get_tv_details(tmdb_id)
+        if not details:
+            return {}
+
+        formatted = self.tmdb.format_content_data(details, content_type)
+        return {
+            field: formatted[field]
+            for field in BACKFILL_FIELDS
+            if formatted.get(field) and not row.get(field)
+        }
+
+    def _match_tmdb_id(self, row: Dict, content_type: str) -> Optional[int]:
+        """Find the best TMDB search result for a row's title (and year, if known)"""
+        title = (row.get('title') or '').strip()
+        if not title:
+            return None
+
+        best_id, best_score = None, 0
+        for result in self.tmdb.search_content(title, content_type):
+            result_title = result.get('title') or result.get('name', '')
+            score = fuzz.ratio(title.lower(), result_title.lower())
+
+            year = self._result_year(result)
+            if row.get('year') and year:
+                # Same-titled remakes are common; the year settles them
+                score += 10 if year == row['year'] else -10
+
+            if score > best_score:
+                best_id, best_score = result.get('id'), score
+
+        return best_id if best_score >= self.match_threshold else None
+
+    def _result_year(self, result: Dict) -> Optional[int]:
+        date_field = result.get('release_date') or result.get('first_air_date') or ''
+        try:
+            return int(date_field[:4])
+        except ValueError:
+            return None
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fill in missing TMDB metadata for library entries")
+    parser.add_argument("--db", default=get_database_path(), help="Path to the watchlist database")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="Concurrent TMDB lookups")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and rescan every row")
+    args = parser.parse_args(argv)
+
+    tmdb_api = TMDBApi()
+    if not tmdb_api.api_key:
+        print("TMDB API key not configured - nothing to do.")
+        return 1
+
+    backfill = MetadataBackfill(DatabaseManager(args.db), tmdb_api,
+                                workers=args.workers, batch_size=args.batch_size)
+    if args.restart:
+        backfill.reset()
+
+    def report(done, total):
+        print(f"\rBackfilled {done}/{total} rows", end="", flush=True)
+
+    try:
+        stats = backfill.run(progress_callback=report)
+    except KeyboardInterrupt:
+        print("\nInterrupted - progress has been checkpointed, run again to resume.")
+        return 130
+
+    print()
+    print(f"Updated: {stats['updated']}, unmatched: {stats['unmatched']}, failed: {stats['failed']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Local TMDB stand-in server for Entertainment Suggester
+
+Replays recorded JSON fixtures for every TMDB endpoint the application uses,
+so TMDBApi and RecommendationEngine can be exercised (and benchmarked)
+without the live service. Latency, server errors and 429 rate limiting can
+be injected, and all randomness is seeded for reproducible runs.
+
+Fixtures live under fixtures/tmdb/ and mirror the URL path, e.g.
+/3/trending/all/week -> trending/all/week.json. A path segment with no
+exact match falls back to _default (movie/_default.json answers any
+/movie/{id}); page N of a list is read from <name>.page{N}.json if present.
+
+Usage:
+    python mock_tmdb_server.py [--port 8765] [--latency-ms 50] [--error-rate 0.01]
+    TMDB_BASE_URL=http://127.0.0.1:8765/3 python main.py
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlsplit, parse_qs
+import requests
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "tmdb")
+API_PREFIX = "/3"
+
+# Offset applied to ids on synthesized pages so every page holds distinct titles
+SYNTHETIC_ID_STRIDE = 10000000
+
+class MockTMDBServer:
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: int = 1, synthetic_pages: int = None,
+                 seed: int = None, record_upstream: str = None):
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.synthetic_pages = synthetic_pages
+        self.record_upstream = record_upstream
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._fixture_cache = {}
+        self._httpd = ThreadingHTTPServer((host, port), _MockTMDBHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def draw_fault(self):
+        """Decide the injected delay and fault for one request: (delay_seconds, status or None)"""
+        with self._lock:
+            self.request_count += 1
+            delay = self.latency_ms + (self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+            roll = self._random.random()
+
+        if roll < self.rate_limit_rate:
+            return max(delay, 0) / 1000, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return max(delay, 0) / 1000, 500
+        return max(delay, 0) / 1000, None
+
+    def resolve(self, path: str, query: Dict[str, str]) -> Optional[Dict]:
+        """Build the response payload for an API path, or None if no fixture matches"""
+        segments = [s for s in path.split("/") if s]
+        if not all(_safe_segment(segment) for segment in segments):
+            return None  # never let a request path reach outside the fixtures
+        page = int(query.get("page", 1) or 1)
+        found = self._find_fixture(segments, page)
+
+        if found is None:
+            if not self.record_upstream:
+                return None
+            payload = self._record(segments, query, page)
+            if payload is None:
+                return None
+            found = (payload, [], page)
+
+        payload, defaulted_ids, fixture_page = found
+        payload = json.loads(json.dumps(payload))  # callers must not mutate the cached fixture
+
+        if "id" in payload and segments[-1].isdigit() and defaulted_ids[-1:] == [int(segments[-1])]:
+            # movie/_default.json answering /movie/123 reports id 123
+            payload["id"] = defaulted_ids[-1]
+
+        if "results" in payload:
+            payload = self._shape_list(segments, payload, query, page, fixture_page)
+        return payload
+
+    def _find_fixture(self, segments, page: int):
+        """Walk the fixture tree; returns (payload, ids matched via _default, page of the fixture file)"""
+        directory = self.fixtures_dir
+        defaulted_ids = []
+
+        for i, segment in enumerate(segments):
+            is_last = i == len(segments) - 1
+            if is_last:
+                for name, fixture_page in ((f"{segment}.page{page}", page), (segment, 1),
+                                           (f"_default.page{page}", page), ("_default", 1)):
+                    file_path = os.path.join(directory, f"{name}.json")
+                    if os.path.isfile(file_path):
+                        if name.startswith("_default"):
+                            defaulted_ids.append(self._as_id(segment))
+                        return self._load(file_path), defaulted_ids, fixture_page
+                return None
+
+            if os.path.isdir(os.path.join(directory, segment)):
+                directory = os.path.join(directory, segment)
+            elif os.path.isdir(os.path.join(directory, "_default")):
+                directory = os.path.join(directory, "_default")
+                defaulted_ids.append(self._as_id(segment))
+            else:
+                return None
+        return None
+
+    def _as_id(self, segment: str):
+        return int(segment) if segment.isdigit() else segment
+
+    def _load(self, file_path: str) -> Dict:
+        with self._lock:
+            payload = self._fixture_cache.get(file_path)
+        if payload is None:
+            with open(file_path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            with self._lock:
+                self._fixture_cache[file_path] = payload
+        return payload
+
+    def _shape_list(self, segments, payload: Dict, query: Dict[str, str], page: int, fixture_page: int) -> Dict:
+        results = payload["results"]
+
+        if segments[0] == "search" and query.get("query"):
+            needle = query["query"].lower()
+            results = [r for r in results if needle in (r.get("title") or r.get("name") or "").lower()]
+        elif segments[0] == "discover" and query.get("with_genres"):
+            wanted = {int(g) for g in query["with_genres"].split(",") if g.strip().isdigit()}
+            results = [r for r in results if wanted.issubset(r.get("genre_ids", []))]
+
+        total_pages = payload.get("total_pages", 1)
+        if page != fixture_page:
+            if self.synthetic_pages and page <= self.synthetic_pages:
+                results = [self._synthesize(r, page) for r in results]
+            else:
+                results = []
+        if self.synthetic_pages:
+            total_pages = max(total_pages, self.synthetic_pages)
+
+        payload["results"] = results
+        payload["page"] = page
+        payload["total_pages"] = total_pages
+        payload["total_results"] = len(results) * total_pages
+        return payload
+
+    def _synthesize(self, result: Dict, page: int) -> Dict:
+        result = dict(result)
+        result["id"] = result["id"] + SYNTHETIC_ID_STRIDE * page
+        for key in ("title", "name"):
+            if key in result:
+                result[key] = f"{result[key]} (Part {page})"
+        return result
+
+    def _record(self, segments, query: Dict[str, str], page: int) -> Optional[Dict]:
+        """Fetch a missing fixture from the real API and save it for future replays"""
+        url = f"{self.record_upstream.rstrip('/')}/{'/'.join(segments)}"
+        try:
+            response = requests.get(url, params=query, timeout=15)
+            response.raise_for_status()
+            payload = response.json()
+        except requests.RequestException as e:
+            print(f"Recording {url} failed: {e}")
+            return None
+
+        name = segments[-1] if page == 1 else f"{segments[-1]}.page{page}"
+        file_path = os.path.join(self.fixtures_dir, *segments[:-1], f"{name}.json")
+        root = os.path.realpath(self.fixtures_dir)
+        if os.path.commonpath([root, os.path.realpath(file_path)]) != root:
+            print(f"Not recording {url}: it would be saved outside {self.fixtures_dir}")
+            return None
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        return payload
+
+def _safe_segment(segment: str) -> bool:
+    """Whether a URL path segment can name a fixture file or directory (no "..", separators or drives)"""
+    return segment not in (".", "..") and not any(char in segment for char in "\\:\0")
+
+class _MockTMDBHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        mock = self.server.mock
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        delay, fault = mock.draw_fault()
+        if delay:
+            time.sleep(delay)
+
+        if not url.path.startswith(API_PREFIX + "/"):
+            return self._send(404, {"success": False, "status_code": 34,
+                                    "status_message": "The resource you requested could not be found."})
+        if not query.get("api_key"):
+            return self._send(401, {"success": False, "status_code": 7,
+                                    "status_message": "Invalid API key: You must be granted a valid key."})
+        if fault == 429:
+            return self._send(429, {"success": False, "status_code": 25,
+                                    "status_message": "Your request count is over the allowed limit."},
+                              {"Retry-After": str(mock.retry_after)})
+        if fault:
+            return self._send(fault, {"success": False, "status_code": 11,
+                                      "status_message": "Internal error: Something went wrong, contact TMDB."})
+
+        payload = mock.resolve(url.path[len(API_PREFIX):], query)
+        if payload is None:
+            return self._send(404, {"success": False, "status_code": 34,
+                                    "status_message": "The resource you requested could not be found."})
+        self._send(200, payload)
+
+    def _send(self, status: int, payload: Dict, headers: Dict[str, str] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Benchmarks issue thousands of requests; keep the console quiet
+        pass
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve recorded TMDB fixtures locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Fixture directory")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- variation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--synthetic-pages", type=int, help="Serve this many pages for every list endpoint")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and fault injection")
+    parser.add_argument("--record", metavar="UPSTREAM_URL", nargs="?", const="https://api.themoviedb.org/3",
+                        help="Fetch and save fixtures that are missing from the upstream API")
+    args = parser.parse_args(argv)
+
+    server = MockTMDBServer(
+        fixtures_dir=args.fixtures, host=args.host, port=args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        synthetic_pages=args.synthetic_pages, seed=args.seed, record_upstream=args.record
+    )
+    print(f"Mock TMDB API listening on {server.base_url}")
+    print(f"Run the app against it with: TMDB_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
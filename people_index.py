@@ -0,0 +1,30 @@
+from typing import Iterable, List, Optional
+
+# Directors include TV creators, as in the content table's director column
+ROLES = ('director', 'actor')
+
+def person_key(name: str) -> str:
+    """What people are matched on: the name, ignoring case and spacing"""
+    return " ".join(name.split()).casefold()
+
+def split_people(value: Optional[str]) -> List[str]:
+    """Names in a comma-joined director/actors column, in order, without blanks or repeats"""
+    names = {}
+    for name in (value or "").split(","):
+        name = " ".join(name.split())
+        if name:
+            names.setdefault(person_key(name), name)
+    return list(names.values())
+
+def credited_people(directors: Iterable[str], actors: Iterable[str]) -> List[tuple]:
+    """(role, name) pairs for a title's credits, directors first"""
+    return [('director', name) for name in directors] + [('actor', name) for name in actors]
+
+def person_ids(cursor, names: Iterable[str]) -> List[int]:
+    """Ids of people in a `people (id, name, name_key UNIQUE)` table, adding the ones that are missing"""
+    ids = []
+    for name in names:
+        key = person_key(name)
+        cursor.execute("INSERT OR IGNORE INTO people (name, name_key) VALUES (?, ?)", (name, key))
+        ids.append(cursor.execute("SELECT id FROM people WHERE name_key = ?", (key,)).fetchone()[0])
+    return ids
@@ -0,0 +1,205 @@
+import os
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import requests
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap, QPixmapCache
+from config import (
+    POSTER_CACHE_DIR, POSTER_CACHE_MAX_MB, POSTER_MEMORY_CACHE_MB,
+    POSTER_THUMBNAIL_SIZE, POSTER_DOWNLOAD_WORKERS, POSTER_RETRY_SECONDS
+)
+
+class PosterCache(QObject):
+    """Downloads posters in the background and keeps them on disk and in memory.
+
+    Each poster is stored as the original image plus a pre-scaled thumbnail.
+    The disk cache is capped at max_bytes and evicts least recently used
+    posters; decoded pixmaps are served from QPixmapCache. A poster URL is
+    downloaded at most once, however many widgets ask for it. A failed
+    download is not retried for retry_seconds, or ever if the URL was a 404.
+    """
+
+    # Emitted (from a worker thread, delivered on the GUI thread) after a download
+    _downloaded = pyqtSignal(str, int)
+    _failed = pyqtSignal(str, bool)  # url, whether retrying is pointless (404)
+
+    def __init__(self, cache_dir: str = POSTER_CACHE_DIR, max_bytes: int = POSTER_CACHE_MAX_MB * 1024 * 1024,
+                 thumbnail_size=POSTER_THUMBNAIL_SIZE, workers: int = POSTER_DOWNLOAD_WORKERS,
+                 retry_seconds: float = POSTER_RETRY_SECONDS):
+        super().__init__()
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self.retry_seconds = retry_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = {}  # url -> list of (callback, thumbnail)
+        self._failed_urls = {}  # url -> time.monotonic() after which it may be downloaded again
+        self._index = OrderedDict()  # cache key -> bytes on disk, oldest first
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        QPixmapCache.setCacheLimit(max(QPixmapCache.cacheLimit(), POSTER_MEMORY_CACHE_MB * 1024))
+        self._load_index()
+
+        self._downloaded.connect(self._on_downloaded)
+        self._failed.connect(self._on_failed)
+
+    def get_pixmap(self, url: str, thumbnail: bool = True,
+                   callback: Callable[[QPixmap], None] = None) -> Optional[QPixmap]:
+        """Return the poster for url if it is cached, otherwise start downloading it.
+
+        When the poster is not available yet, None is returned and callback
+        (if given) is called with the pixmap on the GUI thread once the
+        download finishes.
+        """
+        if not url:
+            return None
+
+        pixmap = self._load_cached(url, thumbnail)
+        if pixmap is not None:
+            return pixmap
+
+        if url in self._failed_urls:
+            if time.monotonic() < self._failed_urls[url]:
+                return None
+            del self._failed_urls[url]
+
+        waiting = self._pending.get(url)
+        if waiting is None:
+            self._pending[url] = waiting = []
+            self._executor.submit(self._download, url)
+        if callback:
+            waiting.append((callback, thumbnail))
+        return None
+
+    def shutdown(self):
+        """Stop accepting downloads; in-flight downloads are abandoned"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str):
+        return (
+            os.path.join(self.cache_dir, f"{key}.jpg"),
+            os.path.join(self.cache_dir, f"{key}_thumb.jpg")
+        )
+
+    def _load_index(self):
+        """Rebuild the LRU order from the files on disk (modification time = last use)"""
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.jpg'):
+                continue
+            key = name[:-len('.jpg')].replace('_thumb', '')
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            size, mtime = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+
+        for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+            self._index[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _load_cached(self, url: str, thumbnail: bool) -> Optional[QPixmap]:
+        key = self._key(url)
+        pixmap_key = f"poster:{key}:{'thumb' if thumbnail else 'full'}"
+
+        pixmap = QPixmapCache.find(pixmap_key)
+        if pixmap is not None and not pixmap.isNull():
+            self._touch(key)
+            return pixmap
+
+        if key not in self._index:
+            return None
+
+        original_path, thumb_path = self._paths(key)
+        pixmap = QPixmap(thumb_path if thumbnail else original_path)
+        if pixmap.isNull():
+            # Damaged or removed behind our back - forget it and download again
+            self._remove(key)
+            return None
+
+        QPixmapCache.insert(pixmap_key, pixmap)
+        self._touch(key)
+        return pixmap
+
+    def _touch(self, key: str):
+        if key in self._index:
+            self._index.move_to_end(key)
+            for path in self._paths(key):
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+    def _download(self, url: str):
+        """Worker thread: fetch a poster and write the original and thumbnail to disk"""
+        try:
+            response = requests.get(url, timeout=15)
+            response.raise_for_status()
+
+            image = QImage.fromData(response.content)
+            if image.isNull():
+                raise ValueError("not an image")
+
+            width, height = self.thumbnail_size
+            thumbnail = image.scaled(
+                width, height,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+
+            original_path, thumb_path = self._paths(self._key(url))
+            with open(original_path, 'wb') as f:
+                f.write(response.content)
+            thumbnail.save(thumb_path, 'JPG', 85)
+
+            self._downloaded.emit(url, os.path.getsize(original_path) + os.path.getsize(thumb_path))
+        except Exception as e:
+            print(f"Poster download error: {e}")
+            missing = isinstance(e, requests.exceptions.HTTPError) and e.response is not None \
+                and e.response.status_code == 404
+            self._failed.emit(url, missing)
+
+    def _on_downloaded(self, url: str, size: int):
+        key = self._key(url)
+        if key in self._index:
+            self._total_bytes -= self._index[key]
+        self._index[key] = size
+        self._index.move_to_end(key)
+        self._total_bytes += size
+
+        for callback, thumbnail in self._pending.pop(url, []):
+            pixmap = self._load_cached(url, thumbnail)
+            if pixmap is None:
+                continue
+            try:
+                callback(pixmap)
+            except RuntimeError:
+                # The widget asking for the poster has been deleted meanwhile
+                pass
+
+        self._evict()
+
+    def _on_failed(self, url: str, missing: bool):
+        self._pending.pop(url, None)
+        self._failed_urls[url] = float('inf') if missing else time.monotonic() + self.retry_seconds
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key = next(iter(self._index))
+            self._remove(key)
+
+    def _remove(self, key: str):
+        self._total_bytes -= self._index.pop(key, 0)
+        QPixmapCache.remove(f"poster:{key}:thumb")
+        QPixmapCache.remove(f"poster:{key}:full")
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
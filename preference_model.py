@@ -0,0 +1,146 @@
+import itertools
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config import PREFERENCE_HALF_LIFE_DAYS
+
+DIMENSIONS = ('genre', 'language', 'platform', 'decade')
+OVERALL = 'overall'  # preference_stats() key of the totals over all rated titles
+PRIOR_WEIGHT = 1.0  # averages are pulled toward the overall average by this many (decayed) titles
+
+class PreferenceModel:
+    """How much the user likes each genre, language, platform and decade.
+
+    Built once from the rated watch history (see
+    DatabaseManager.get_rating_history()); every dimension is stored as an
+    array of category codes next to the ratings and watch dates, so
+    preferences() recomputes all of them, for any reference date, with a few
+    bincounts. Each title's weight halves every half_life_days since it was
+    watched, so old binges fade instead of dominating.
+
+    The engine doesn't rebuild this on every library change: the database
+    keeps the same decayed sums per value current on each write, and
+    preferences_from_stats() blends them the same way.
+
+    Only the genre preferences feed the recommendation scores; language,
+    platform and decade are exposed to callers (RecommendationEngine.preference_weights).
+    """
+
+    def __init__(self, history: Sequence[Tuple], half_life_days: float = PREFERENCE_HALF_LIFE_DAYS,
+                 version: Optional[str] = None):
+        self.version = version
+        self.half_life_days = half_life_days
+        genres, languages, platforms, years, ratings, watched = zip(*history) if history else ((),) * 6
+
+        self.ratings = np.array(ratings, dtype=np.float64)
+        self.watched_days = _day_numbers(watched)
+        # Genres are comma-separated lists; each distinct list becomes one row of a membership matrix
+        combo_codes, combos = _encode(genres)
+        self.labels = {'genre': sorted({g.strip() for combo in combos for g in combo.split(',') if g.strip()})}
+        genre_columns = {genre: column for column, genre in enumerate(self.labels['genre'])}
+        self._genre_matrix = np.zeros((len(combos), len(genre_columns)))
+        for row, combo in enumerate(combos):
+            for genre in {g.strip() for g in combo.split(',') if g.strip()}:
+                self._genre_matrix[row, genre_columns[genre]] = 1
+        self._codes = {'genre': combo_codes}
+        for name, values in (('language', languages), ('platform', platforms)):
+            self._codes[name], self.labels[name] = _encode(values)
+
+        # Decades are derived from the few distinct years rather than from every row
+        year_codes, distinct_years = _encode(years)
+        decades = [decade_of(year) for year in distinct_years]
+        decade_codes, self.labels['decade'] = _encode(decades)
+        self._codes['decade'] = np.append(decade_codes, -1)[year_codes]  # code -1 (no year) stays -1
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def preferences(self, today: Optional[date] = None) -> Dict[str, Dict[str, float]]:
+        """{dimension: {value: preference}} as of today.
+
+        A value's preference is 0.7 x its decayed average rating plus 0.3 x
+        its decayed watch count capped at 10 (scaled to 0-1), the same blend
+        as the undecayed genre preferences it replaces. The average is
+        shrunk toward the user's overall average, so a value whose titles
+        were all watched long ago no longer stands out on its ratings alone.
+        """
+        today_number = (today or date.today()).toordinal()
+        age_days = np.clip(today_number - self.watched_days, 0, None)
+        weights = np.power(0.5, age_days / self.half_life_days)
+        weighted_ratings = weights * self.ratings
+        overall = weighted_ratings.sum() / weights.sum() if len(weights) else 0.0
+
+        preferences = {}
+        for name in DIMENSIONS:
+            codes = self._codes[name]
+            valid = codes >= 0
+            size = len(self._genre_matrix) if name == 'genre' else len(self.labels[name])
+            counts = np.bincount(codes[valid], weights[valid], minlength=size)
+            totals = np.bincount(codes[valid], weighted_ratings[valid], minlength=size)
+            if name == 'genre':
+                counts, totals = counts @ self._genre_matrix, totals @ self._genre_matrix
+            preferences[name] = _blend(self.labels[name], counts, totals, overall)
+        return preferences
+
+def preferences_from_stats(stats: Dict[str, Dict[str, Tuple[float, float]]]) -> Dict[str, Dict[str, float]]:
+    """PreferenceModel.preferences() from running totals instead of the whole history.
+
+    stats maps each dimension (and OVERALL, under the value '') to
+    {value: (decayed title count, decayed rating sum)}, as kept by
+    DatabaseManager.get_preference_stats().
+    """
+    count, total = stats.get(OVERALL, {}).get('', (0.0, 0.0))
+    overall = total / count if count > 0 else 0.0
+    preferences = {}
+    for name in DIMENSIONS:
+        values = stats.get(name, {})
+        labels = list(values)
+        counts = np.array([values[label][0] for label in labels], dtype=np.float64)
+        totals = np.array([values[label][1] for label in labels], dtype=np.float64)
+        preferences[name] = _blend(labels, counts, totals, overall)
+    return preferences
+
+def preference_values(genre: Optional[str], language: Optional[str], platform: Optional[str],
+                      year) -> List[Tuple[str, str]]:
+    """(dimension, value) pairs a title with these columns counts towards"""
+    values = [('genre', g) for g in sorted({g.strip() for g in (genre or '').split(',') if g.strip()})]
+    values += [(name, value) for name, value in (('language', language), ('platform', platform)) if value]
+    decade = decade_of(year)
+    if decade:
+        values.append(('decade', decade))
+    return values
+
+def decade_of(year) -> Optional[str]:
+    return f"{year // 10 * 10}s" if isinstance(year, int) and year > 0 else None
+
+def decay_factor(days: float, half_life_days: float = PREFERENCE_HALF_LIFE_DAYS) -> float:
+    """Weight left to a title watched `days` days before the reference date"""
+    return 0.5 ** (days / half_life_days)
+
+def _blend(labels: Sequence[str], counts: np.ndarray, totals: np.ndarray, overall: float) -> Dict[str, float]:
+    averages = (totals + PRIOR_WEIGHT * overall) / (counts + PRIOR_WEIGHT)
+    scores = averages * 0.7 + np.minimum(counts / 10, 1.0) * 0.3
+    return {label: float(score) for label, score, count in zip(labels, scores, counts) if count > 0}
+
+def _encode(values: Sequence) -> Tuple[np.ndarray, List]:
+    """(code per value, distinct values); empty values get code -1"""
+    # Histories repeat the same few values, so only the distinct ones are handled in Python
+    distinct = [value for value in dict.fromkeys(values) if value]
+    index = {value: code for code, value in enumerate(distinct)}
+    codes = np.fromiter(map(index.get, values, itertools.repeat(-1)), dtype=np.int32, count=len(values))
+    return codes, distinct
+
+def _day_numbers(values: Sequence[Optional[str]]) -> np.ndarray:
+    """Proleptic ordinals (as date.toordinal()) of ISO dates; missing or malformed dates count as today"""
+    codes, distinct = _encode(values)
+    days = np.array([parse_day(value) for value in distinct] + [date.today().toordinal()], dtype=np.int32)
+    return days[codes]
+
+def parse_day(value: Optional[str]) -> int:
+    """Proleptic ordinal of an ISO date (or timestamp); missing or malformed dates count as today"""
+    if not value:
+        return date.today().toordinal()
+    try:
+        return date.fromisoformat(value[:10]).toordinal()
+    except ValueError:
+        return date.today().toordinal()
@@ -0,0 +1,128 @@
+import heapq
+import itertools
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+Features = frozenset
+
+def recommendation_key(rec: Dict) -> Hashable:
+    """Identity of a recommendation: the same title found by two sources is one candidate"""
+    if rec.get('tmdb_id'):
+        return (rec['tmdb_id'], rec['type'])
+    return ('title', rec['title'].lower())
+
+def genre_features(rec: Dict) -> Features:
+    """Default feature extraction: what two recommendations must share to count as alike"""
+    features = {f"type:{rec['type']}"}
+    features.update(f"genre:{genre_id}" for genre_id in rec.get('genre_ids') or ())
+    if rec.get('year'):
+        features.add(f"decade:{rec['year'] // 10}")
+    return frozenset(features)
+
+def jaccard(a: Features, b: Features) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def source_score(rec: Dict, features: Features) -> float:
+    """Default scoring: the score the source gave the recommendation"""
+    return rec['score']
+
+class RankingPipeline:
+    """Rank recommendation candidates in stages, keeping only a bounded pool.
+
+    Candidates from any number of sources pass through feature extraction
+    and scoring as they arrive; a min-heap keeps the best pool_size of them,
+    one per recommendation_key(). results() re-ranks the pool for diversity
+    (maximal marginal relevance) and cuts it to k. Each stage is a callable
+    that can be swapped out, and `counters` tracks how many candidates
+    entered and left each stage.
+    """
+
+    def __init__(self, k: int, pool_size: Optional[int] = None, diversity: float = 0.3,
+                 extract_features: Callable[[Dict], Features] = genre_features,
+                 score: Callable[[Dict, Features], float] = source_score,
+                 similarity: Callable[[Features, Features], float] = jaccard):
+        self.k = k
+        self.pool_size = max(pool_size or 5 * k, k)
+        self.diversity = diversity
+        self.extract_features = extract_features
+        self.score = score
+        self.similarity = similarity
+        self._heap = []  # (score, sequence, key); entries for replaced candidates are skipped lazily
+        self._pool = {}  # key -> (score, sequence, rec, features)
+        self._sequence = itertools.count()
+        self.counters = {'generated': 0, 'duplicates': 0, 'scored': 0, 'dropped': 0, 'reranked': 0, 'returned': 0}
+
+    def __len__(self):
+        return len(self._pool)
+
+    def add(self, candidates: Iterable[Dict]) -> bool:
+        """Feed candidates into the pool; True if the pool changed"""
+        changed = False
+        for rec in candidates:
+            self.counters['generated'] += 1
+            key = recommendation_key(rec)
+            features = self.extract_features(rec)
+            score = self.score(rec, features)
+            self.counters['scored'] += 1
+
+            current = self._pool.get(key)
+            if current is not None:
+                self.counters['duplicates'] += 1
+                if score <= current[0]:
+                    continue
+            elif len(self._pool) >= self.pool_size and score <= self._min_score():
+                self.counters['dropped'] += 1
+                continue
+
+            entry = (score, next(self._sequence), rec, features)
+            self._pool[key] = entry
+            heapq.heappush(self._heap, (score, entry[1], key))
+            changed = True
+            while len(self._pool) > self.pool_size:
+                self._pop_min()
+                self.counters['dropped'] += 1
+            if len(self._heap) > 2 * self.pool_size:
+                self._compact()
+        return changed
+
+    def results(self) -> List[Dict]:
+        """The best k candidates, re-ranked so near-duplicates don't crowd out the rest"""
+        # Ties are broken by title so the order doesn't depend on which source finished first
+        pool = sorted(self._pool.values(), key=lambda entry: (-entry[0], entry[2]['title']))
+        self.counters['reranked'] = len(pool)
+        if not pool:
+            self.counters['returned'] = 0
+            return []
+
+        # Scores relative to the best one, so the diversity trade-off doesn't depend on each source's scale
+        top = pool[0][0] if pool[0][0] > 0 else 1.0
+        relevance = [entry[0] / top for entry in pool]
+        closest = [0.0] * len(pool)  # highest similarity to anything selected so far
+        selected, remaining = [], list(range(len(pool)))
+        while remaining and len(selected) < self.k:
+            best = max(remaining, key=lambda i: (1 - self.diversity) * relevance[i] - self.diversity * closest[i])
+            remaining.remove(best)
+            selected.append(pool[best][2])
+            for i in remaining:
+                closest[i] = max(closest[i], self.similarity(pool[i][3], pool[best][3]))
+
+        self.counters['returned'] = len(selected)
+        return selected
+
+    def _min_score(self) -> float:
+        self._drop_stale()
+        return self._heap[0][0]
+
+    def _pop_min(self):
+        self._drop_stale()
+        _, _, key = heapq.heappop(self._heap)
+        del self._pool[key]
+
+    def _drop_stale(self):
+        while self._heap and self._pool.get(self._heap[0][2], (None, None))[1] != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        self._heap = [(score, sequence, key) for key, (score, sequence, _, _) in self._pool.items()]
+        heapq.heapify(self._heap)
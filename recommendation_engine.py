@@ -1,71 +1,265 @@
+import os
 import sqlite3
 import json
-from typing import Dict, List, Tuple
-from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
-import re
-from fuzzywuzzy import fuzz
+import time
+import threading
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+import numpy as np
 from tmdb_api import TMDBApi
+from watched_index import WatchedIndex
+from content_model import ContentModel, ContentIndex, item_from_library, item_from_result, encode_key
+from ranking import RankingPipeline
+from scoring import (format_recommendation, unwatched, genre_recommendations, similar_recommendations,
+                     trending_match, trending_recommendations, content_recommendations, people_recommendations,
+                     graph_recommendations)
+from people_index import person_key, split_people
+from recommendation_graph import RecommendationGraph, GraphAdjacency, personalized_pagerank
+from preference_model import preferences_from_stats
+from config import (RECOMMENDATION_MAX_PAGES, RECOMMENDATION_DEADLINE, CONTENT_MODEL_MAX_CANDIDATES,
+                    CONTENT_INDEX_MAX_ITEMS, CONTENT_INDEX_DIR, RECOMMENDATION_POOL_FACTOR,
+                    RECOMMENDATION_DIVERSITY, RECOMMENDATIONS_PER_GENRE, RECOMMENDATION_FAVOURITES,
+                    RECOMMENDATIONS_PER_FAVOURITE, RECOMMENDATION_GRAPH_RESTART)
+
+SNAPSHOT_FORMAT = 3  # bump whenever the snapshot's contents change, so old snapshots are ignored
+
+def content_index_directory(catalog) -> str:
+    """Where the content index of an offline catalog is kept"""
+    return CONTENT_INDEX_DIR or f"{catalog.db_path}.content_index"
+
+def build_content_index(catalog, version: str) -> ContentIndex:
+    """Build the content index of an offline catalog (minutes for a full catalog)"""
+    started = time.perf_counter()
+    genre_map = catalog.genre_mapping()
+    index = ContentIndex.build(
+        content_index_directory(catalog),
+        (item_from_result(result, genre_map) for result in catalog.iter_described(CONTENT_INDEX_MAX_ITEMS)),
+        version=version
+    )
+    print(f"Indexed {len(index)} catalog titles in {time.perf_counter() - started:.1f}s")
+    return index
+
+def _json_scalar(value):
+    """json.dump() fallback for the NumPy numbers scores may come as"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
 
 class RecommendationEngine:
-    def __init__(self, db_manager, tmdb_api: TMDBApi):
+    def __init__(self, db_manager, tmdb_api: TMDBApi, snapshot_path: Optional[str] = None,
+                 graph: Optional[RecommendationGraph] = None):
         self.db = db_manager
         self.tmdb = tmdb_api
-        self.genre_weights = self._calculate_genre_preferences()
+        self.snapshot_path = snapshot_path
+        self.graph = graph
+        self._graph_adjacency = None
+        self.preference_weights = {}
         self.rating_threshold = 7.0  # Minimum rating to consider as "liked"
+        self.watched_index = None
+        self.genre_map = {}
+        self.content_model = None
+        self._model_lock = threading.Lock()
+        self._index_build = None  # thread building the catalog's content index, while it runs
+        self._index_failed = None  # catalog version the content index could not be built for
+        self._source_executors = set()  # the source pools of runs in progress
+        self._run_stops = set()  # a future per run in progress, resolved by close() to end it early
+        self.last_recommendations = []
+        self.last_stage_timings = {}
+        self.last_ranking_counters = {}
+        # Preferences come from totals the database keeps current; a snapshot saved for the
+        # current library restores the rest
+        self.genre_weights = self._calculate_genre_preferences()
+        self._load_snapshot()
     
     def _calculate_genre_preferences(self) -> Dict[str, float]:
         """Calculate user's genre preferences based on watch history and ratings"""
-        content = self.db.get_all_content(status='watched')
-        genre_scores = defaultdict(list)
-        
-        for item in content:
-            if item['genre'] and item['rating']:
-                genres = [g.strip() for g in item['genre'].split(',')]
-                for genre in genres:
-                    genre_scores[genre].append(float(item['rating']))
-        
-        # Calculate weighted preferences
-        preferences = {}
-        for genre, ratings in genre_scores.items():
-            avg_rating = sum(ratings) / len(ratings)
-            watch_count = len(ratings)
-            # Weight by both average rating and frequency
-            preferences[genre] = (avg_rating * 0.7) + (min(watch_count / 10, 1.0) * 0.3)
-        
-        return preferences
-    
-    def get_recommendations(self, limit: int = 10) -> List[Dict]:
+        # Recent watches count for more; language, platform and decade preferences come with it.
+        # The database keeps the decayed totals current, so this reads a few rows, not the history
+        self.preference_weights = preferences_from_stats(self.db.get_preference_stats())
+        return self.preference_weights['genre']
+    
+    def get_recommendations(self, limit: int = 10, deadline: float = RECOMMENDATION_DEADLINE) -> List[Dict]:
         """Generate personalized recommendations"""
         recommendations = []
+        for recommendations in self.iter_recommendations(limit, deadline):
+            pass
+        return recommendations
+    
+    def iter_recommendations(self, limit: int = 10, deadline: float = RECOMMENDATION_DEADLINE) -> Iterator[List[Dict]]:
+        """Yield the best `limit` recommendations so far each time a source adds to them.
+        
+        The TMDB-backed sources run concurrently and get `deadline` seconds in
+        total; a source that runs out of time contributes what it has found so
+        far, or nothing. The first list arrives as soon as the fastest source
+        is done; the last one is what get_recommendations() returns.
+        Per-source timings end up in last_stage_timings, and how many
+        candidates each ranking stage saw in last_ranking_counters.
+        """
+        self._refresh_watched_index()
+        started = time.monotonic()
+        expires_at = started + deadline
+        timings = {}
+        pipeline = self._new_ranking_pipeline(limit)
+        self.last_ranking_counters = pipeline.counters
         
         # Get recommendations from different sources
-        recommendations.extend(self._get_genre_based_recommendations(limit // 3))
-        recommendations.extend(self._get_similar_content_recommendations(limit // 3))
-        recommendations.extend(self._get_trending_recommendations(limit // 3))
-        
-        # Remove duplicates and sort by score
-        seen_titles = set()
-        unique_recommendations = []
-        for rec in recommendations:
-            if rec['title'] not in seen_titles:
-                seen_titles.add(rec['title'])
-                unique_recommendations.append(rec)
-        
-        # Sort by score and return top recommendations
-        unique_recommendations.sort(key=lambda x: x['score'], reverse=True)
-        return unique_recommendations[:limit]
-    
-    def _get_genre_based_recommendations(self, limit: int) -> List[Dict]:
+        sources = {
+            'genre': self._get_genre_based_recommendations,
+            'similar': self._get_similar_content_recommendations,
+            'trending': self._get_trending_recommendations
+        }
+        # A pool per run: a source still blocked on a request after the deadline keeps its
+        # thread without holding up the sources of the next run
+        executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="recommendation-source")
+        self._source_executors.add(executor)
+        futures = {
+            executor.submit(self._run_source, source, limit // 3, expires_at, started): name
+            for name, source in sources.items()
+        }
+        stop = Future()  # waited on with the sources, so close() doesn't have to sit out the deadline
+        self._run_stops.add(stop)
+        
+        try:
+            remaining = len(futures)
+            for future in as_completed([*futures, stop], timeout=deadline):
+                if future is stop:
+                    return
+                results, timings[futures[future]] = future.result()
+                if pipeline.add(results):
+                    yield pipeline.results()
+                remaining -= 1
+                if not remaining:
+                    break  # stop only completes on close()
+        except FuturesTimeout:
+            for future, name in futures.items():
+                if not future.done():
+                    # Still blocked on a request; whatever it finds now is dropped
+                    timings[name] = {'seconds': round(time.monotonic() - started, 3), 'results': 0, 'status': 'timed out'}
+                    print(f"Recommendation source '{name}' missed the {deadline:.1f}s deadline")
+        finally:
+            executor.shutdown(wait=False)
+            self._source_executors.discard(executor)
+            self._run_stops.discard(stop)
+        
+        # Last, so the candidates the other sources fetched are part of the model; it is local and fast
+        if stop.done():
+            return
+        results, timings['content'] = self._run_source(
+            self._get_content_based_recommendations, limit // 3, None, time.monotonic()
+        )
+        if self._index_build is not None:
+            timings['content']['status'] = 'index not ready'
+        changed = pipeline.add(results)
+        # Also local: the offline catalog's credits, looked up through the people index
+        if stop.done():
+            return
+        results, timings['people'] = self._run_source(
+            self._get_people_based_recommendations, limit // 3, None, time.monotonic()
+        )
+        changed = pipeline.add(results) or changed
+        # And a walk over the recommendation graph, which now includes what the similar source fetched
+        if stop.done():
+            return
+        results, timings['graph'] = self._run_source(
+            self._get_graph_recommendations, limit // 3, None, time.monotonic()
+        )
+        changed = pipeline.add(results) or changed
+        self.last_stage_timings = timings
+        self.last_recommendations = pipeline.results()
+        self.save_snapshot()
+        if changed or not len(pipeline):
+            yield self.last_recommendations
+    
+    def save_snapshot(self):
+        """Save the derived state (watched index, genre map, last recommendations) to snapshot_path.
+        
+        Only state built from the current library is saved; the next engine
+        created for this database loads it instead of recomputing it. The
+        file is plain JSON, so loading it never runs code from disk.
+        """
+        if not self.snapshot_path or self.watched_index is None:
+            return
+        version = self.db.get_content_version()
+        if self.watched_index.version != version:
+            return
+        
+        snapshot = {
+            'format': SNAPSHOT_FORMAT,
+            'database_id': self.db.get_state('database_id'),
+            'version': version,
+            'watched_index': self.watched_index.state(),
+            'genre_map': {str(genre_id): name for genre_id, name in self.genre_map.items()},
+            'recommendations': self.last_recommendations
+        }
+        temp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, default=_json_scalar)
+            os.replace(temp_path, self.snapshot_path)  # readers never see a half-written snapshot
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error saving recommendation snapshot: {e}")
+    
+    def _load_snapshot(self) -> bool:
+        """Restore the state saved by save_snapshot(); False if there is none for the library as it is now.
+        
+        Anything wrong with the file (unreadable, another format, unexpected
+        contents) leaves the engine as it was, to be rebuilt from the library.
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if (not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT
+                    or snapshot.get('database_id') != self.db.get_state('database_id')
+                    or snapshot.get('version') != self.db.get_content_version()):
+                return False
+            
+            version = snapshot['version']
+            watched_index = WatchedIndex.from_state(snapshot['watched_index'], version)
+            genre_map = {int(genre_id): str(name) for genre_id, name in snapshot['genre_map'].items()}
+            recommendations = snapshot['recommendations']
+            if not isinstance(recommendations, list) or not all(isinstance(r, dict) for r in recommendations):
+                raise ValueError("recommendations are not a list of records")
+        except Exception as e:
+            print(f"Error loading recommendation snapshot: {e}")
+            return False
+        
+        self.watched_index = watched_index
+        self.genre_map = genre_map
+        self.last_recommendations = recommendations
+        return True
+    
+    def _new_ranking_pipeline(self, limit: int) -> RankingPipeline:
+        """The stages candidates go through; override to plug in other features, scoring or diversity"""
+        return RankingPipeline(limit, limit * RECOMMENDATION_POOL_FACTOR, RECOMMENDATION_DIVERSITY)
+    
+    def _run_source(self, source, limit: int, expires_at: float, started: float) -> Tuple[List[Dict], Dict]:
+        """Run one recommendation source, timing it and turning failures into an empty result"""
+        try:
+            results = source(limit, expires_at) if expires_at else source(limit)
+            status = 'cut short' if expires_at and time.monotonic() >= expires_at else 'complete'
+        except Exception as e:
+            print(f"Recommendation source {source.__name__} failed: {e}")
+            results, status = [], 'failed'
+        return results, {'seconds': round(time.monotonic() - started, 3), 'results': len(results), 'status': status}
+    
+    def _expired(self, expires_at: float) -> bool:
+        return expires_at is not None and time.monotonic() >= expires_at
+    
+    def _get_genre_based_recommendations(self, limit: int, expires_at: float = None) -> List[Dict]:
         """Get recommendations based on favorite genres"""
         recommendations = []
         
         # Get top genres
         top_genres = sorted(self.genre_weights.items(), key=lambda x: x[1], reverse=True)[:3]
+        genre_map = self._genre_mapping()
         
         for genre, weight in top_genres:
+            if self._expired(expires_at):
+                break
             # Get genre ID from TMDB
-            genre_map = self.tmdb.get_genre_mapping()
             genre_id = None
             for gid, gname in genre_map.items():
                 if gname.lower() == genre.lower():
@@ -73,22 +267,22 @@ class RecommendationEngine:
                     break
             
             if genre_id:
-                # Get movies and TV shows for this genre
-                movies = self.tmdb.get_discover('movie', genres=[genre_id])
-                tv_shows = self.tmdb.get_discover('tv', genres=[genre_id])
+                # Movies first, then TV shows; the TV shows are only requested if the movies run out
+                contents = self._take_unwatched(
+                    lambda page: self.tmdb.get_discover('movie', genres=[genre_id], page=page),
+                    RECOMMENDATIONS_PER_GENRE, expires_at
+                )
+                if len(contents) < RECOMMENDATIONS_PER_GENRE:
+                    contents += self._take_unwatched(
+                        lambda page: self.tmdb.get_discover('tv', genres=[genre_id], page=page),
+                        RECOMMENDATIONS_PER_GENRE - len(contents), expires_at
+                    )
                 
-                for content in (movies + tv_shows)[:3]:  # Limit per genre
-                    if not self._is_already_watched(content):
-                        rec = self._format_recommendation(
-                            content,
-                            f"You enjoy {genre} content (avg rating: {weight:.1f})",
-                            weight * 0.8
-                        )
-                        recommendations.append(rec)
+                recommendations += genre_recommendations(contents, genre, weight, self.tmdb.image_base_url)
         
         return recommendations
     
-    def _get_similar_content_recommendations(self, limit: int) -> List[Dict]:
+    def _get_similar_content_recommendations(self, limit: int, expires_at: float = None) -> List[Dict]:
         """Get recommendations based on highly rated content"""
         recommendations = []
         
@@ -98,133 +292,267 @@ class RecommendationEngine:
         
         # Sort by rating and get top items
         highly_rated.sort(key=lambda x: float(x['rating']), reverse=True)
+        quota = RECOMMENDATION_FAVOURITES * RECOMMENDATIONS_PER_FAVOURITE
+        found_ids = set()  # favourites often share recommendations; each title only counts once
+        new_title = lambda similar_content: similar_content.get('id') not in found_ids
         
-        for content in highly_rated[:5]:  # Top 5 highly rated
+        # Titles whose recommendations are all watched already make room for the next favourites,
+        # up to twice as many, so a library like that can't use up the whole deadline
+        for content in highly_rated[:RECOMMENDATION_FAVOURITES * 2]:
+            if len(recommendations) >= quota or self._expired(expires_at):
+                break
             if content['tmdb_id']:
                 content_type = 'movie' if content['type'] == 'movie' else 'tv'
-                similar = self.tmdb.get_recommendations(content['tmdb_id'], content_type)
+                similar = self._take_unwatched(
+                    lambda page: self._recommendations_page(content['tmdb_id'], content_type, page),
+                    RECOMMENDATIONS_PER_FAVOURITE, expires_at, new_title
+                )
                 
-                for similar_content in similar[:2]:  # 2 recommendations per highly rated item
-                    if not self._is_already_watched(similar_content):
-                        reason = f"You rated '{content['title']}' {content['rating']}/10"
-                        if content['director'] and similar_content.get('director'):
-                            if self._has_common_people(content['director'], similar_content.get('director', '')):
-                                reason += " - same director"
-                        
-                        rec = self._format_recommendation(
-                            similar_content,
-                            reason,
-                            float(content['rating']) * 0.1
-                        )
-                        recommendations.append(rec)
+                found_ids.update(similar_content.get('id') for similar_content in similar)
+                recommendations += similar_recommendations(
+                    similar, content, self.tmdb.image_base_url, self._same_director(content, similar)
+                )
         
-        return recommendations
+        return recommendations[:quota]
     
-    def _get_trending_recommendations(self, limit: int) -> List[Dict]:
+    def _get_trending_recommendations(self, limit: int, expires_at: float = None) -> List[Dict]:
         """Get recommendations from trending content that matches user preferences"""
-        recommendations = []
+        genre_map = self._genre_mapping()
         
-        trending = self.tmdb.get_trending('all', 'week')
+        # Only recommend if there's genre overlap
+        matching = lambda content: trending_match(content, self.genre_weights, genre_map)[0] > 0
+        trending = self._take_unwatched(lambda page: self.tmdb.get_trending('all', 'week', page), limit, expires_at,
+                                        matching)
         
-        for content in trending:
-            if not self._is_already_watched(content):
-                # Check if genres match user preferences
-                content_genres = content.get('genre_ids', [])
-                genre_map = self.tmdb.get_genre_mapping()
-                
-                score = 0
-                matching_genres = []
-                
-                for genre_id in content_genres:
-                    genre_name = genre_map.get(genre_id, '')
-                    if genre_name in self.genre_weights:
-                        score += self.genre_weights[genre_name]
-                        matching_genres.append(genre_name)
-                
-                if score > 0:  # Only recommend if there's genre overlap
-                    reason = f"Trending this week"
-                    if matching_genres:
-                        reason += f" - matches your interest in {', '.join(matching_genres[:2])}"
-                    
-                    rec = self._format_recommendation(
-                        content,
-                        reason,
-                        score * 0.6 + 0.3  # Trending bonus
-                    )
-                    recommendations.append(rec)
+        return trending_recommendations(trending, self.genre_weights, genre_map, self.tmdb.image_base_url)
+    
+    def _recommendations_page(self, tmdb_id: int, content_type: str, page: int) -> List[Dict]:
+        """A page of TMDB's recommendations for a title, read from the recommendation graph while it is fresh"""
+        if self.graph is None:
+            return self.tmdb.get_recommendations(tmdb_id, content_type, page)
         
-        return recommendations[:limit]
+        key = encode_key((content_type, tmdb_id))
+        results = self.graph.page(key, page)
+        if results is None:
+            results = self.tmdb.get_recommendations(tmdb_id, content_type, page)
+            if results:  # an empty page may just be a failed request
+                self.graph.record(key, page, results)
+        return results
     
-    def _is_already_watched(self, tmdb_content: Dict) -> bool:
-        """Check if content is already in user's watch list"""
-        watched_content = self.db.get_all_content()
+    def _take_unwatched(self, fetch_page: Callable[[int], List[Dict]], count: int, expires_at: float = None,
+                        accept: Callable[[Dict], bool] = None) -> List[Dict]:
+        """The first `count` results not in the user's list (and accepted), fetching pages only as needed.
         
-        # Check by TMDB ID first
-        tmdb_id = tmdb_content.get('id')
-        if tmdb_id:
-            for content in watched_content:
-                if content['tmdb_id'] == tmdb_id:
-                    return True
+        Pages are requested one at a time and filtered as they arrive, so a
+        source stops making requests as soon as it has enough; pages are
+        only read further when the first ones are mostly watched. Every
+        result fetched goes into the content model.
+        """
+        found, seen = [], []
+        for page in range(1, RECOMMENDATION_MAX_PAGES + 1):
+            if len(found) >= count or self._expired(expires_at):
+                break
+            results = fetch_page(page)
+            if not results:  # past the last page
+                break
+            seen += results
+            found += [content for content in self._filter_unwatched(results) if accept is None or accept(content)]
         
-        # Check by title similarity
-        title = tmdb_content.get('title') or tmdb_content.get('name', '')
-        for content in watched_content:
-            if fuzz.ratio(title.lower(), content['title'].lower()) > 85:
-                return True
+        self._add_model_candidates(seen)
+        return found[:count]
+    
+    def _get_content_based_recommendations(self, limit: int) -> List[Dict]:
+        """Get recommendations from the local content model: titles most like the user's favourites"""
+        model = self._get_content_model()
+        
+        watched_content = self.db.get_all_content(status='watched')
+        highly_rated = [c for c in watched_content if c['rating'] and float(c['rating']) >= self.rating_threshold]
+        if not highly_rated or not len(model):
+            return []
         
-        return False
+        library_keys = {(c['type'], c['tmdb_id']) for c in self.db.get_all_content() if c['tmdb_id']}
+        with self._model_lock:
+            liked_vectors = model.vectorize_many([item_from_library(c) for c in highly_rated])
+            profile = model.profile(liked_vectors, [float(c['rating']) for c in highly_rated])
+            # Over-fetch: fuzzy title matches against the library are only filtered out afterwards
+            matches = model.top_k(profile, limit * 3, exclude=library_keys)
+        unwatched_ids = {id(content) for content in self._filter_unwatched([item['result'] for item, _ in matches])}
+        matches = [(item, similarity) for item, similarity in matches if id(item['result']) in unwatched_ids][:limit]
+        
+        with self._model_lock:
+            favourite_similarity = model.vectorize_many([item for item, _ in matches]) @ liked_vectors.T
+        return content_recommendations(
+            [item['result'] for item, _ in matches], [similarity for _, similarity in matches],
+            favourite_similarity, highly_rated, self.tmdb.image_base_url
+        )
     
-    def _format_recommendation(self, tmdb_content: Dict, reason: str, score: float) -> Dict:
-        """Format TMDB content as recommendation"""
-        content_type = 'movie' if 'title' in tmdb_content else 'tv'
-        title = tmdb_content.get('title') or tmdb_content.get('name', '')
+    def _get_people_based_recommendations(self, limit: int) -> List[Dict]:
+        """Get recommendations from the catalog: titles by the directors and actors of the user's favourites"""
+        catalog = self.tmdb.catalog
+        if not catalog or not catalog.has_data():
+            return []
         
-        return {
-            'title': title,
-            'type': content_type,
-            'reason': reason,
-            'score': score,
-            'tmdb_id': tmdb_content.get('id'),
-            'poster_url': f"{self.tmdb.image_base_url}{tmdb_content.get('poster_path')}" if tmdb_content.get('poster_path') else None,
-            'overview': tmdb_content.get('overview', ''),
-            'year': self._extract_year(tmdb_content),
-            'rating': tmdb_content.get('vote_average', 0)
+        favourite_people = {
+            (person['role'], person_key(person['name'])): person
+            for person in self.db.get_favourite_people(self.rating_threshold)
         }
+        if not favourite_people:
+            return []
+        # Over-fetch: library titles are only filtered out afterwards
+        matches = catalog.sharing_people([(person['role'], person['name']) for person in favourite_people.values()],
+                                         limit * 3)
+        return people_recommendations(self._filter_unwatched(matches)[:limit], favourite_people,
+                                      self.tmdb.image_base_url)
     
-    def _extract_year(self, tmdb_content: Dict) -> int:
-        """Extract year from TMDB content"""
-        date_field = tmdb_content.get('release_date') or tmdb_content.get('first_air_date', '')
-        if date_field:
-            try:
-                return int(date_field[:4])
-            except (ValueError, IndexError):
-                pass
-        return None
-    
-    def _has_common_people(self, people1: str, people2: str) -> bool:
-        """Check if two people strings have common names"""
-        if not people1 or not people2:
-            return False
+    def _get_graph_recommendations(self, limit: int) -> List[Dict]:
+        """Get recommendations from the recommendation graph: a random walk that keeps restarting at favourites"""
+        adjacency = self._get_graph_adjacency()
+        if adjacency is None or not len(adjacency):
+            return []
+        
+        library = [(content, adjacency.position(encode_key(('movie' if content['type'] == 'movie' else 'tv',
+                                                            content['tmdb_id']))))
+                   for content in self.db.get_all_content() if content['tmdb_id']]
+        seeds, favourites = {}, {}
+        for content, position in library:
+            if (position is not None and content['status'] == 'watched' and content['rating']
+                    and float(content['rating']) >= self.rating_threshold):
+                # The better the rating, the more often the walk starts over from the title
+                seeds[position] = float(content['rating']) - self.rating_threshold + 1
+                favourites[position] = content
+        if not seeds:
+            return []
         
-        names1 = set(name.strip().lower() for name in people1.split(','))
-        names2 = set(name.strip().lower() for name in people2.split(','))
+        scores = personalized_pagerank(adjacency, seeds, RECOMMENDATION_GRAPH_RESTART)
+        scores[[position for _, position in library if position is not None]] = 0
+        # Over-fetch: titles without a stored result or fuzzy-matching the library are only dropped afterwards
+        count = min(limit * 3, int(np.count_nonzero(scores)))
+        top = np.argpartition(-scores, count - 1)[:count] if count else []
+        top = sorted(top, key=lambda position: -scores[position])
+        stored = self.graph.results(adjacency.nodes[top])
+        candidates = [(position, stored[adjacency.nodes[position]]) for position in top
+                      if adjacency.nodes[position] in stored]
+        unwatched_ids = {id(content) for content in self._filter_unwatched([content for _, content in candidates])}
+        candidates = [(position, content) for position, content in candidates if id(content) in unwatched_ids][:limit]
         
-        return bool(names1.intersection(names2))
+        linked = []
+        for position, _ in candidates:
+            neighbours = [favourites[n] for n in adjacency.neighbours(position).tolist() if n in favourites]
+            linked.append(max(neighbours, key=lambda content: float(content['rating']), default=None))
+        return graph_recommendations([content for _, content in candidates],
+                                     [scores[position] for position, _ in candidates], linked,
+                                     RECOMMENDATION_GRAPH_RESTART / len(seeds), self.tmdb.image_base_url)
+    
+    def _get_graph_adjacency(self) -> Optional[GraphAdjacency]:
+        """The recommendation graph's sparse arrays, loaded again only once the graph has grown"""
+        if self.graph is None:
+            return None
+        if self._graph_adjacency is None or self._graph_adjacency.version != self.graph.version():
+            self._graph_adjacency = self.graph.load_adjacency()
+        return self._graph_adjacency
+    
+    def _same_director(self, favourite: Dict, contents: List[Dict]) -> Set[int]:
+        """TMDB ids of the contents the catalog credits a director of the favourite with"""
+        catalog = self.tmdb.catalog
+        directors = {person_key(name) for name in split_people(favourite.get('director'))}
+        if not directors or not contents or not catalog or not catalog.has_data():
+            return set()
+        
+        people = catalog.people_of(('movie' if 'title' in c else 'tv', c.get('id')) for c in contents)
+        return {tmdb_id for (_, tmdb_id), names in people.items() if names & directors}
+    
+    def _get_content_model(self) -> ContentModel:
+        """The content model, based on the offline catalog's content index once that is built"""
+        with self._model_lock:
+            if self._index_build is not None and not self._index_build.is_alive():
+                self._index_build = None
+                self.content_model = None  # start over from the finished index
+            if self.content_model is None:
+                catalog = self.tmdb.catalog
+                if catalog and catalog.has_data():
+                    self.content_model = ContentModel(base=self._load_content_index(catalog))
+                    if self.content_model.base is None and self._index_build is None:
+                        # No index to be had: the catalog's best-known titles, held in memory
+                        genre_map = catalog.genre_mapping()
+                        self.content_model.add_items(
+                            item_from_result(result, genre_map)
+                            for result in catalog.iter_described(CONTENT_MODEL_MAX_CANDIDATES)
+                        )
+                else:
+                    self.content_model = ContentModel()
+            return self.content_model
+    
+    def _load_content_index(self, catalog):
+        """The catalog's persisted vector index; None while it is built in the background, or if it can't be.
+        
+        Building takes minutes for a full catalog, so it never holds up a
+        recommendation run: the runs before it is done do without it.
+        """
+        version = catalog.version()
+        index = ContentIndex.load(content_index_directory(catalog), version)
+        if index is None and self._index_failed != version:
+            self._index_build = threading.Thread(target=self._build_content_index, args=(catalog, version),
+                                                 name="content-index-build", daemon=True)
+            self._index_build.start()
+        return index
+    
+    def _build_content_index(self, catalog, version: str):
+        try:
+            build_content_index(catalog, version)
+        except OSError as e:
+            print(f"Error building content index: {e}")
+            self._index_failed = version
+    
+    def _add_model_candidates(self, results: List[Dict]):
+        """Add TMDB list results seen by the other sources to the content model"""
+        if not results:
+            return
+        genre_map = self._genre_mapping()
+        model = self._get_content_model()
+        with self._model_lock:
+            model.add_items(item_from_result(result, genre_map) for result in results)
+    
+    def _genre_mapping(self) -> Dict[int, str]:
+        """TMDB genre id -> name, fetched once per engine (and kept in the snapshot)"""
+        if not self.genre_map:
+            self.genre_map = self.tmdb.get_genre_mapping()
+        return self.genre_map
+    
+    def _refresh_watched_index(self):
+        """Rebuild the watched index if the library changed since it was built"""
+        version = self.db.get_content_version()
+        if self.watched_index is None or self.watched_index.version != version:
+            self.watched_index = WatchedIndex(self.db.get_all_content(), version)
+    
+    def _is_already_watched(self, tmdb_content: Dict) -> bool:
+        """Check if content is already in user's watch list"""
+        if self.watched_index is None:
+            self._refresh_watched_index()
+        
+        title = tmdb_content.get('title') or tmdb_content.get('name', '')
+        return self.watched_index.contains(tmdb_content.get('id'), title)
+    
+    def _filter_unwatched(self, contents: List[Dict]) -> List[Dict]:
+        """Drop contents already in the user's list, checking them all in one batch"""
+        if self.watched_index is None:
+            self._refresh_watched_index()
+        
+        return unwatched(contents, self.watched_index)
     
     def get_content_suggestions_by_title(self, title: str, limit: int = 5) -> List[Dict]:
         """Get suggestions when user searches for a specific title"""
         search_results = self.tmdb.search_content(title)
         suggestions = []
+        self._refresh_watched_index()
         
-        for result in search_results[:limit]:
-            if not self._is_already_watched(result):
-                content_type = 'movie' if 'title' in result else 'tv'
-                formatted = self._format_recommendation(
-                    result,
-                    "Search result",
-                    result.get('vote_average', 0) / 10
-                )
-                suggestions.append(formatted)
+        for result in self._filter_unwatched(search_results[:limit]):
+            formatted = format_recommendation(
+                result,
+                "Search result",
+                result.get('vote_average', 0) / 10,
+                self.tmdb.image_base_url
+            )
+            suggestions.append(formatted)
         
         return suggestions
     
@@ -232,6 +560,20 @@ class RecommendationEngine:
         """Update genre preferences based on latest watch history"""
         self.genre_weights = self._calculate_genre_preferences()
     
+    def close(self):
+        """End the runs in progress and stop their source worker threads; engines created per profile in a long-lived process need this.
+        
+        A run being iterated returns at its next step instead of waiting out
+        the deadline, so a caller waiting for it doesn't hang.
+        """
+        for stop in list(self._run_stops):
+            try:
+                stop.set_result(None)  # cancel() wouldn't wake as_completed()
+            except InvalidStateError:
+                pass  # closed twice
+        for executor in list(self._source_executors):
+            executor.shutdown(wait=False, cancel_futures=True)
+    
     def get_recommendation_explanation(self, content_title: str) -> str:
         """Get detailed explanation for why content was recommended"""
         # This could be expanded to provide more detailed explanations
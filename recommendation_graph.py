@@ -0,0 +1,200 @@
+import json
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from content_model import encode_key
+from config import RECOMMENDATION_GRAPH_TTL, RECOMMENDATION_GRAPH_RESTART
+
+TMDB_PAGE_SIZE = 20     # results per TMDB list page, for ranking titles across pages
+POSITION_DECAY = 0.05   # an edge weighs 1 / (1 + POSITION_DECAY * rank): TMDB's first picks count most
+REVERSE_WEIGHT = 0.5    # weight of the walk going against an edge, relative to going along it
+
+def result_key(result: Dict) -> Optional[int]:
+    """Graph node of a TMDB list result (a content_model.encode_key() int)"""
+    content_type = result.get('media_type') or ('movie' if 'title' in result else 'tv')
+    return encode_key((content_type, result.get('id')))
+
+class GraphAdjacency:
+    """The recommendation graph as sparse arrays (CSR): node i links to indices[indptr[i]:indptr[i + 1]].
+
+    nodes holds the sorted node keys; each row's weights sum to 1, so they
+    are the walk's transition probabilities. Edges go both ways, the
+    reverse direction weighted by REVERSE_WEIGHT, so titles recommended
+    alongside each other are connected too.
+    """
+
+    def __init__(self, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray, version: int = 0):
+        self.version = version
+        count = len(sources)
+        self.nodes, rows = np.unique(np.concatenate([sources, targets]), return_inverse=True)
+        columns = np.concatenate([rows[count:], rows[:count]])  # each edge's other end, reversed edges included
+        weights = np.concatenate([weights, weights * REVERSE_WEIGHT])
+        order = np.argsort(rows, kind='stable')
+        self.rows = rows[order]
+        self.indices = columns[order]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(self.rows, minlength=len(self.nodes)))])
+        weights = weights[order]
+        self.weights = weights / np.bincount(self.rows, weights, minlength=len(self.nodes))[self.rows]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def position(self, key: int) -> Optional[int]:
+        """Row of a node key, or None if the graph doesn't have it"""
+        position = int(np.searchsorted(self.nodes, key))
+        return position if position < len(self.nodes) and self.nodes[position] == key else None
+
+    def neighbours(self, position: int) -> np.ndarray:
+        return self.indices[self.indptr[position]:self.indptr[position + 1]]
+
+def personalized_pagerank(adjacency: GraphAdjacency, seeds: Dict[int, float],
+                          restart: float = RECOMMENDATION_GRAPH_RESTART, iterations: int = 50,
+                          tolerance: float = 1e-8) -> np.ndarray:
+    """Random walk with restart: how often a walk that keeps jumping back to the seeds visits each node.
+
+    seeds maps rows of the adjacency to how often the walk restarts there
+    (normalized). Power iteration; stops once an iteration moves less than
+    tolerance in total.
+    """
+    restart_vector = np.zeros(len(adjacency))
+    for position, weight in seeds.items():
+        restart_vector[position] += weight
+    restart_vector /= restart_vector.sum()
+
+    scores = restart_vector
+    for _ in range(iterations):
+        spread = np.bincount(adjacency.indices, scores[adjacency.rows] * adjacency.weights, minlength=len(adjacency))
+        updated = (1 - restart) * spread + restart * restart_vector
+        updated += (1 - updated.sum()) * restart_vector  # mass rounded away goes back to the seeds
+        converged = np.abs(updated - scores).sum() < tolerance
+        scores = updated
+        if converged:
+            break
+    return scores
+
+class RecommendationGraph:
+    """Item-to-item graph of TMDB's /recommendations lists, kept in an SQLite file.
+
+    Every recommendations page fetched is stored as edges from the title to
+    the titles listed on it, so the graph grows with each run (and with
+    every profile sharing the file); a page stored less than ttl seconds
+    ago is read from here instead of TMDB. Nodes keep the list result they
+    were last seen in, so titles a walk reaches can be shown without
+    fetching them.
+    """
+
+    def __init__(self, path: str, ttl: float = RECOMMENDATION_GRAPH_TTL):
+        self.path = path
+        self.ttl = ttl
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode = WAL")  # readers don't block the one writer
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS nodes (
+                id INTEGER PRIMARY KEY,
+                result TEXT
+            );
+            CREATE TABLE IF NOT EXISTS edges (
+                source INTEGER NOT NULL,
+                target INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (source, target)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS expansions (
+                node INTEGER PRIMARY KEY,
+                pages INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS graph_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO graph_state (key, value) VALUES ('version', 0);
+        """)
+        conn.commit()
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Several processes write; wait for the lock rather than failing
+        return sqlite3.connect(self.path, timeout=30)
+
+    def version(self) -> int:
+        """Goes up with every page recorded; an adjacency loaded at an older version is out of date"""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT value FROM graph_state WHERE key = 'version'").fetchone()[0]
+        finally:
+            conn.close()
+
+    def page(self, key: int, page: int) -> Optional[List[Dict]]:
+        """The stored results of a title's recommendations page; None if it isn't stored or is out of date"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT pages, fetched_at FROM expansions WHERE node = ?", (key,)).fetchone()
+            if not row or row[0] < page or row[1] < time.time() - self.ttl:
+                return None
+            rows = conn.execute("""
+                SELECT n.result FROM edges e JOIN nodes n ON n.id = e.target
+                WHERE e.source = ? AND e.page = ? AND n.result IS NOT NULL
+                ORDER BY e.position
+            """, (key, page)).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(result) for result, in rows]
+
+    def record(self, key: int, page: int, results: List[Dict]):
+        """Store a recommendations page fetched from TMDB for the title `key`.
+
+        Fetching page 1 again starts the title's expiry over; the edges of
+        pages not fetched again are kept, as the graph only gains from them.
+        """
+        nodes = [(result_key(result), json.dumps(result)) for result in results]
+        nodes = [(node, result) for node, result in nodes if node is not None and node != key]
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR IGNORE INTO nodes (id, result) VALUES (?, NULL)", (key,))
+            conn.executemany("INSERT OR REPLACE INTO nodes (id, result) VALUES (?, ?)", nodes)
+            conn.execute("DELETE FROM edges WHERE source = ? AND page = ?", (key, page))
+            conn.executemany(
+                "INSERT OR REPLACE INTO edges (source, target, page, position) VALUES (?, ?, ?, ?)",
+                [(key, node, page, position) for position, (node, _) in enumerate(nodes)]
+            )
+            if page == 1:
+                conn.execute("INSERT OR REPLACE INTO expansions (node, pages, fetched_at) VALUES (?, 1, ?)",
+                             (key, time.time()))
+            else:
+                conn.execute("UPDATE expansions SET pages = MAX(pages, ?) WHERE node = ?", (page, key))
+            conn.execute("UPDATE graph_state SET value = value + 1 WHERE key = 'version'")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def load_adjacency(self) -> GraphAdjacency:
+        """All edges as a GraphAdjacency, weighted by where TMDB listed them"""
+        conn = self._connect()
+        try:
+            version = conn.execute("SELECT value FROM graph_state WHERE key = 'version'").fetchone()[0]
+            edges = np.array(conn.execute("SELECT source, target, page, position FROM edges").fetchall(),
+                             dtype=np.int64).reshape(-1, 4)
+        finally:
+            conn.close()
+        ranks = (edges[:, 2] - 1) * TMDB_PAGE_SIZE + edges[:, 3]
+        return GraphAdjacency(edges[:, 0], edges[:, 1], 1.0 / (1.0 + POSITION_DECAY * ranks), version)
+
+    def results(self, keys: Iterable[int]) -> Dict[int, Dict]:
+        """key -> stored list result, for the keys that have one"""
+        keys = [int(key) for key in keys]
+        found = {}
+        conn = self._connect()
+        try:
+            for start in range(0, len(keys), 400):
+                chunk = keys[start:start + 400]
+                rows = conn.execute(
+                    f"SELECT id, result FROM nodes WHERE result IS NOT NULL AND id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update((key, json.loads(result)) for key, result in rows)
+        finally:
+            conn.close()
+        return found
@@ -0,0 +1,138 @@
+import time
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from tmdb_records import TitleDetails
+
+RECORD_TAG = "__title_details__"  # marks a TitleDetails stored as JSON
+
+class MemoryResponseCache:
+    """In-process TTL cache of decoded TMDB responses with LRU eviction.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteResponseCache:
+    """TTL cache of decoded TMDB responses in an SQLite file, shared by processes.
+
+    Same interface as MemoryResponseCache. Values are stored as JSON
+    (TitleDetails records included), so reading a shared file never runs
+    code from it; entries that don't decode count as misses. Reading never
+    writes, so entries are evicted oldest-written first rather than least
+    recently used; expired and surplus entries are pruned every
+    PRUNE_INTERVAL writes.
+    """
+
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode = WAL")  # readers don't block the one writer
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL,
+                value BLOB NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses (expires_at)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Several processes write; wait for the lock rather than failing
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        try:
+            return json.loads(row[0], object_hook=_decode_record)
+        except ValueError:  # e.g. written by an older version
+            return None
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_INTERVAL == 0
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, time.time() + self.ttl, json.dumps(value, default=_encode_record))
+            )
+            if prune:
+                self._prune(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
+        conn.close()
+
+    def _prune(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        conn.execute("""
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY expires_at
+                LIMIT MAX((SELECT COUNT(*) FROM responses) - ?, 0)
+            )
+        """, (self.max_entries,))
+
+def _encode_record(value: Any) -> Dict:
+    if isinstance(value, TitleDetails):
+        return {RECORD_TAG: {name: getattr(value, name) for name in TitleDetails.__slots__}}
+    raise TypeError(f"{type(value).__name__} can't be cached")
+
+def _decode_record(obj: Dict) -> Any:
+    fields = obj.get(RECORD_TAG)
+    if fields is None or len(obj) != 1:
+        return obj
+    # JSON has no tuples; the record's sequence fields are tuples
+    return TitleDetails(**{name: tuple(value) if isinstance(value, list) else value for name, value in fields.items()})
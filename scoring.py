@@ -0,0 +1,147 @@
+from typing import Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from people_index import person_key
+
+# Every function here works on plain records (TMDB list results, library rows,
+# preference dicts, arrays) and never touches the database, TMDB or the clock,
+# so scoring can be benchmarked and tested on its own. RecommendationEngine
+# fetches the inputs and hands them over.
+
+GENRE_FACTOR = 0.8       # genre source: preference for the genre x this
+SIMILAR_FACTOR = 0.1     # similar-content source: the favourite's rating (0-10) x this
+TRENDING_FACTOR = 0.6    # trending source: summed preference of matching genres x this...
+TRENDING_BONUS = 0.3     # ...plus this
+CONTENT_FACTOR = 5       # content source: cosine similarity, scaled to the range of the genre-based scores
+PEOPLE_FACTOR = 0.1      # people source: rating of the favourite a shared person worked on x this...
+ROLE_WEIGHTS = {'director': 1.0, 'actor': 0.5}  # ...x this, summed over everyone shared
+GRAPH_FACTOR = 10        # graph source: r / (1 + r) x this, r being the walk score relative to a favourite's restart mass
+
+def format_recommendation(content: Dict, reason: str, score: float, image_base_url: str) -> Dict:
+    """A TMDB list result as a recommendation"""
+    poster_path = content.get('poster_path')
+    return {
+        'title': content.get('title') or content.get('name', ''),
+        'type': 'movie' if 'title' in content else 'tv',
+        'reason': reason,
+        'score': score,
+        'tmdb_id': content.get('id'),
+        'poster_url': f"{image_base_url}{poster_path}" if poster_path else None,
+        'overview': content.get('overview', ''),
+        'year': extract_year(content),
+        'rating': content.get('vote_average', 0),
+        'genre_ids': content.get('genre_ids', [])
+    }
+
+def extract_year(content: Dict) -> Optional[int]:
+    date_field = content.get('release_date') or content.get('first_air_date', '')
+    if date_field:
+        try:
+            return int(date_field[:4])
+        except (ValueError, IndexError):
+            pass
+    return None
+
+def unwatched(contents: List[Dict], watched_index) -> List[Dict]:
+    """Contents not in the library (a watched_index.WatchedIndex), checked in one batch"""
+    watched = watched_index.contains_many([(c.get('id'), c.get('title') or c.get('name', '')) for c in contents])
+    return [content for content, is_watched in zip(contents, watched) if not is_watched]
+
+def genre_recommendations(contents: Iterable[Dict], genre: str, weight: float, image_base_url: str) -> List[Dict]:
+    """Recommendations for titles found by browsing one of the user's favourite genres"""
+    reason = f"You enjoy {genre} content (avg rating: {weight:.1f})"
+    return [format_recommendation(content, reason, weight * GENRE_FACTOR, image_base_url) for content in contents]
+
+def similar_recommendations(contents: Iterable[Dict], favourite: Dict, image_base_url: str,
+                            same_director: Collection[int] = ()) -> List[Dict]:
+    """Recommendations for titles TMDB recommends for a library row the user rated highly.
+
+    same_director holds the TMDB ids of the contents known to share a
+    director with the favourite.
+    """
+    recommendations = []
+    for content in contents:
+        reason = f"You rated '{favourite['title']}' {favourite['rating']}/10"
+        if content.get('id') in same_director:
+            reason += " - same director"
+        score = float(favourite['rating']) * SIMILAR_FACTOR
+        recommendations.append(format_recommendation(content, reason, score, image_base_url))
+    return recommendations
+
+def trending_match(content: Dict, genre_weights: Dict[str, float], genre_map: Dict[int, str]) -> Tuple[float, List[str]]:
+    """(summed preference, names) of the content's genres the user has preferences for"""
+    names = [genre_map.get(genre_id, '') for genre_id in content.get('genre_ids', [])]
+    matching = [name for name in names if name in genre_weights]
+    return sum(genre_weights[name] for name in matching), matching
+
+def trending_recommendations(contents: Iterable[Dict], genre_weights: Dict[str, float],
+                             genre_map: Dict[int, str], image_base_url: str) -> List[Dict]:
+    """Recommendations for trending titles; titles sharing no genre with the user's preferences are left out"""
+    recommendations = []
+    for content in contents:
+        score, matching = trending_match(content, genre_weights, genre_map)
+        if score > 0:
+            reason = f"Trending this week - matches your interest in {', '.join(matching[:2])}"
+            recommendations.append(
+                format_recommendation(content, reason, score * TRENDING_FACTOR + TRENDING_BONUS, image_base_url)
+            )
+    return recommendations
+
+def content_recommendations(contents: Sequence[Dict], similarities: Sequence[float], favourite_similarity: np.ndarray,
+                            favourites: Sequence[Dict], image_base_url: str) -> List[Dict]:
+    """Recommendations for titles the content model found most like the user's favourites.
+
+    favourite_similarity holds one row per content and one column per
+    favourite; each recommendation names the favourite it is closest to.
+    """
+    closest = np.argmax(favourite_similarity, axis=1) if len(contents) else []
+    recommendations = []
+    for content, similarity, favourite in zip(contents, similarities, closest):
+        favourite = favourites[int(favourite)]
+        reason = f"Similar to '{favourite['title']}', which you rated {favourite['rating']}/10"
+        recommendations.append(format_recommendation(content, reason, similarity * CONTENT_FACTOR, image_base_url))
+    return recommendations
+
+def people_recommendations(contents: Iterable[Dict], favourite_people: Dict[Tuple[str, str], Dict],
+                           image_base_url: str) -> List[Dict]:
+    """Recommendations for titles crediting people who worked on the user's favourites.
+
+    Each content lists the (role, name) people it shares in 'shared_people';
+    favourite_people maps (role, person_key(name)) to the best rated
+    favourite ({'title', 'rating'}) that person worked on.
+    """
+    recommendations = []
+    for content in contents:
+        shared = [(role, name, favourite_people[role, person_key(name)]) for role, name in content['shared_people']
+                  if (role, person_key(name)) in favourite_people]
+        if not shared:
+            continue
+        shared.sort(key=lambda person: (-ROLE_WEIGHTS[person[0]], -float(person[2]['rating'])))
+        role, name, favourite = shared[0]
+        reason = f"{'Directed by' if role == 'director' else 'With'} {name}, like '{favourite['title']}', " \
+                 f"which you rated {favourite['rating']}/10"
+        if len(shared) > 1:
+            reason += f" (+{len(shared) - 1} more you like)"
+        score = PEOPLE_FACTOR * sum(ROLE_WEIGHTS[role] * float(favourite['rating']) for role, _, favourite in shared)
+        recommendations.append(format_recommendation(content, reason, score, image_base_url))
+    return recommendations
+
+def graph_recommendations(contents: Sequence[Dict], walk_scores: Sequence[float],
+                          favourites: Sequence[Optional[Dict]], seed_mass: float, image_base_url: str) -> List[Dict]:
+    """Recommendations for titles a random walk from the user's favourites reached in the recommendation graph.
+
+    favourites holds, per content, the favourite it is directly linked to
+    (or None when the walk got there through other titles). seed_mass is
+    the share of the walk that restarts at an average favourite: a title
+    visited that often gets half of GRAPH_FACTOR. Scores are absolute, so
+    they don't depend on what else the walk reached.
+    """
+    recommendations = []
+    for content, walk_score, favourite in zip(contents, walk_scores, favourites):
+        if favourite:
+            reason = f"Recommended alongside '{favourite['title']}', which you rated {favourite['rating']}/10"
+        else:
+            reason = "Reached from your favourites through TMDB's recommendation lists"
+        relative = float(walk_score) / seed_mass
+        score = relative / (1 + relative) * GRAPH_FACTOR
+        recommendations.append(format_recommendation(content, reason, score, image_base_url))
+    return recommendations
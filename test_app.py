@@ -56,6 +56,31 @@ def test_database():
         assert updated_content[0]['rating'] == 9.0
         print("✓ Updated content successfully")
         
+        # Test running preference totals
+        def rounded(stats):
+            return {dimension: {value: tuple(round(x, 9) for x in totals) for value, totals in values.items()}
+                    for dimension, values in stats.items()}
+        
+        assert set(db.get_preference_stats()['genre']) == {'Action', 'Drama'}
+        second_id = db.add_content({'title': 'Second', 'type': 'tv', 'genre': 'Drama', 'rating': 7.0,
+                                    'language': 'Korean', 'year': 1999, 'date_watched': '2020-03-01'})
+        db.update_content(second_id, {'genre': 'Comedy, Drama'})
+        stats = db.get_preference_stats()
+        assert stats['genre']['Comedy'][0] < stats['genre']['Action'][0]  # watched longer ago
+        assert set(stats['decade']) == {'1990s', '2020s'}
+        incremental = rounded(stats)
+        db.rebuild_preference_stats()
+        assert rounded(db.get_preference_stats()) == incremental
+        db.update_content_batch([(second_id, {'status': 'want_to_watch'})])
+        assert 'Comedy' not in db.get_preference_stats()['genre']
+        db.update_content(second_id, {'status': 'watched'})
+        db.delete_content(second_id)
+        incremental = rounded(db.get_preference_stats())
+        db.rebuild_preference_stats()
+        assert rounded(db.get_preference_stats()) == incremental
+        assert set(incremental['genre']) == {'Action', 'Drama'} and 'Korean' not in incremental['language']
+        print("✓ Preference totals maintained incrementally, equal to a full rebuild")
+        
         # Test statistics
         stats = db.get_stats()
         assert stats['total_watched'] == 1
@@ -120,6 +145,28 @@ def test_tmdb_api():
         assert 'Action' in formatted['genre']
         print("✓ Data formatting works correctly")
         
+        import threading
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        class PortalHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = b"<html>Sign in to the hotel Wi-Fi</html>"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, format, *args):
+                pass
+        portal = HTTPServer(("127.0.0.1", 0), PortalHandler)
+        threading.Thread(target=portal.serve_forever, daemon=True).start()
+        try:
+            api = TMDBApi(api_key="test", base_url=f"http://127.0.0.1:{portal.server_address[1]}", metrics_file=None)
+            assert api.get_recommendations(603, 'movie') == []
+            assert list(api.iter_search("matrix")) == []
+        finally:
+            portal.shutdown()
+            portal.server_close()
+        print("✓ Non-JSON responses handled like failed requests")
+        
         print("✓ TMDB API tests passed!")
         
     except Exception as e:
@@ -128,6 +175,1405 @@ def test_tmdb_api():
     
     return True
 
+def test_tmdb_records():
+    """Test projection of TMDB details payloads onto compact records"""
+    print("\nTesting TMDB record parsing...")
+    
+    try:
+        import json
+        from tmdb_api import TMDBApi
+        from tmdb_records import TitleDetails, parse_title_details, parse_list_page
+        from mock_tmdb_server import FIXTURES_DIR
+        
+        with open(os.path.join(FIXTURES_DIR, 'movie', '_default.json'), 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        
+        record = parse_title_details(payload, 'movie')
+        assert isinstance(record, TitleDetails)
+        assert not hasattr(record, '__dict__')
+        assert record.directors == ('Christopher Nolan',)
+        assert len(record.actors) == 5
+        print("✓ Details projected onto a slotted record")
+        
+        api = TMDBApi(api_key="test")
+        assert api.format_content_data(record, 'movie') == api.format_content_data(payload, 'movie')
+        print("✓ Records format the same as raw payloads")
+        
+        page = parse_list_page({'page': 1, 'total_pages': 2,
+                                'results': [{'id': 1, 'title': 'A', 'backdrop_path': '/a.jpg', 'video': False}]})
+        assert page['results'] == [{'id': 1, 'title': 'A'}]
+        print("✓ List results trimmed to the fields in use")
+        
+        print("✓ TMDB record parsing tests passed!")
+        
+    except Exception as e:
+        print(f"✗ TMDB record parsing test failed: {e}")
+        return False
+    
+    return True
+
+def test_tmdb_single_flight():
+    """Test that concurrent identical TMDB requests share one HTTP call"""
+    print("\nTesting TMDB request coalescing...")
+    
+    try:
+        import threading
+        import time
+        import tmdb_api
+        from tmdb_api import TMDBApi
+        
+        calls = []
+        
+        class FakeResponse:
+            status_code = 200
+            content = b'{"results": [{"id": 1, "title": "Shared"}]}'
+            
+            def raise_for_status(self):
+                pass
+            
+            def json(self):
+                return {"results": [{"id": 1, "title": "Shared"}]}
+        
+        def fake_get(url, params=None, **kwargs):
+            calls.append(url)
+            time.sleep(0.2)
+            return FakeResponse()
+        
+        original_get = tmdb_api.requests.get
+        tmdb_api.requests.get = fake_get
+        try:
+            api = TMDBApi(api_key="test")
+            results = []
+            threads = [
+                threading.Thread(target=lambda: results.append(api.get_trending()))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            tmdb_api.requests.get = original_get
+        
+        assert len(calls) == 1
+        assert len(results) == 5
+        assert all(r == [{"id": 1, "title": "Shared"}] for r in results)
+        print("✓ Concurrent callers shared a single request")
+        
+        print("✓ TMDB coalescing tests passed!")
+        
+    except Exception as e:
+        print(f"✗ TMDB coalescing test failed: {e}")
+        return False
+    
+    return True
+
+def test_tmdb_pagination():
+    """Test lazy paginated iteration over TMDB list endpoints"""
+    print("\nTesting TMDB pagination...")
+    
+    try:
+        from itertools import islice
+        from tmdb_api import TMDBApi
+        
+        class PagedTMDB(TMDBApi):
+            def __init__(self):
+                super().__init__(api_key="test")
+                self.pages = []
+            
+            def _get_json(self, path, params=None, parse=None):
+                page = params["page"]
+                self.pages.append(page)
+                results = [{"id": page * 100 + i} for i in range(20)]
+                return {"page": page, "total_pages": 3, "results": results}
+        
+        api = PagedTMDB()
+        items = list(islice(api.iter_discover('movie', genres=[28]), 25))
+        assert len(items) == 25
+        assert api.pages == [1, 2]
+        print("✓ Pages fetched only as items are consumed")
+        
+        api = PagedTMDB()
+        assert len(list(api.iter_trending())) == 60
+        assert api.pages == [1, 2, 3]
+        print("✓ Iteration stops at the last page")
+        
+        api = PagedTMDB()
+        iterator = api.iter_trending(prefetch=True)
+        next(iterator)
+        api._prefetch_executor.shutdown(wait=True)
+        assert sorted(api.pages) == [1, 2]
+        print("✓ Next page prefetched in the background")
+        
+        print("✓ TMDB pagination tests passed!")
+        
+    except Exception as e:
+        print(f"✗ TMDB pagination test failed: {e}")
+        return False
+    
+    return True
+
+def test_metadata_backfill():
+    """Test metadata backfill with checkpointing"""
+    print("\nTesting metadata backfill...")
+    
+    try:
+        from database import DatabaseManager
+        from tmdb_api import TMDBApi
+        from metadata_backfill import MetadataBackfill, CHECKPOINT_KEY
+        
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_path = tmp.name
+        
+        db = DatabaseManager(db_path)
+        
+        class FakeTMDB(TMDBApi):
+            def search_content(self, query, content_type="multi"):
+                if query == "Unknown Film":
+                    return []
+                return [{'id': 42, 'title': query, 'release_date': '2010-07-16'}]
+            
+            def get_movie_details(self, movie_id):
+                return {
+                    'id': movie_id,
+                    'title': 'Inception',
+                    'genres': [{'name': 'Science Fiction'}],
+                    'runtime': 148,
+                    'release_date': '2010-07-16',
+                    'poster_path': '/inception.jpg',
+                    'credits': {
+                        'crew': [{'name': 'Christopher Nolan', 'job': 'Director'}],
+                        'cast': [{'name': 'Leonardo DiCaprio'}]
+                    }
+                }
+        
+        inception_id = db.add_content({'title': 'Inception', 'type': 'movie', 'rating': 9.0, 'genre': 'Thriller'})
+        db.add_content({'title': 'Unknown Film', 'type': 'movie'})
+        
+        assert db.count_incomplete_content() == 2
+        assert db.count_incomplete_content(after_id=inception_id) == 1
+        
+        progress = []
+        backfill = MetadataBackfill(db, FakeTMDB(api_key="test"), workers=2, batch_size=1)
+        stats = backfill.run(progress_callback=lambda done, total: progress.append((done, total)))
+        
+        assert stats['updated'] == 1
+        assert stats['unmatched'] == 1
+        assert progress[-1] == (2, 2)
+        row = next(c for c in db.get_all_content() if c['id'] == inception_id)
+        assert row['tmdb_id'] == 42
+        assert row['director'] == 'Christopher Nolan'
+        assert row['duration'] == 148
+        assert row['genre'] == 'Thriller'  # user-entered values are kept
+        assert db.get_state(CHECKPOINT_KEY) is None
+        print("✓ Incomplete rows enriched from TMDB")
+        
+        # A checkpoint from an interrupted run skips rows already processed
+        db.set_state(CHECKPOINT_KEY, inception_id)
+        stats = MetadataBackfill(db, FakeTMDB(api_key="test")).run()
+        assert stats['scanned'] == 1
+        print("✓ Backfill resumes from checkpoint")
+        
+        os.unlink(db_path)
+        print("✓ Metadata backfill tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Metadata backfill test failed: {e}")
+        return False
+    
+    return True
+
+def test_poster_cache():
+    """Test poster caching on disk and in memory"""
+    print("\nTesting poster cache...")
+    
+    try:
+        import shutil
+        import time
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt6.QtCore import QBuffer, QIODevice
+        from PyQt6.QtGui import QGuiApplication, QImage, QColor, QPixmapCache
+        import poster_cache
+        from poster_cache import PosterCache
+        
+        app = QGuiApplication.instance() or QGuiApplication(sys.argv)
+        
+        image = QImage(500, 750, QImage.Format.Format_RGB32)
+        image.fill(QColor('red'))
+        buffer = QBuffer()
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        image.save(buffer, 'JPG')
+        image_bytes = bytes(buffer.data())
+        
+        downloads = []
+        
+        class FakeResponse:
+            content = image_bytes
+            
+            def raise_for_status(self):
+                pass
+        
+        def fake_get(url, **kwargs):
+            downloads.append(url)
+            return FakeResponse()
+        
+        cache_dir = tempfile.mkdtemp()
+        original_get = poster_cache.requests.get
+        poster_cache.requests.get = fake_get
+        try:
+            cache = PosterCache(cache_dir=cache_dir)
+            received = []
+            url = "https://image.tmdb.org/t/p/w500/poster.jpg"
+            assert cache.get_pixmap(url, callback=received.append) is None
+            assert cache.get_pixmap(url, callback=received.append) is None
+            
+            deadline = time.time() + 5
+            while len(received) < 2 and time.time() < deadline:
+                app.processEvents()
+                time.sleep(0.01)
+            
+            assert len(received) == 2
+            assert received[0].width() <= cache.thumbnail_size[0]
+            assert len(downloads) == 1
+            print("✓ Poster downloaded once and thumbnailed")
+            
+            full = cache.get_pixmap(url, thumbnail=False)
+            assert full is not None and full.width() == 500
+            cache.shutdown()
+            
+            QPixmapCache.clear()
+            reopened = PosterCache(cache_dir=cache_dir)
+            assert reopened.get_pixmap(url) is not None
+            assert len(downloads) == 1
+            reopened.shutdown()
+            print("✓ Cached poster served from disk without re-downloading")
+            
+            small = PosterCache(cache_dir=cache_dir, max_bytes=1)
+            assert len(small._index) == 1
+            small._on_downloaded("https://image.tmdb.org/t/p/w500/other.jpg", 10)
+            assert list(small._index) == [small._key("https://image.tmdb.org/t/p/w500/other.jpg")]
+            assert not os.path.exists(small._paths(small._key(url))[0])
+            small.shutdown()
+            print("✓ Least recently used posters evicted over the size cap")
+            
+            class MissingResponse:
+                status_code = 404
+                
+                def raise_for_status(self):
+                    raise poster_cache.requests.exceptions.HTTPError("404 Not Found", response=self)
+            
+            def failing_get(url, **kwargs):
+                downloads.append(url)
+                if url.endswith('missing.jpg'):
+                    return MissingResponse()
+                raise poster_cache.requests.exceptions.ConnectionError("offline")
+            
+            poster_cache.requests.get = failing_get
+            flaky = PosterCache(cache_dir=cache_dir, retry_seconds=0)
+            offline_url = "https://image.tmdb.org/t/p/w500/offline.jpg"
+            missing_url = "https://image.tmdb.org/t/p/w500/missing.jpg"
+            for _ in range(2):
+                for failing_url in (offline_url, missing_url):
+                    flaky.get_pixmap(failing_url)
+                deadline = time.time() + 5
+                while (flaky._pending or len(flaky._failed_urls) < 2) and time.time() < deadline:
+                    app.processEvents()
+                    time.sleep(0.01)
+            assert downloads.count(offline_url) == 2 and downloads.count(missing_url) == 1
+            flaky.shutdown()
+            print("✓ Failed downloads retried after a while, 404s never")
+        finally:
+            poster_cache.requests.get = original_get
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        
+        print("✓ Poster cache tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Poster cache test failed: {e}")
+        return False
+    
+    return True
+
+def test_mock_tmdb_server():
+    """Test TMDBApi and the recommendation engine against the local TMDB stand-in"""
+    print("\nTesting mock TMDB server...")
+    
+    try:
+        from database import DatabaseManager
+        from tmdb_api import TMDBApi
+        from recommendation_engine import RecommendationEngine
+        from mock_tmdb_server import MockTMDBServer
+        
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_path = tmp.name
+        
+        with MockTMDBServer(seed=1) as server:
+            api = TMDBApi(api_key="test", base_url=server.base_url)
+            
+            assert api.get_genre_mapping()[878] == "Science Fiction"
+            details = api.get_movie_details(12345)
+            assert details.id == 12345
+            assert api.format_content_data(details, 'movie')['director'] == 'Christopher Nolan'
+            assert [r['name'] for r in api.search_content("Dark", "tv")] == ["Dark"]
+            print("✓ Fixtures replayed for every endpoint")
+            
+            db = DatabaseManager(db_path)
+            db.add_content({'title': 'Inception', 'type': 'movie', 'genre': 'Science Fiction, Action',
+                            'rating': 9.0, 'tmdb_id': 27205, 'status': 'watched'})
+            engine = RecommendationEngine(db, api)
+            recommendations = engine.get_recommendations(9)
+            assert recommendations
+            assert all(r['title'] != 'Inception' for r in recommendations)
+            print("✓ Recommendations generated offline")
+            
+            server.rate_limit_rate = 1.0
+            server.retry_after = 0
+            before = server.request_count
+            assert api.search_content("Severance") == []
+            assert server.request_count - before == 3  # first attempt + 2 retries
+            print("✓ Rate-limited requests retried")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fixtures_dir = os.path.join(tmpdir, "fixtures")
+            os.makedirs(fixtures_dir)
+            with open(os.path.join(tmpdir, "secret.json"), "w") as f:
+                f.write('{"secret": true}')
+
+            with MockTMDBServer(fixtures_dir=fixtures_dir, record_upstream="http://127.0.0.1:9") as server:
+                assert server.resolve("/../secret", {}) is None
+                assert server.resolve("/movie/..\\..\\secret", {}) is None
+                assert server.resolve("/movie/../../recorded", {}) is None
+            assert sorted(os.listdir(tmpdir)) == ["fixtures", "secret.json"]
+            print("✓ Paths outside the fixtures directory rejected")
+
+        os.unlink(db_path)
+        print("✓ Mock TMDB server tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Mock TMDB server test failed: {e}")
+        return False
+    
+    return True
+
+def test_tmdb_metrics():
+    """Test per-endpoint TMDB instrumentation"""
+    print("\nTesting TMDB metrics...")
+    
+    try:
+        import json
+        from tmdb_api import TMDBApi
+        from mock_tmdb_server import MockTMDBServer
+        
+        with MockTMDBServer(latency_ms=5) as server:
+            api = TMDBApi(api_key="test", base_url=server.base_url)
+            api.get_movie_details(27205)
+            api.get_movie_details(155)
+            api.get_movie_details(27205)
+            
+            server.rate_limit_rate = 1.0
+            server.retry_after = 0
+            api.get_trending()
+            
+            metrics = api.metrics()
+        
+        details = metrics['endpoints']['/movie/{id}']
+        assert details['calls'] == 2
+        assert details['cache_hits'] == 1
+        assert details['bytes'] > 0
+        assert details['latency_ms']['p50'] >= 5
+        assert details['latency_ms']['p50'] <= details['latency_ms']['p99']
+        print("✓ Calls, bytes, latency percentiles and cache hits recorded")
+        
+        trending = metrics['endpoints']['/trending/all/week']
+        assert trending['calls'] == 3
+        assert trending['errors'] == 3
+        assert trending['retries'] == 2
+        assert metrics['totals']['cache_hit_ratio'] == 0.25
+        print("✓ Errors and retries recorded")
+        
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+            metrics_path = tmp.name
+        api._metrics.dump(metrics_path)
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            assert json.load(f)['totals']['calls'] == 5
+        os.unlink(metrics_path)
+        print("✓ Metrics dumped to JSON")
+        
+        print("✓ TMDB metrics tests passed!")
+        
+    except Exception as e:
+        print(f"✗ TMDB metrics test failed: {e}")
+        return False
+    
+    return True
+
+def test_local_catalog():
+    """Test building and querying the offline catalog"""
+    print("\nTesting local catalog...")
+    
+    try:
+        import gzip
+        import json
+        import shutil
+        from local_catalog import LocalCatalog
+        from tmdb_api import TMDBApi
+        from mock_tmdb_server import FIXTURES_DIR
+        
+        work_dir = tempfile.mkdtemp()
+        movies_path = os.path.join(work_dir, 'movie_ids_10_18_2026.json.gz')
+        tv_path = os.path.join(work_dir, 'tv_series_ids_10_18_2026.json.gz')
+        with gzip.open(movies_path, 'wt', encoding='utf-8') as f:
+            for tmdb_id, title, popularity in [(27205, 'Inception', 83.9), (603, 'The Matrix', 79.5),
+                                               (9999, 'Obscure Short', 0.6)]:
+                f.write(json.dumps({'adult': False, 'id': tmdb_id, 'original_title': title,
+                                    'popularity': popularity, 'video': False}) + '\n')
+        with gzip.open(tv_path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'id': 70523, 'original_name': 'Dark', 'popularity': 60.3}) + '\n')
+        
+        catalog = LocalCatalog(os.path.join(work_dir, 'catalog.db'))
+        assert catalog.ingest_id_export(movies_path, 'movie', batch_size=2) == 3
+        assert catalog.ingest_id_export(tv_path, 'tv') == 1
+        assert catalog.ingest_detail_files([
+            os.path.join(FIXTURES_DIR, 'movie', '_default.json'),
+            os.path.join(FIXTURES_DIR, 'tv', '_default.json')
+        ]) == 2
+        assert catalog.count() == 4
+        print("✓ ID exports and detail payloads ingested")
+        
+        assert [r['title'] for r in catalog.search('matrix', 'movie')] == ['The Matrix']
+        assert [r.get('title') or r.get('name') for r in catalog.popular()][:2] == ['Inception', 'The Matrix']
+        assert [r['title'] for r in catalog.discover('movie', [878])] == ['Inception']
+        assert catalog.discover('movie', [878])[0]['release_date'].startswith('2010')
+        print("✓ Search, discover and popularity answered locally")
+        
+        api = TMDBApi(api_key="test", base_url="http://127.0.0.1:9", catalog=catalog)
+        assert [r['name'] for r in api.get_discover('tv', genres=[9648])] == ['Dark']
+        assert len(list(api.iter_trending())) == 4
+        assert api.get_genre_mapping()[878] == 'Science Fiction'
+        print("✓ TMDBApi served from the catalog")
+        
+        from mock_tmdb_server import MockTMDBServer
+        with MockTMDBServer() as server:
+            api = TMDBApi(api_key="test", base_url=server.base_url, catalog=catalog, metrics_file=None)
+            assert api.get_discover('movie', genres=[35]) and list(api.iter_discover('movie', genres=[35], max_pages=1))
+            requests_made = server.request_count
+            assert api.get_discover('movie', genres=[878], page=2) == [] and server.request_count == requests_made
+            searches = []
+            search = catalog.search
+            catalog.search = lambda *args: searches.append(args) or search(*args)
+            assert [r['title'] for r in api.iter_search('matrix', 'movie')] == ['The Matrix'] and len(searches) == 1
+            del catalog.search
+        print("✓ TMDB asked when the catalog has nothing for a query")
+        
+        import sqlite3
+        version = catalog.version()
+        reader = sqlite3.connect(catalog.db_path)
+        reader.execute("SELECT COUNT(*) FROM catalog").fetchone()
+        assert catalog.version() == version
+        reader.close()
+        catalog.ingest_id_export(tv_path, 'tv')
+        assert catalog.version() != version
+        print("✓ Catalog version only changes with writes")
+        
+        from database import DatabaseManager
+        from recommendation_engine import RecommendationEngine
+        engine = RecommendationEngine(DatabaseManager(os.path.join(work_dir, 'watchlist.db')),
+                                      TMDBApi(api_key="", catalog=catalog, metrics_file=None))
+        assert engine._get_content_model().base is None and engine._index_build is not None
+        engine._index_build.join()
+        assert len(engine._get_content_model().base) == 2 and engine._index_build is None
+        engine.close()
+        print("✓ Content index built in the background")
+        
+        shutil.rmtree(work_dir, ignore_errors=True)
+        print("✓ Local catalog tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Local catalog test failed: {e}")
+        return False
+    
+    return True
+
+def test_title_index():
+    """Test the trigram title index used for autocomplete"""
+    print("\nTesting title index...")
+    
+    try:
+        from title_index import TitleIndex, normalize_title, suggest_titles, merge_suggestions
+        
+        assert normalize_title("  Amélie: Le Fabuleux!  ") == "amelie le fabuleux"
+        
+        catalog_index = TitleIndex()
+        for tmdb_id, title, popularity in [(603, 'The Matrix', 79.5), (604, 'The Matrix Reloaded', 40.1),
+                                           (27205, 'Inception', 83.9), (1, 'Matrix of Leadership', 0.5)]:
+            catalog_index.add(title, 'movie', tmdb_id, year=1999, popularity=popularity)
+        catalog_index.add('Dark', 'tv', 70523, year=2017, popularity=60.3)
+        catalog_index.finalize()
+        
+        assert [s['title'] for s in catalog_index.suggest('the matr', 2)] == ['The Matrix', 'The Matrix Reloaded']
+        assert catalog_index.suggest('incpetion')[0]['tmdb_id'] == 27205
+        assert catalog_index.suggest('dark')[0]['type'] == 'tv'
+        assert catalog_index.suggest('zzzz') == []
+        print("✓ Prefix and typo-tolerant suggestions ranked")
+        
+        library_index = TitleIndex(source='library', boost=0.1)
+        library_index.add('The Matrix', 'movie', 603, row_id=7, year=1999)
+        suggestions = suggest_titles([library_index, catalog_index], 'matrix')
+        matrix = [s for s in suggestions if s['tmdb_id'] == 603]
+        assert len(matrix) == 1 and matrix[0]['source'] == 'library' and matrix[0]['library_id'] == 7
+        print("✓ Library and catalog suggestions merged")
+        
+        merged = merge_suggestions(suggestions, [
+            {'id': 603, 'title': 'The Matrix', 'release_date': '1999-03-30'},
+            {'id': 624860, 'title': 'The Matrix Resurrections', 'release_date': '2021-12-16'},
+            {'id': 6384, 'name': 'Keanu Reeves', 'media_type': 'person'}
+        ])
+        assert merged[-1]['tmdb_id'] == 624860 and merged[-1]['year'] == 2021
+        assert sum(1 for s in merged if s['tmdb_id'] == 603) == 1
+        print("✓ Remote results merged without duplicates or people")
+        
+        from database import DatabaseManager
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_path = tmp.name
+        empty_index = TitleIndex.from_library(DatabaseManager(db_path))
+        assert len(empty_index) == 0 and empty_index.suggest('matrix') == []
+        os.unlink(db_path)
+        print("✓ Empty library indexed")
+        
+        print("✓ Title index tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Title index test failed: {e}")
+        return False
+    
+    return True
+
+def test_title_matching():
+    """Test batched fuzzy title matching with and without rapidfuzz"""
+    print("\nTesting title matching...")
+    
+    try:
+        import title_matching
+        from fuzzywuzzy import fuzz
+        
+        choices = ['the matrix', 'breaking bad', 'dark', 'the dark knight', 'inception']
+        queries = ['the matrx', 'breaking bad', 'the dark night', 'interstellar', 'dark', '']
+        expected = []
+        for query in queries:
+            scores = [fuzz.ratio(query, choice) for choice in choices]
+            best = max(range(len(choices)), key=lambda i: scores[i])
+            expected.append(choices[best] if query and scores[best] > 85 else None)
+        
+        rapidfuzz_process = title_matching.process
+        try:
+            for process in ([rapidfuzz_process] if rapidfuzz_process else []) + [None]:
+                title_matching.process = process
+                matcher = title_matching.TitleMatcher(choices)
+                matches = matcher.best_matches(queries, threshold=85)
+                assert [choices[m[0]] if m else None for m in matches] == expected
+                assert matches[1] == (1, 100.0)
+        finally:
+            title_matching.process = rapidfuzz_process
+        print("✓ Best matches agree with fuzz.ratio")
+        
+        # rapidfuzz scores this pair 85.1, fuzz.ratio rounds it to 85: not above the threshold either way
+        query, choice = 'abcdefghijklmnopqrst', 'abcdefghijklmnopqrstxyzxyzx'
+        assert fuzz.ratio(query, choice) == 85
+        assert title_matching.TitleMatcher([choice]).best_matches([query], threshold=85) == [None]
+        print("✓ Scores rounded like fuzz.ratio before comparing")
+        
+        assert title_matching.TitleMatcher([]).best_matches(['dark']) == [None]
+        print("✓ Title matching tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Title matching test failed: {e}")
+        return False
+    
+    return True
+
+def test_watched_index():
+    """Test the already-watched index and its invalidation"""
+    print("\nTesting watched index...")
+    
+    try:
+        from database import DatabaseManager
+        from tmdb_api import TMDBApi
+        from recommendation_engine import RecommendationEngine
+        from watched_index import WatchedIndex
+        
+        index = WatchedIndex([
+            {'title': 'The Matrix', 'tmdb_id': 603},
+            {'title': 'Breaking Bad', 'tmdb_id': None}
+        ])
+        assert index.contains(603, 'Something Else')
+        assert index.contains(None, 'the matrix')
+        assert index.contains(1396, 'Breaking Badd')
+        assert not index.contains(604, 'The Matrix Reloaded')
+        assert not index.contains(None, '')
+        print("✓ TMDB id, exact and fuzzy title checks")
+        
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_path = tmp.name
+        db = DatabaseManager(db_path)
+        rec_engine = RecommendationEngine(db, TMDBApi(api_key="test", base_url="http://127.0.0.1:9"))
+        
+        version = db.get_content_version()
+        content_id = db.add_content({'title': 'Dark', 'type': 'tv', 'tmdb_id': 70523})
+        assert db.get_content_version() != version
+        assert rec_engine._is_already_watched({'id': 70523, 'name': 'Dark'})
+        
+        rec_engine._refresh_watched_index()
+        built = rec_engine.watched_index
+        rec_engine._refresh_watched_index()
+        assert rec_engine.watched_index is built
+        db.delete_content(content_id)
+        rec_engine._refresh_watched_index()
+        assert rec_engine.watched_index is not built
+        assert not rec_engine._is_already_watched({'id': 70523, 'name': 'Dark'})
+        print("✓ Index rebuilt only after library changes")
+        
+        os.unlink(db_path)
+        print("✓ Watched index tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Watched index test failed: {e}")
+        return False
+    
+    return True
+
+def test_people_index():
+    """Test the people index of the library and the offline catalog"""
+    print("\nTesting people index...")
+    
+    try:
+        import shutil
+        from database import DatabaseManager
+        from local_catalog import LocalCatalog
+        from tmdb_api import TMDBApi
+        from tmdb_records import parse_title_details
+        from recommendation_engine import RecommendationEngine
+        from scoring import people_recommendations
+        
+        temp_dir = tempfile.mkdtemp()
+        db = DatabaseManager(os.path.join(temp_dir, "watchlist.db"))
+        sicario = db.add_content({'title': 'Sicario', 'type': 'movie', 'rating': 9.0, 'tmdb_id': 273481,
+                                  'director': 'Denis Villeneuve', 'actors': 'Emily Blunt, Benicio del Toro',
+                                  'status': 'watched'})
+        arrival = db.add_content({'title': 'Arrival', 'type': 'movie', 'rating': 8.0, 'director': 'denis  villeneuve',
+                                  'actors': 'Amy Adams', 'status': 'watched'})
+        db.add_content({'title': 'Edge of Tomorrow', 'type': 'movie', 'rating': 5.0, 'director': 'Doug Liman',
+                        'actors': 'Emily Blunt', 'status': 'watched'})
+        people = {(p['role'], p['name']): p for p in db.get_favourite_people(7.0)}
+        assert people['director', 'Denis Villeneuve']['titles'] == 2
+        assert people['director', 'Denis Villeneuve']['title'] == 'Sicario'
+        assert ('director', 'Doug Liman') not in people and ('actor', 'Amy Adams') in people
+        db.update_content(arrival, {'director': 'Someone Else'})
+        people = {(p['role'], p['name']): p for p in db.get_favourite_people(7.0)}
+        assert people['director', 'Denis Villeneuve']['titles'] == 1 and ('director', 'Someone Else') in people
+        db.delete_content(sicario)
+        assert ('actor', 'Emily Blunt') not in {(p['role'], p['name']) for p in db.get_favourite_people(7.0)}
+        print("✓ Library credits indexed on add, update and delete")
+        
+        catalog = LocalCatalog(os.path.join(temp_dir, "catalog.db"))
+        def details(tmdb_id, title, director, cast, popularity):
+            return parse_title_details({
+                'id': tmdb_id, 'title': title, 'popularity': popularity, 'overview': title,
+                'credits': {'crew': [{'job': 'Director', 'name': director}], 'cast': [{'name': n} for n in cast]}
+            }, 'movie')
+        catalog.add_details([
+            details(273481, 'Sicario', 'Denis Villeneuve', ['Emily Blunt'], 50),
+            details(335984, 'Blade Runner 2049', 'Denis Villeneuve', ['Ryan Gosling'], 80),
+            details(438631, 'Dune', 'Denis Villeneuve', ['Timothée Chalamet'], 90),
+            details(137113, 'Edge of Tomorrow', 'Doug Liman', ['Emily Blunt'], 70),
+            details(1, 'Unrelated', 'Nobody', ['No One'], 99)
+        ])
+        results = catalog.sharing_people([('director', 'DENIS VILLENEUVE'), ('actor', 'Emily Blunt')])
+        assert [r['title'] for r in results] == ['Sicario', 'Dune', 'Blade Runner 2049', 'Edge of Tomorrow']
+        assert results[0]['shared_people'] == [('director', 'Denis Villeneuve'), ('actor', 'Emily Blunt')]
+        assert catalog.people_of([('movie', 335984), ('movie', 5)]) == {('movie', 335984): {'denis villeneuve'}}
+        # More people than any SQLite build allows variables in one statement (32766 by default)
+        many = [('actor', f'Extra {i}') for i in range(300000)] + [('director', 'Doug Liman')]
+        assert [r['title'] for r in catalog.sharing_people(many)] == ['Edge of Tomorrow']
+        print("✓ Catalog titles found through shared directors and actors")
+        
+        favourites = {('director', 'denis villeneuve'): {'title': 'Sicario', 'rating': 9.0}}
+        recs = people_recommendations(results[1:], favourites, "")
+        assert [r['title'] for r in recs] == ['Dune', 'Blade Runner 2049']
+        assert recs[0]['reason'].startswith("Directed by Denis Villeneuve, like 'Sicario'")
+        
+        db.add_content({'title': 'Dune', 'type': 'movie', 'rating': 8.5, 'tmdb_id': 438631,
+                        'director': 'Denis Villeneuve', 'status': 'watched'})
+        engine = RecommendationEngine(db, TMDBApi(api_key="", catalog=catalog, metrics_file=None))
+        engine._refresh_watched_index()
+        recs = engine._get_people_based_recommendations(5)
+        assert [r['title'] for r in recs] == ['Blade Runner 2049', 'Sicario']
+        assert engine._same_director({'director': 'Denis Villeneuve'}, [{'id': 335984, 'title': 'x'}]) == {335984}
+        engine.close()
+        print("✓ Engine recommends unwatched titles by favourite directors and actors")
+        
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        print("✓ People index tests passed!")
+        
+    except Exception as e:
+        print(f"✗ People index test failed: {e}")
+        return False
+    
+    return True
+
+def test_recommendation_graph():
+    """Test the TMDB recommendation graph and the random walk over it"""
+    print("\nTesting recommendation graph...")
+    
+    try:
+        import shutil
+        import numpy as np
+        from database import DatabaseManager
+        from tmdb_api import TMDBApi
+        from recommendation_engine import RecommendationEngine
+        from recommendation_graph import RecommendationGraph, GraphAdjacency, personalized_pagerank, result_key
+        from mock_tmdb_server import MockTMDBServer
+        
+        # 1 -> 2 -> 3, and 4 on its own with 5
+        adjacency = GraphAdjacency(np.array([1, 2, 4]), np.array([2, 3, 5]), np.ones(3))
+        assert list(adjacency.nodes) == [1, 2, 3, 4, 5]
+        assert np.allclose(np.bincount(adjacency.rows, adjacency.weights), 1)
+        scores = personalized_pagerank(adjacency, {adjacency.position(1): 1.0})
+        assert abs(scores.sum() - 1) < 1e-6
+        assert scores[adjacency.position(2)] > scores[adjacency.position(3)] > 0
+        assert scores[adjacency.position(4)] == scores[adjacency.position(5)] == 0
+        assert adjacency.position(6) is None
+        print("✓ Random walk with restart favours titles close to the seeds")
+        
+        # Graph scores are absolute: a candidate's score doesn't depend on the others'
+        from scoring import graph_recommendations, GRAPH_FACTOR
+        weak, strong = {'id': 21, 'title': 'Weak'}, {'id': 22, 'title': 'Strong'}
+        alone = graph_recommendations([weak], [0.5], [None], 0.5, "")
+        together = graph_recommendations([weak, strong], [0.5, 1.5], [None, None], 0.5, "")
+        assert alone[0]['score'] == together[0]['score'] == GRAPH_FACTOR / 2
+        assert together[1]['score'] == 0.75 * GRAPH_FACTOR
+        assert 'several' not in together[0]['reason']
+        print("✓ Graph scores scale with the restart mass, not the best candidate")
+
+        temp_dir = tempfile.mkdtemp()
+        graph = RecommendationGraph(os.path.join(temp_dir, "graph.db"))
+        source = result_key({'id': 10, 'title': 'Seed'})
+        assert graph.page(source, 1) is None
+        graph.record(source, 1, [{'id': 11, 'title': 'A'}, {'id': 12, 'name': 'B', 'media_type': 'tv'}])
+        assert [r['id'] for r in graph.page(source, 1)] == [11, 12]
+        assert graph.page(source, 2) is None and graph.version() == 1
+        adjacency = graph.load_adjacency()
+        assert len(adjacency) == 3 and adjacency.version == 1
+        assert set(graph.results(adjacency.nodes)) == {result_key({'id': 11, 'title': 'A'}),
+                                                      result_key({'id': 12, 'name': 'B'})}
+        graph.ttl = -1
+        assert graph.page(source, 1) is None
+        print("✓ Recommendation pages stored as edges and served until they expire")
+        
+        db = DatabaseManager(os.path.join(temp_dir, "watchlist.db"))
+        db.add_content_batch([
+            {'title': f"Favourite {i}", 'type': 'movie', 'genre': 'Action', 'rating': 9.0, 'tmdb_id': 550 + i,
+             'status': 'watched'}
+            for i in range(5)
+        ])
+        graph = RecommendationGraph(os.path.join(temp_dir, "shared_graph.db"))
+        with MockTMDBServer(seed=3) as server:
+            requests_made = []
+            for _ in range(2):
+                engine = RecommendationEngine(db, TMDBApi(api_key="test", base_url=server.base_url, metrics_file=None),
+                                              graph=graph)
+                started = server.request_count
+                engine.get_recommendations(10)
+                requests_made.append(server.request_count - started)
+                timings = engine.last_stage_timings
+                engine.close()
+        assert requests_made[1] < requests_made[0], requests_made
+        assert timings['graph']['results'] > 0, timings
+        print(f"✓ Second run served from the graph ({requests_made[0]} -> {requests_made[1]} TMDB requests)")
+        
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        print("✓ Recommendation graph tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Recommendation graph test failed: {e}")
+        return False
+    
+    return True
+
+def test_content_model():
+    """Test the content-based similarity model"""
+    print("\nTesting content model...")
+    
+    try:
+        from content_model import ContentModel, item_from_library, item_from_result
+        
+        genre_map = {28: 'Action', 878: 'Science Fiction', 35: 'Comedy', 18: 'Drama'}
+        results = [
+            {'id': 603, 'title': 'The Matrix', 'genre_ids': [28, 878], 'original_language': 'en',
+             'release_date': '1999-03-30', 'overview': 'A hacker learns reality is a simulation run by machines.'},
+            {'id': 157336, 'title': 'Interstellar', 'genre_ids': [878, 18], 'original_language': 'en',
+             'release_date': '2014-11-05', 'overview': 'Explorers travel through a wormhole in space.'},
+            {'id': 9502, 'title': 'Kung Fu Panda', 'genre_ids': [35], 'original_language': 'en',
+             'release_date': '2008-06-04', 'overview': 'A clumsy panda trains in kung fu.'}
+        ]
+        
+        model = ContentModel(dim=256)
+        assert model.add_items(item_from_result(r, genre_map) for r in results[:2]) == 2
+        assert model.add_items(item_from_result(r, genre_map) for r in results) == 1
+        assert len(model) == 3 and ('movie', 9502) in model
+        print("✓ Items added incrementally without duplicates")
+        
+        liked = item_from_library({
+            'id': 1, 'type': 'movie', 'tmdb_id': 27205, 'title': 'Inception', 'genre': 'Action, Science Fiction',
+            'language': 'en', 'year': 2010, 'director': 'Christopher Nolan', 'actors': '',
+            'overview': 'A thief enters dreams, a simulation of reality, to plant an idea.'
+        })
+        profile = model.profile(model.vectorize_many([liked]), [9.0])
+        ranked = model.top_k(profile, 3)
+        assert [item['result']['title'] for item, _ in ranked][0] == 'The Matrix'
+        assert ranked[-1][0]['result']['title'] == 'Kung Fu Panda'
+        assert ranked[0][1] >= ranked[1][1] >= ranked[2][1]
+        assert [item['key'] for item, _ in model.top_k(profile, 3, exclude={('movie', 603)})][0] != ('movie', 603)
+        print("✓ Top-k retrieval ranks similar titles first")
+        
+        print("✓ Content model tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Content model test failed: {e}")
+        return False
+    
+    return True
+
+def test_ann_index():
+    """Test the LSH index and the persisted catalog vector index"""
+    print("\nTesting ANN index...")
+    
+    try:
+        import shutil
+        import numpy as np
+        from ann_index import LSHIndex, quantize
+        from content_model import ContentModel, ContentIndex, item_from_result
+    
+        rng = np.random.default_rng(7)
+        centers = rng.standard_normal((50, 64))
+        vectors = centers[rng.integers(0, 50, 5000)] + 0.3 * rng.standard_normal((5000, 64))
+        vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+        index = LSHIndex.build(*quantize(vectors), n_tables=8, n_bits=8)
+        recall = []
+        for row in range(0, 5000, 250):
+            rows, scores = index.query(vectors[row], 20)
+            exact = np.argsort(-(vectors @ vectors[row]))[:20]
+            recall.append(len(set(rows) & set(exact)) / 20)
+            assert rows[0] == row and np.all(np.diff(scores) <= 0)
+        assert np.mean(recall) >= 0.9
+        print(f"✓ LSH recall@20 against brute force: {np.mean(recall):.2f}")
+    
+        genre_map = {28: 'Action', 878: 'Science Fiction', 35: 'Comedy'}
+        results = [
+            {'id': 603, 'title': 'The Matrix', 'genre_ids': [28, 878], 'media_type': 'movie',
+             'overview': 'A hacker learns reality is a simulation run by machines.'},
+            {'id': 9502, 'title': 'Kung Fu Panda', 'genre_ids': [35], 'media_type': 'movie',
+             'overview': 'A clumsy panda trains in kung fu.'},
+            {'id': 1396, 'name': 'Breaking Bad', 'genre_ids': [28], 'media_type': 'tv',
+             'overview': 'A chemistry teacher turns to crime.'}
+        ]
+        index_dir = tempfile.mkdtemp()
+        import threading
+        builds = [threading.Thread(target=ContentIndex.build,
+                                   args=(index_dir, [item_from_result(r, genre_map) for r in results], 128, 'v0'))
+                  for _ in range(3)]
+        for build in builds:
+            build.start()
+        for build in builds:
+            build.join()
+        assert len(ContentIndex.load(index_dir, 'v0')) == 3
+        ContentIndex.build(index_dir, (item_from_result(r, genre_map) for r in results), dim=128, version='v1')
+        assert os.listdir(os.path.dirname(index_dir)).count(os.path.basename(index_dir)) == 1
+        assert not [name for name in os.listdir(os.path.dirname(index_dir))
+                    if name.startswith(os.path.basename(index_dir) + ".")]
+        assert ContentIndex.load(index_dir, 'v2') is None
+        stored = ContentIndex.load(index_dir, 'v1')
+        assert isinstance(stored.lsh.vectors.base, np.memmap) and len(stored) == 3
+        assert ('tv', 1396) in stored and ('movie', 1396) not in stored
+        print("✓ Index persisted (concurrent builds swapped in whole) and memory-mapped on load")
+    
+        model = ContentModel(base=stored)
+        assert model.add_items([item_from_result(results[0], genre_map)]) == 0
+        assert model.add_items([item_from_result({'id': 27205, 'title': 'Inception', 'genre_ids': [28, 878],
+                                                  'overview': 'A thief enters dreams.'}, genre_map)]) == 1
+        ranked = model.top_k(model.vectorize(item_from_result(results[0], genre_map)), 2, exclude={('movie', 603)})
+        assert [item['key'] for item, _ in ranked] == [('movie', 27205), ('tv', 1396)]
+        print("✓ Indexed and newly added items ranked together")
+    
+        del stored, model
+        shutil.rmtree(index_dir, ignore_errors=True)
+        print("✓ ANN index tests passed!")
+    
+    except Exception as e:
+        print(f"✗ ANN index test failed: {e}")
+        return False
+    
+    return True
+
+def test_preference_model():
+    """Test time-decayed preferences"""
+    print("\nTesting preference model...")
+    
+    try:
+        from datetime import date
+        from database import DatabaseManager
+        from preference_model import PreferenceModel
+        
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_path = tmp.name
+        db = DatabaseManager(db_path)
+        binge = [{'title': f'Horror {i}', 'type': 'movie', 'genre': 'Horror', 'rating': 8.5, 'language': 'en',
+                  'year': 1985, 'date_watched': '2019-10-01'} for i in range(8)]
+        recent = [{'title': f'Comedy {i}', 'type': 'tv', 'genre': 'Comedy, Drama', 'rating': 8.5, 'language': 'ko',
+                   'platform': 'Netflix', 'year': 2021, 'date_watched': '2024-05-01'} for i in range(3)]
+        db.add_content_batch(binge + recent + [{'title': 'Unrated', 'type': 'movie', 'genre': 'Horror'}])
+        history = db.get_rating_history()
+        assert len(history) == 11
+        print("✓ Rated history loaded")
+        
+        today = date(2024, 6, 1)
+        decayed = PreferenceModel(history, half_life_days=365).preferences(today)
+        flat = PreferenceModel(history, half_life_days=1e9).preferences(today)
+        assert flat['genre']['Horror'] > flat['genre']['Comedy']
+        assert decayed['genre']['Comedy'] > decayed['genre']['Horror']
+        assert decayed['genre']['Comedy'] == decayed['genre']['Drama']
+        assert abs(flat['genre']['Horror'] - (8.5 * 0.7 + 0.8 * 0.3)) < 1e-6
+        print("✓ Old binges fade with time")
+        
+        assert set(decayed['decade']) == {'1980s', '2020s'} and set(decayed['platform']) == {'Netflix'}
+        assert decayed['language']['ko'] > decayed['language']['en']
+        print("✓ Language, platform and decade preferences computed alongside genres")
+        
+        from preference_model import preferences_from_stats
+        from_stats = preferences_from_stats(db.get_preference_stats(today))
+        assert db.half_life_days == 365 and set(from_stats) == set(decayed)
+        for dimension, values in decayed.items():
+            assert set(from_stats[dimension]) == set(values), dimension
+            assert all(abs(from_stats[dimension][value] - score) < 1e-9 for value, score in values.items())
+        print("✓ Running totals in the database give the same preferences as the full history")
+        
+        os.unlink(db_path)
+        print("✓ Preference model tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Preference model test failed: {e}")
+        return False
+    
+    return True
+
+def test_scoring():
+    """Test the I/O-free recommendation scoring functions"""
+    print("\nTesting recommendation scoring...")
+    
+    try:
+        import numpy as np
+        from watched_index import WatchedIndex
+        from scoring import (format_recommendation, unwatched, genre_recommendations, similar_recommendations,
+                             trending_recommendations, content_recommendations)
+        from ranking import RankingPipeline
+        from config import RECOMMENDATION_POOL_FACTOR, RECOMMENDATION_DIVERSITY
+        
+        movie = {'id': 1, 'title': 'Arrival', 'release_date': '2016-11-11', 'genre_ids': [878],
+                 'poster_path': '/a.jpg', 'director': 'Denis Villeneuve', 'vote_average': 7.9}
+        show = {'id': 2, 'name': 'Dark', 'first_air_date': '2017-12-01', 'genre_ids': [18, 9648]}
+        rec = format_recommendation(movie, "Because", 1.5, "https://img/")
+        assert (rec['type'], rec['year'], rec['poster_url']) == ('movie', 2016, 'https://img//a.jpg')
+        assert format_recommendation(show, "Because", 1.0, "https://img/")['type'] == 'tv'
+        print("✓ Results formatted as recommendations")
+        
+        library = WatchedIndex([{'title': 'Arrival', 'tmdb_id': 1}])
+        assert unwatched([movie, show], library) == [show]
+        assert genre_recommendations([show], 'Drama', 5.0, "")[0]['score'] == 4.0
+        favourite = {'title': 'Sicario', 'rating': 9.0, 'director': 'Denis Villeneuve'}
+        similar = similar_recommendations([movie, show], favourite, "", same_director={1})
+        assert similar[0]['reason'].endswith("same director") and not similar[1]['reason'].endswith("same director")
+        trending = trending_recommendations([movie, show], {'Drama': 2.0}, {18: 'Drama', 878: 'Science Fiction'}, "")
+        assert [r['title'] for r in trending] == ['Dark'] and abs(trending[0]['score'] - 1.5) < 1e-9
+        favourites = [{'title': 'Sicario', 'rating': 9.0}, {'title': 'Mindhunter', 'rating': 8.0}]
+        content = content_recommendations([movie, show], [0.5, 0.4], np.array([[0.9, 0.1], [0.2, 0.7]]), favourites, "")
+        assert [r['reason'].split("'")[1] for r in content] == ['Sicario', 'Mindhunter']
+        print("✓ Every source scored from plain records")
+        
+        def rank(candidate_lists):
+            # Configured as RecommendationEngine._new_ranking_pipeline() does
+            pipeline = RankingPipeline(2, 2 * RECOMMENDATION_POOL_FACTOR, RECOMMENDATION_DIVERSITY)
+            for candidates in candidate_lists:
+                pipeline.add(candidates)
+            return pipeline.results(), pipeline.counters
+        
+        results, counters = rank([similar, trending, content])
+        assert len(results) == 2 and counters['generated'] == 5 and counters['duplicates'] == 3
+        assert results == rank([content, trending, similar])[0]
+        print("✓ Candidates ranked the same whatever the source order")
+        
+        print("✓ Scoring tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Scoring test failed: {e}")
+        return False
+    
+    return True
+
+def test_ranking_pipeline():
+    """Test bounded top-k ranking with dedup and diversity re-ranking"""
+    print("\nTesting ranking pipeline...")
+    
+    try:
+        from ranking import RankingPipeline
+        
+        def rec(tmdb_id, title, score, genre_ids, content_type='movie'):
+            return {'tmdb_id': tmdb_id, 'title': title, 'type': content_type, 'score': score,
+                    'genre_ids': genre_ids, 'year': 2010}
+        
+        pipeline = RankingPipeline(3, pool_size=4, diversity=0.0)
+        assert pipeline.add([rec(i, f"Filler {i}", i / 1000, [35]) for i in range(1000)])
+        assert len(pipeline) == 4 and pipeline.counters['dropped'] == 996
+        assert not pipeline.add([rec(1, "Filler 1", 0.0, [35])])
+        pipeline.add([rec(999, "Filler 999", 5.0, [35]), rec(999, "Filler 999", 5.0, [35], 'tv')])
+        assert [r['title'] for r in pipeline.results()] == ['Filler 999', 'Filler 999', 'Filler 998']
+        assert pipeline.results()[0]['score'] == 5.0 and pipeline.counters['duplicates'] == 1
+        print("✓ Bounded pool keeps the best candidate per (tmdb_id, type)")
+        
+        candidates = [rec(1, 'Action A', 1.0, [28]), rec(2, 'Action B', 0.95, [28]),
+                      rec(3, 'Action C', 0.9, [28]), rec(4, 'Comedy', 0.8, [35])]
+        plain = RankingPipeline(2, diversity=0.0)
+        plain.add(candidates)
+        diverse = RankingPipeline(2, diversity=0.5)
+        diverse.add(candidates)
+        assert [r['title'] for r in plain.results()] == ['Action A', 'Action B']
+        assert [r['title'] for r in diverse.results()] == ['Action A', 'Comedy']
+        assert diverse.counters == {'generated': 4, 'duplicates': 0, 'scored': 4, 'dropped': 0,
+                                    'reranked': 4, 'returned': 2}
+        print("✓ Diversity re-ranking makes room for other genres")
+        
+        print("✓ Ranking pipeline tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Ranking pipeline test failed: {e}")
+        return False
+    
+    return True
+
+def test_recommendation_sourcing():
+    """Test that recommendation sources only fetch the pages they need"""
+    print("\nTesting recommendation sourcing...")
+    
+    try:
+        from database import DatabaseManager
+        from tmdb_api import TMDBApi
+        from recommendation_engine import RecommendationEngine
+        from mock_tmdb_server import MockTMDBServer
+        
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_path = tmp.name
+        
+        import hashlib
+        title = lambda tmdb_id: hashlib.md5(str(tmdb_id).encode()).hexdigest()  # titles that don't fuzzy-match
+        requested = []
+        def fetch_page(page):
+            requested.append(page)
+            return [{'id': page * 100 + i, 'title': title(page * 100 + i), 'genre_ids': [28]} for i in range(20)]
+        
+        with MockTMDBServer(seed=1) as server:
+            db = DatabaseManager(db_path)
+            engine = RecommendationEngine(db, TMDBApi(api_key="test", base_url=server.base_url))
+            found = engine._take_unwatched(fetch_page, 5)
+            assert [c['id'] for c in found] == [100, 101, 102, 103, 104] and requested == [1]
+            print("✓ Stopped after the first page once enough were found")
+            
+            db.add_content_batch([{'title': title(100 + i), 'type': 'movie', 'tmdb_id': 100 + i, 'status': 'watched'}
+                                  for i in range(18)])
+            engine._refresh_watched_index()
+            requested.clear()
+            found = engine._take_unwatched(fetch_page, 5)
+            assert [c['id'] for c in found] == [118, 119, 200, 201, 202], [c['id'] for c in found]
+            assert requested == [1, 2]
+            requested.clear()
+            assert engine._take_unwatched(fetch_page, 5, accept=lambda c: c['id'] % 2 == 0)[-1]['id'] == 206
+            assert requested == [1, 2]
+            print("✓ Watched and rejected results replaced from the next page")
+            
+            requested.clear()
+            assert engine._take_unwatched(lambda page: requested.append(page) or [], 5) == []
+            assert requested == [1]
+            print("✓ Empty source ends after one request")
+            engine.close()
+        
+        os.unlink(db_path)
+        print("✓ Recommendation sourcing tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Recommendation sourcing test failed: {e}")
+        return False
+    
+    return True
+
+def test_recommendation_deadline():
+    """Test that recommendation sources run concurrently within the deadline"""
+    print("\nTesting recommendation deadline...")
+    
+    try:
+        import time
+        import threading
+        from database import DatabaseManager
+        from tmdb_api import TMDBApi
+        from recommendation_engine import RecommendationEngine
+        from mock_tmdb_server import MockTMDBServer
+        
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_path = tmp.name
+        
+        with MockTMDBServer(latency_ms=150, seed=1) as server:
+            db = DatabaseManager(db_path)
+            db.add_content({'title': 'Inception', 'type': 'movie', 'genre': 'Science Fiction, Action',
+                            'rating': 9.0, 'tmdb_id': 27205, 'status': 'watched'})
+            engine = RecommendationEngine(db, TMDBApi(api_key="test", base_url=server.base_url))
+            
+            started = time.monotonic()
+            recommendations = engine.get_recommendations(9, deadline=0.4)
+            elapsed = time.monotonic() - started
+            assert isinstance(recommendations, list)
+            assert elapsed < 1.0, f"took {elapsed:.2f}s"
+            timings = engine.last_stage_timings
+            assert set(timings) == {'genre', 'similar', 'trending', 'content', 'people', 'graph'}
+            assert any(t['status'] in ('cut short', 'timed out') for t in timings.values())
+            print(f"✓ Run stopped at the deadline ({elapsed:.2f}s): "
+                  + ", ".join(f"{name} {t['seconds']}s {t['status']}" for name, t in timings.items()))
+            
+            release = threading.Event()
+            genre_source = engine._get_genre_based_recommendations
+            engine._get_genre_based_recommendations = lambda limit, expires_at=None: release.wait(10) and []
+            for _ in range(2):
+                engine.get_recommendations(9, deadline=0.2)
+                assert engine.last_stage_timings['genre']['status'] == 'timed out'
+            # The stuck sources of the last runs must not delay the other sources of this one
+            engine.get_recommendations(9, deadline=2.0)
+            assert engine.last_stage_timings['similar']['status'] == 'complete', engine.last_stage_timings
+            print("✓ A source stuck past the deadline doesn't hold up the next run")
+            
+            # close() ends a run waiting on a stuck source instead of letting it sit out the deadline
+            run = threading.Thread(target=engine.get_recommendations, args=(9, 30.0))
+            started = time.monotonic()
+            run.start()
+            time.sleep(0.5)
+            engine.close()
+            run.join(5)
+            assert not run.is_alive() and time.monotonic() - started < 3, f"{time.monotonic() - started:.2f}s"
+            release.set()
+            engine._get_genre_based_recommendations = genre_source
+            print("✓ close() ends a run in progress without waiting for its sources")
+            
+            recommendations = engine.get_recommendations(9)
+            assert recommendations
+            assert all(t['status'] == 'complete' for t in engine.last_stage_timings.values())
+            print("✓ All sources complete with the default deadline")
+            
+            started = time.monotonic()
+            engine.get_recommendations(9, deadline=30.0)
+            assert time.monotonic() - started < 10, "a run waited out its deadline after every source finished"
+            
+            snapshots = list(engine.iter_recommendations(9))
+            assert len(snapshots) > 1
+            assert [len(s) for s in snapshots] == sorted(len(s) for s in snapshots)
+            assert [r['title'] for r in snapshots[-1]] == [r['title'] for r in recommendations]
+            assert len({r['title'] for r in snapshots[-1]}) == len(snapshots[-1])
+            assert engine.last_ranking_counters['returned'] == len(snapshots[-1])
+            print(f"✓ Recommendations streamed in {len(snapshots)} updates")
+        
+        os.unlink(db_path)
+        print("✓ Recommendation deadline tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Recommendation deadline test failed: {e}")
+        return False
+    
+    return True
+
+def test_engine_snapshot():
+    """Test that the recommendation engine warm-starts from its snapshot"""
+    print("\nTesting engine snapshot...")
+    
+    try:
+        import shutil
+        from database import DatabaseManager
+        from tmdb_api import TMDBApi
+        from recommendation_engine import RecommendationEngine
+        from mock_tmdb_server import MockTMDBServer
+        
+        temp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(temp_dir, "watchlist.db")
+        snapshot_path = db_path + ".snapshot"
+        inception = {'title': 'Inception', 'type': 'movie', 'genre': 'Science Fiction, Action',
+                     'rating': 9.0, 'tmdb_id': 27205, 'status': 'watched'}
+        
+        with MockTMDBServer(seed=1) as server:
+            api = TMDBApi(api_key="test", base_url=server.base_url)
+            db = DatabaseManager(db_path)
+            db.add_content(inception)
+            engine = RecommendationEngine(db, api, snapshot_path=snapshot_path)
+            recommendations = engine.get_recommendations(9)
+            engine.close()
+            assert recommendations and os.path.exists(snapshot_path)
+            print("✓ Snapshot saved after a recommendation run")
+            
+            def no_history(*args):
+                raise AssertionError("library read despite a current snapshot")
+            db.get_rating_history = db.get_all_content = no_history
+            engine = RecommendationEngine(db, api, snapshot_path=snapshot_path)
+            assert engine.last_recommendations == recommendations
+            assert engine.genre_weights and engine.genre_map
+            assert engine.watched_index.contains(27205, 'Inception')
+            engine.close()
+            del db.get_rating_history, db.get_all_content
+            print("✓ Preferences, watched index and recommendations restored without reading the library")
+            
+            import json
+            import pickle
+            with open(snapshot_path) as f:
+                saved = json.load(f)
+            assert set(saved['watched_index']) == {'tmdb_ids', 'titles'}
+            for broken in (pickle.dumps({'format': saved['format']}), b'{"format": 3',
+                           json.dumps(dict(saved, watched_index={'tmdb_ids': 'oops'})).encode()):
+                with open(snapshot_path, 'wb') as f:
+                    f.write(broken)
+                engine = RecommendationEngine(db, api, snapshot_path=snapshot_path)
+                assert engine.last_recommendations == [] and engine.watched_index is None and engine.genre_weights
+                engine.close()
+            with open(snapshot_path, 'w') as f:
+                json.dump(saved, f)
+            print("✓ Damaged or foreign snapshots fall back to a cold start")
+            
+            db.add_content({'title': 'Arrival', 'type': 'movie', 'genre': 'Drama', 'rating': 8.0, 'status': 'watched'})
+            engine = RecommendationEngine(db, api, snapshot_path=snapshot_path)
+            assert engine.last_recommendations == [] and 'Drama' in engine.genre_weights
+            engine.close()
+            
+            other = DatabaseManager(os.path.join(temp_dir, "other.db"))
+            other.add_content(inception)
+            other.add_content(dict(inception, title='Arrival', tmdb_id=329865))
+            assert other.get_content_version() == db.get_content_version()
+            engine = RecommendationEngine(other, api, snapshot_path=snapshot_path)
+            assert engine.last_recommendations == []
+            engine.close()
+            print("✓ Snapshot ignored after a library change and for another database")
+        
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        print("✓ Engine snapshot tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Engine snapshot test failed: {e}")
+        return False
+    
+    return True
+
+def test_recommendation_evaluation():
+    """Test the offline recommendation evaluation harness"""
+    print("\nTesting recommendation evaluation...")
+    
+    try:
+        import json
+        import random
+        from evaluate_recommendations import run_evaluation, synthetic_history
+        
+        universe = [{'id': i, 'title': f"Title {i}", 'genre_ids': [28 if i % 2 else 35]} for i in range(40)]
+        training, held_out = synthetic_history(universe, {28: 'Action', 35: 'Comedy'}, 100, random.Random(1))
+        assert len(training) + len(held_out) == 100 and len(held_out) == 10
+        assert max(r['date_watched'] for r in training) < min(r['date_watched'] for r in held_out)
+        assert all(r['tmdb_id'] is not None for r in held_out)
+        print("✓ Latest watches held out of the synthetic history")
+        
+        report = run_evaluation(sizes=[200], users=1, k=6, latency_ms=0, progress=None)
+        result = json.loads(json.dumps(report))['results'][0]
+        assert result['library_size'] == 200
+        assert 0 <= result['precision_at_k'] <= 1 and 0 <= result['recall_at_k'] <= 1 and 0 < result['coverage'] <= 1
+        assert set(result['latency']['stages']) == {'genre', 'similar', 'trending', 'content', 'people', 'graph'}
+        print(f"✓ Evaluation report: precision@6 {result['precision_at_k']:.2f}, recall@6 {result['recall_at_k']:.2f}")
+        
+        import io
+        import contextlib
+        from evaluate_recommendations import main as evaluate_main
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            assert evaluate_main(['--sizes', '50', '--users', '1', '--k', '3', '--latency-ms', '0']) == 0
+        assert json.loads(out.getvalue())['results'][0]['library_size'] == 50
+        print("✓ Only the JSON report written to stdout")
+        
+        print("✓ Recommendation evaluation tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Recommendation evaluation test failed: {e}")
+        return False
+    
+    return True
+
+def test_batch_recommendations():
+    """Test the shared response cache and the multi-profile batch runner"""
+    print("\nTesting batch recommendations...")
+    
+    try:
+        import shutil
+        from database import DatabaseManager
+        from response_cache import SQLiteResponseCache
+        from mock_tmdb_server import MockTMDBServer
+        from batch_recommendations import run_batch
+        
+        temp_dir = tempfile.mkdtemp()
+        cache_path = os.path.join(temp_dir, "cache.db")
+        cache = SQLiteResponseCache(cache_path, ttl=60, max_entries=10)
+        cache.set("genres", {'genres': [{'id': 28, 'name': 'Action'}]})
+        assert SQLiteResponseCache(cache_path, ttl=60, max_entries=10).get("genres")['genres'][0]['id'] == 28
+        assert cache.get("missing") is None
+        expired = SQLiteResponseCache(cache_path, ttl=-1, max_entries=10)
+        expired.set("stale", [1])
+        assert expired.get("stale") is None
+        print("✓ Response cache shared between instances, expired entries ignored")
+        
+        from tmdb_records import TitleDetails
+        cache.set("details", TitleDetails(603, 'movie', 'The Matrix', genre_ids=(28, 878), directors=('Lana Wachowski',)))
+        details = SQLiteResponseCache(cache_path, ttl=60, max_entries=10).get("details")
+        assert isinstance(details, TitleDetails) and details.genre_ids == (28, 878) and details.year is None
+        import sqlite3
+        conn = sqlite3.connect(cache_path)
+        conn.execute("UPDATE responses SET value = ? WHERE key = 'genres'", (b"\x80\x04K\x01.",))  # a pickle
+        conn.commit()
+        conn.close()
+        assert cache.get("genres") is None
+        print("✓ Records cached as JSON; undecodable entries are misses")
+        
+        db_paths = []
+        for i in range(2):
+            db_path = os.path.join(temp_dir, f"profile{i}.db")
+            DatabaseManager(db_path).add_content_batch([
+                {'title': f"Watched {i}", 'type': 'movie', 'genre': 'Action', 'rating': 9.0,
+                 'tmdb_id': 550 + i, 'status': 'watched'}
+            ])
+            db_paths.append(db_path)
+        
+        with MockTMDBServer() as server:
+            results = run_batch(db_paths + [os.path.join(temp_dir, "missing.db")], workers=2, limit=5,
+                                cache_path=cache_path, base_url=server.base_url,
+                                graph_path=os.path.join(temp_dir, "graph.db"))
+        by_path = {result['db_path']: result for result in results}
+        assert by_path[os.path.join(temp_dir, "missing.db")]['error']
+        for db_path in db_paths:
+            assert by_path[db_path]['error'] is None, by_path[db_path]['error']
+            saved = DatabaseManager(db_path).get_saved_recommendations()
+            assert len(saved) == by_path[db_path]['recommendations'] > 0
+            assert [rec['score'] for rec in saved] == sorted((rec['score'] for rec in saved), reverse=True)
+        print(f"✓ {len(db_paths)} profiles recommended in parallel and saved, missing database reported")
+        
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        print("✓ Batch recommendation tests passed!")
+        
+    except Exception as e:
+        print(f"✗ Batch recommendation test failed: {e}")
+        return False
+    
+    return True
+
 def test_recommendation_engine():
     """Test recommendation engine"""
     print("\nTesting recommendation engine...")
@@ -265,6 +1711,29 @@ def main():
         test_config,
         test_database,
         test_tmdb_api,
+        test_tmdb_records,
+        test_tmdb_single_flight,
+        test_tmdb_pagination,
+        test_metadata_backfill,
+        test_poster_cache,
+        test_mock_tmdb_server,
+        test_tmdb_metrics,
+        test_local_catalog,
+        test_title_index,
+        test_title_matching,
+        test_watched_index,
+        test_people_index,
+        test_recommendation_graph,
+        test_content_model,
+        test_ann_index,
+        test_preference_model,
+        test_scoring,
+        test_ranking_pipeline,
+        test_recommendation_sourcing,
+        test_recommendation_deadline,
+        test_engine_snapshot,
+        test_recommendation_evaluation,
+        test_batch_recommendations,
         test_recommendation_engine
     ]
     
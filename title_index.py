@@ -0,0 +1,201 @@
+import re
+import heapq
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+
+TYPE_CODES = {'movie': 0, 'tv': 1}
+TYPE_NAMES = ('movie', 'tv')
+
+def normalize_title(title: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    title = title or ''
+    if not title.isascii():
+        title = unicodedata.normalize('NFKD', title)
+        title = ''.join(c for c in title if not unicodedata.combining(c))
+    return re.sub(r'[^0-9a-z]+', ' ', title.lower()).strip()
+
+def title_trigrams(normalized: str, query: bool = False) -> List[str]:
+    """Trigrams of a normalized title, with a start-of-title pad and a trailing word-end pad.
+
+    Queries are typed left to right and may start mid-title ("matrix" for
+    "The Matrix"), so they get a single leading space and no trailing pad.
+    """
+    padded = f" {normalized}" if query else f"  {normalized} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+class TitleIndex:
+    """In-memory trigram index over titles for instant fuzzy autocomplete.
+
+    Titles are added with add() and the index is frozen by finalize(), which
+    turns the posting lists into NumPy arrays. suggest() then scores every
+    title sharing a trigram with the query in a few vectorized passes.
+    """
+
+    def __init__(self, source: str = 'catalog', boost: float = 0.0):
+        self.source = source
+        self.boost = boost
+        self._titles = []
+        self._types = []
+        self._tmdb_ids = []
+        self._row_ids = []
+        self._years = []
+        self._popularity = []
+        self._gram_counts = []
+        self._postings = {}
+        self._finalized = False
+
+    def __len__(self):
+        return len(self._titles)
+
+    def add(self, title: str, content_type: str, tmdb_id: Optional[int] = None,
+            row_id: Optional[int] = None, year: Optional[int] = None, popularity: float = 0.0):
+        if self._finalized:
+            raise RuntimeError("TitleIndex is finalized; build a new index to add titles")
+
+        normalized = normalize_title(title)
+        if not normalized:
+            return
+
+        position = len(self._titles)
+        self._titles.append(title)
+        self._types.append(TYPE_CODES.get(content_type, 0))
+        self._tmdb_ids.append(tmdb_id or -1)
+        self._row_ids.append(row_id or -1)
+        self._years.append(year or 0)
+        self._popularity.append(popularity or 0.0)
+        grams = title_trigrams(normalized)
+        self._gram_counts.append(len(grams))
+        for gram in set(grams):
+            postings = self._postings.get(gram)
+            if postings is None:
+                self._postings[gram] = [position]
+            else:
+                postings.append(position)
+
+    def finalize(self) -> 'TitleIndex':
+        """Freeze the index into compact arrays; call once after the last add()"""
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in self._postings.items()}
+        self._types = np.array(self._types, dtype=np.int8)
+        self._tmdb_ids = np.array(self._tmdb_ids, dtype=np.int64)
+        self._row_ids = np.array(self._row_ids, dtype=np.int64)
+        self._years = np.array(self._years, dtype=np.int16)
+        self._gram_counts = np.array(self._gram_counts, dtype=np.int32)
+        # Tie-breaker in [0, 0.05): popular titles first among equally good matches
+        popularity = np.log1p(np.maximum(np.array(self._popularity, dtype=np.float32), 0))
+        self._popularity_bonus = (0.05 * popularity / (popularity.max(initial=0) + 1)).astype(np.float32)
+        del self._popularity
+        self._finalized = True
+        return self
+
+    @classmethod
+    def from_library(cls, db_manager) -> 'TitleIndex':
+        """Index the user's own library; library hits rank above catalog hits"""
+        index = cls(source='library', boost=0.1)
+        for row in db_manager.get_all_content():
+            index.add(row['title'], row['type'], row.get('tmdb_id'), row['id'], row.get('year'))
+        return index.finalize()
+
+    @classmethod
+    def from_catalog(cls, catalog) -> 'TitleIndex':
+        index = cls(source='catalog')
+        for content_type, tmdb_id, title, year, popularity in catalog.iter_titles():
+            index.add(title, content_type, tmdb_id, None, year, popularity)
+        return index.finalize()
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Best matching titles for a (partial) query, best first"""
+        if not self._finalized:
+            self.finalize()
+
+        query = normalize_title(prefix)
+        if not query or not self._titles:
+            return []
+
+        grams = set(title_trigrams(query, query=True))
+        postings = [self._postings[g] for g in grams if g in self._postings]
+        if not postings:
+            return []
+
+        shared = np.bincount(np.concatenate(postings), minlength=len(self._titles))
+        # Short queries must match fully; longer ones tolerate typos, which cost up to three trigrams each
+        required = len(grams) if len(grams) <= 3 else (len(grams) + 1) // 2
+        candidates = np.flatnonzero(shared >= required)
+        if candidates.size == 0:
+            return []
+
+        matched = shared[candidates].astype(np.float32)
+        coverage = matched / len(grams)
+        dice = 2 * matched / (len(grams) + self._gram_counts[candidates])
+        scores = 0.7 * coverage + 0.3 * dice + self._popularity_bonus[candidates] + self.boost
+
+        # Re-rank a shortlist in Python, rewarding literal prefix matches
+        shortlist_size = min(candidates.size, limit * 5)
+        shortlist = np.argpartition(-scores, shortlist_size - 1)[:shortlist_size]
+        ranked = []
+        for i in shortlist:
+            position = int(candidates[i])
+            score = float(scores[i])
+            if normalize_title(self._titles[position]).startswith(query):
+                score += 0.25
+            ranked.append((score, position))
+
+        return [self._suggestion(position, score) for score, position in heapq.nlargest(limit, ranked)]
+
+    def _suggestion(self, position: int, score: float) -> Dict:
+        tmdb_id = int(self._tmdb_ids[position])
+        row_id = int(self._row_ids[position])
+        year = int(self._years[position])
+        return {
+            'title': self._titles[position],
+            'type': TYPE_NAMES[self._types[position]],
+            'tmdb_id': tmdb_id if tmdb_id >= 0 else None,
+            'library_id': row_id if row_id >= 0 else None,
+            'year': year or None,
+            'source': self.source,
+            'score': round(score, 4)
+        }
+
+def suggest_titles(indexes: Iterable[TitleIndex], prefix: str, limit: int = 10) -> List[Dict]:
+    """Merge suggestions from several indexes, dropping the same title seen twice"""
+    suggestions = []
+    for index in indexes:
+        if index is not None:
+            suggestions.extend(index.suggest(prefix, limit))
+    suggestions.sort(key=lambda s: s['score'], reverse=True)
+    return merge_suggestions(suggestions, [], limit)
+
+def merge_suggestions(local: Sequence[Dict], remote: Sequence[Dict], limit: int = 10) -> List[Dict]:
+    """Local suggestions first, then remote search results that aren't already listed.
+
+    Remote results may be raw TMDB list results; they are converted to the suggestion shape.
+    People from a multi search are left out.
+    """
+    merged = []
+    seen = set()
+    remote = [_from_tmdb_result(r) if 'source' not in r else r for r in remote if r.get('media_type') != 'person']
+    for item in list(local) + remote:
+        if item['tmdb_id']:
+            key = (item['type'], item['tmdb_id'])
+        else:
+            key = (item['type'], normalize_title(item['title']), item['year'])
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(item)
+        if len(merged) == limit:
+            break
+    return merged
+
+def _from_tmdb_result(result: Dict) -> Dict:
+    is_movie = result.get('media_type') == 'movie' or 'title' in result
+    date_field = result.get('release_date') or result.get('first_air_date') or ''
+    return {
+        'title': result.get('title') or result.get('name', ''),
+        'type': 'movie' if is_movie else 'tv',
+        'tmdb_id': result.get('id'),
+        'library_id': None,
+        'year': int(date_field[:4]) if date_field[:4].isdigit() else None,
+        'source': 'tmdb',
+        'score': 0.0
+    }
@@ -0,0 +1,75 @@
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from fuzzywuzzy import fuzz
+
+try:
+    # Installed along with python-Levenshtein; scores whole query x choice matrices in C
+    from rapidfuzz import fuzz as rapid_fuzz, process
+except ImportError:  # rapidfuzz is optional; the NumPy prefilter below is used instead
+    process = None
+
+CHAR_BINS = 128  # characters are counted in ord(c) % CHAR_BINS bins
+MAX_MATRIX_CELLS = 4000000  # queries are scored in chunks so the score matrix stays ~16 MB
+
+class TitleMatcher:
+    """Score many titles against a fixed list of choices at once.
+
+    Scores are fuzz.ratio values (0-100). With rapidfuzz the full score
+    matrix is computed by process.cdist. Without it, character-count vectors
+    give an upper bound of every ratio in one NumPy pass, and fuzz.ratio only
+    runs on the choices whose bound clears the threshold.
+    """
+
+    def __init__(self, choices: Sequence[str]):
+        self.choices = list(choices)
+        if process is None:
+            self._counts = _char_counts(self.choices)
+            self._lengths = np.array([len(c) for c in self.choices], dtype=np.int32)
+
+    def best_matches(self, queries: Sequence[str], threshold: float = 85) -> List[Optional[Tuple[int, float]]]:
+        """For each query, (choice index, score) of its best match scoring above threshold, or None"""
+        if not queries or not self.choices:
+            return [None] * len(queries)
+        if process is not None:
+            return self._best_matches_cdist(queries, threshold)
+        return [self._best_match_filtered(query, threshold) for query in queries]
+
+    def _best_matches_cdist(self, queries: Sequence[str], threshold: float):
+        matches = []
+        chunk_size = max(1, MAX_MATRIX_CELLS // len(self.choices))
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            scores = process.cdist(chunk, self.choices, scorer=rapid_fuzz.ratio,
+                                   score_cutoff=threshold, dtype=np.float32, workers=-1)
+            best = scores.argmax(axis=1)
+            best_scores = scores[np.arange(len(chunk)), best]
+            # fuzz.ratio rounds to a whole number; round rapidfuzz's score likewise so both paths agree
+            matches.extend(
+                (int(index), float(round(score))) if round(score) > threshold else None
+                for index, score in zip(best, best_scores)
+            )
+        return matches
+
+    def _best_match_filtered(self, query: str, threshold: float):
+        if not query:
+            return None
+        # ratio = 200 * matching chars / total length, and matching chars <= shared character counts
+        shared = np.minimum(self._counts, _char_counts([query])[0]).sum(axis=1)
+        bounds = 200.0 * shared / (self._lengths + len(query))
+        candidates = np.flatnonzero(bounds > threshold)
+
+        best = None
+        for index in candidates[np.argsort(-bounds[candidates])]:
+            if best and bounds[index] <= best[1]:
+                break  # no remaining choice can beat the current best
+            score = fuzz.ratio(query, self.choices[index])
+            if score > threshold and (best is None or score > best[1]):
+                best = (int(index), float(score))
+        return best
+
+def _char_counts(texts: Sequence[str]) -> np.ndarray:
+    counts = np.zeros((len(texts), CHAR_BINS), dtype=np.int16)
+    for row, text in enumerate(texts):
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32) % CHAR_BINS
+        np.add.at(counts[row], codes, 1)
+    return counts
@@ -1,127 +1,341 @@
 import requests
 import json
-from typing import Dict, List, Optional
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Union
 from datetime import datetime
-from config import get_tmdb_api_key
+from urllib.parse import urlencode
+from config import (
+    get_tmdb_api_key, get_tmdb_base_url, TMDB_TIMEOUT, TMDB_MAX_RETRIES,
+    TMDB_CACHE_TTL, TMDB_CACHE_MAX_ENTRIES, LOG_API_REQUESTS, API_METRICS_FILE
+)
+from api_metrics import ApiMetrics, endpoint_name
+from tmdb_records import TitleDetails, decode_json, parse_title_details, parse_list_page
+from local_catalog import PAGE_SIZE, open_default_catalog
+from response_cache import MemoryResponseCache
+
+# TMDB refuses to serve list pages beyond this
+MAX_LIST_PAGES = 500
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 10  # seconds
+
+class _InFlightRequest:
+    """A request that is currently being fetched, shared by all callers asking for it"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
 
 class TMDBApi:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None, cache=None,
+                 metrics_file: str = API_METRICS_FILE, catalog=None):
         self.api_key = api_key or get_tmdb_api_key()
-        self.base_url = "https://api.themoviedb.org/3"
+        # Offline catalog (local_catalog.LocalCatalog) answering search, discover and
+        # trending-like queries locally; TMDB is only asked when it has nothing
+        self.catalog = catalog if catalog is not None else open_default_catalog()
+        self.base_url = (base_url or get_tmdb_base_url()).rstrip("/")
         self.image_base_url = "https://image.tmdb.org/t/p/w500"
+        self.cache = cache if cache is not None else MemoryResponseCache(TMDB_CACHE_TTL, TMDB_CACHE_MAX_ENTRIES)
+        self._metrics = ApiMetrics()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self._prefetch_executor = None
+        
+        if metrics_file:
+            atexit.register(self._metrics.dump, metrics_file)
+    
+    def metrics(self) -> Dict:
+        """Snapshot of per-endpoint call counts, latency percentiles, bytes, errors, retries and cache hits"""
+        return self._metrics.snapshot()
+    
+    def reset_metrics(self):
+        self._metrics.reset()
+    
+    def _get_json(self, path: str, params: Dict = None, parse: Callable = None):
+        """GET an endpoint and decode the JSON body.
+        
+        If parse is given it is applied to the decoded body before caching,
+        so only its (compact) result is kept, never the raw payload.
+        
+        Responses are served from the response cache while fresh. Otherwise
+        concurrent callers asking for the same path and params share a single
+        outstanding HTTP request (single-flight): the first caller performs it
+        and every other caller waits for and receives the same result, or the
+        same exception. Raises requests.RequestException on failure.
+        """
+        params = {"language": "en-US", **(params or {})}
+        key = f"{path}?{urlencode(sorted((k, str(v)) for k, v in params.items()))}"
+        endpoint = endpoint_name(path)
+        
+        cached = self.cache.get(key)
+        self._metrics.record_cache(endpoint, hit=cached is not None)
+        if cached is not None:
+            return cached
+        
+        with self._in_flight_lock:
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightRequest()
+                self._in_flight[key] = call
+        
+        if not is_leader:
+            self._metrics.record_coalesced(endpoint)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = self._fetch(path, dict(params, api_key=self.api_key), parse)
+            self.cache.set(key, call.result)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            call.done.set()
+    
+    def _fetch(self, path: str, query: Dict, parse: Callable = None):
+        """Perform the HTTP request, retrying rate-limited and transient server errors"""
+        endpoint = endpoint_name(path)
+        
+        for attempt in range(TMDB_MAX_RETRIES + 1):
+            started = time.perf_counter()
+            try:
+                response = requests.get(f"{self.base_url}{path}", params=query, timeout=TMDB_TIMEOUT)
+            except requests.RequestException:
+                self._metrics.record_request(endpoint, time.perf_counter() - started, 0)
+                raise
+            elapsed = time.perf_counter() - started
+            
+            self._metrics.record_request(endpoint, elapsed, len(response.content), response.status_code)
+            if LOG_API_REQUESTS:
+                print(f"TMDB GET {endpoint} -> {response.status_code} "
+                      f"in {elapsed * 1000:.0f} ms ({len(response.content)} bytes)")
+            
+            if response.status_code not in RETRY_STATUS_CODES or attempt == TMDB_MAX_RETRIES:
+                break
+            self._metrics.record_retry(endpoint)
+            time.sleep(self._retry_delay(response, attempt))
+        
+        response.raise_for_status()
+        try:
+            data = decode_json(response.content)
+        except ValueError as e:
+            # A proxy or captive portal page, or a cut-off body; handled like any other failed request
+            raise requests.exceptions.InvalidJSONError(f"Invalid JSON from {endpoint}: {e}", response=response) from e
+        return parse(data) if parse else data
+    
+    def _retry_delay(self, response, attempt: int) -> float:
+        """Seconds to wait before retrying: Retry-After if TMDB sent one, else exponential backoff"""
+        retry_after = response.headers.get("Retry-After")
+        try:
+            return min(float(retry_after), MAX_RETRY_AFTER)
+        except (TypeError, ValueError):
+            return 0.5 * (2 ** attempt)
+    
+    def _iter_pages(self, path: str, params: Dict = None, max_pages: int = None,
+                    prefetch: bool = False) -> Iterator[Dict]:
+        """Lazily yield results from a paginated list endpoint.
+        
+        A page is only requested once the consumer has pulled every item of
+        the previous one, so stopping early saves the remaining requests.
+        With prefetch, the next page is fetched in the background while the
+        current one is being consumed. Errors end the iteration.
+        """
+        if not self.api_key:
+            return
+        
+        params = dict(params or {})
+        page = 1
+        next_page = None
+        
+        while True:
+            try:
+                if next_page is not None:
+                    data = next_page.result()
+                else:
+                    data = self._get_json(path, dict(params, page=page), parse_list_page)
+            except requests.RequestException as e:
+                print(f"TMDB API error: {e}")
+                return
+            
+            results = data.get("results", [])
+            total_pages = min(data.get("total_pages") or 1, MAX_LIST_PAGES)
+            is_last = not results or page >= total_pages or (max_pages and page >= max_pages)
+            
+            next_page = None
+            if prefetch and not is_last:
+                if self._prefetch_executor is None:
+                    self._prefetch_executor = ThreadPoolExecutor(max_workers=2)
+                next_page = self._prefetch_executor.submit(
+                    self._get_json, path, dict(params, page=page + 1), parse_list_page
+                )
+            
+            yield from results
+            
+            if is_last:
+                return
+            page += 1
+    
+    def _use_catalog(self) -> bool:
+        return self.catalog is not None and self.catalog.has_data()
     
-    def search_content(self, query: str, content_type: str = "multi") -> List[Dict]:
+    def _catalog_page(self, fetch_page: Callable[[int], List[Dict]], page: int) -> Optional[List[Dict]]:
+        """A page of a local catalog query; None if the catalog has nothing for the query, so TMDB answers it.
+        
+        A catalog built from the ID exports alone has no genres or
+        descriptions, so many queries only TMDB can answer.
+        """
+        if not self._use_catalog():
+            return None
+        results = fetch_page(page)
+        if results or (page > 1 and fetch_page(1)):
+            return results
+        return None
+    
+    def _iter_catalog(self, fetch_page: Callable[[int], List[Dict]], max_pages: int = None,
+                      first_page: List[Dict] = None) -> Iterator[Dict]:
+        """Page through a local catalog query the same way _iter_pages pages through TMDB"""
+        page = 1
+        while True:
+            results = first_page if page == 1 and first_page is not None else fetch_page(page)
+            yield from results
+            if len(results) < PAGE_SIZE or (max_pages and page >= max_pages):
+                return
+            page += 1
+    
+    def search_content(self, query: str, content_type: str = "multi", page: int = 1) -> List[Dict]:
         """Search for movies or TV shows"""
+        results = self._catalog_page(lambda page: self.catalog.search(query, content_type, page), page)
+        if results is not None:
+            return results
+        
         if not self.api_key:
             return []
         
-        url = f"{self.base_url}/search/{content_type}"
-        params = {
-            "api_key": self.api_key,
-            "query": query,
-            "language": "en-US"
-        }
-        
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get_json(f"/search/{content_type}", {"query": query, "page": page}, parse_list_page)
             return data.get("results", [])
         except requests.RequestException as e:
             print(f"TMDB API error: {e}")
             return []
     
-    def get_movie_details(self, movie_id: int) -> Optional[Dict]:
+    def get_movie_details(self, movie_id: int) -> Optional[TitleDetails]:
         """Get detailed information about a movie"""
         if not self.api_key:
             return None
         
-        url = f"{self.base_url}/movie/{movie_id}"
-        params = {
-            "api_key": self.api_key,
-            "language": "en-US",
-            "append_to_response": "credits"
-        }
-        
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(f"/movie/{movie_id}", {"append_to_response": "credits"},
+                                  lambda data: parse_title_details(data, "movie"))
         except requests.RequestException as e:
             print(f"TMDB API error: {e}")
             return None
     
-    def get_tv_details(self, tv_id: int) -> Optional[Dict]:
+    def get_tv_details(self, tv_id: int) -> Optional[TitleDetails]:
         """Get detailed information about a TV show"""
         if not self.api_key:
             return None
         
-        url = f"{self.base_url}/tv/{tv_id}"
-        params = {
-            "api_key": self.api_key,
-            "language": "en-US",
-            "append_to_response": "credits"
-        }
-        
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(f"/tv/{tv_id}", {"append_to_response": "credits"},
+                                  lambda data: parse_title_details(data, "tv"))
         except requests.RequestException as e:
             print(f"TMDB API error: {e}")
             return None
     
-    def get_recommendations(self, content_id: int, content_type: str) -> List[Dict]:
+    def iter_search(self, query: str, content_type: str = "multi", max_pages: int = None,
+                    prefetch: bool = False) -> Iterator[Dict]:
+        """Lazily iterate over all pages of search results"""
+        fetch_page = lambda page: self.catalog.search(query, content_type, page)
+        first_page = self._catalog_page(fetch_page, 1)
+        if first_page is not None:
+            return self._iter_catalog(fetch_page, max_pages, first_page)
+        return self._iter_pages(f"/search/{content_type}", {"query": query}, max_pages, prefetch)
+    
+    def get_recommendations(self, content_id: int, content_type: str, page: int = 1) -> List[Dict]:
         """Get recommendations based on a specific movie or TV show"""
         if not self.api_key:
             return []
         
-        url = f"{self.base_url}/{content_type}/{content_id}/recommendations"
-        params = {
-            "api_key": self.api_key,
-            "language": "en-US"
-        }
-        
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get_json(f"/{content_type}/{content_id}/recommendations", {"page": page},
+                                  parse_list_page)
             return data.get("results", [])
         except requests.RequestException as e:
             print(f"TMDB API error: {e}")
             return []
     
-    def get_trending(self, media_type: str = "all", time_window: str = "week") -> List[Dict]:
+    def iter_recommendations(self, content_id: int, content_type: str, max_pages: int = None,
+                             prefetch: bool = False) -> Iterator[Dict]:
+        """Lazily iterate over all pages of recommendations for a title"""
+        return self._iter_pages(f"/{content_type}/{content_id}/recommendations", None, max_pages, prefetch)
+    
+    def get_trending(self, media_type: str = "all", time_window: str = "week", page: int = 1) -> List[Dict]:
         """Get trending movies and TV shows"""
+        results = self._catalog_page(lambda page: self.catalog.popular(media_type, page), page)
+        if results is not None:
+            return results
+        
         if not self.api_key:
             return []
         
-        url = f"{self.base_url}/trending/{media_type}/{time_window}"
-        params = {
-            "api_key": self.api_key,
-            "language": "en-US"
-        }
-        
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get_json(f"/trending/{media_type}/{time_window}", {"page": page}, parse_list_page)
             return data.get("results", [])
         except requests.RequestException as e:
             print(f"TMDB API error: {e}")
             return []
     
-    def get_discover(self, content_type: str, genres: List[int] = None, year: int = None) -> List[Dict]:
+    def iter_trending(self, media_type: str = "all", time_window: str = "week", max_pages: int = None,
+                      prefetch: bool = False) -> Iterator[Dict]:
+        """Lazily iterate over all pages of trending content"""
+        fetch_page = lambda page: self.catalog.popular(media_type, page)
+        first_page = self._catalog_page(fetch_page, 1)
+        if first_page is not None:
+            return self._iter_catalog(fetch_page, max_pages, first_page)
+        return self._iter_pages(f"/trending/{media_type}/{time_window}", None, max_pages, prefetch)
+    
+    def get_discover(self, content_type: str, genres: List[int] = None, year: int = None,
+                     page: int = 1) -> List[Dict]:
         """Discover movies or TV shows based on criteria"""
+        results = self._catalog_page(lambda page: self.catalog.discover(content_type, genres, year, page), page)
+        if results is not None:
+            return results
+        
         if not self.api_key:
             return []
         
-        url = f"{self.base_url}/discover/{content_type}"
-        params = {
-            "api_key": self.api_key,
-            "language": "en-US",
-            "sort_by": "popularity.desc"
-        }
+        params = self._discover_params(content_type, genres, year)
+        params["page"] = page
+        
+        try:
+            data = self._get_json(f"/discover/{content_type}", params, parse_list_page)
+            return data.get("results", [])
+        except requests.RequestException as e:
+            print(f"TMDB API error: {e}")
+            return []
+    
+    def iter_discover(self, content_type: str, genres: List[int] = None, year: int = None,
+                      max_pages: int = None, prefetch: bool = False) -> Iterator[Dict]:
+        """Lazily iterate over all pages of discover results"""
+        fetch_page = lambda page: self.catalog.discover(content_type, genres, year, page)
+        first_page = self._catalog_page(fetch_page, 1)
+        if first_page is not None:
+            return self._iter_catalog(fetch_page, max_pages, first_page)
+        params = self._discover_params(content_type, genres, year)
+        return self._iter_pages(f"/discover/{content_type}", params, max_pages, prefetch)
+    
+    def _discover_params(self, content_type: str, genres: List[int] = None, year: int = None) -> Dict:
+        params = {"sort_by": "popularity.desc"}
         
         if genres:
             params["with_genres"] = ",".join(map(str, genres))
@@ -131,18 +345,25 @@ class TMDBApi:
             else:
                 params["first_air_date_year"] = year
         
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("results", [])
-        except requests.RequestException as e:
-            print(f"TMDB API error: {e}")
-            return []
+        return params
     
-    def format_content_data(self, tmdb_data: Dict, content_type: str) -> Dict:
-        """Format TMDB data for our database"""
-        if content_type == "movie":
+    def format_content_data(self, tmdb_data: Union[TitleDetails, Dict], content_type: str) -> Dict:
+        """Format TMDB data (a TitleDetails record or a raw details payload) for our database"""
+        if isinstance(tmdb_data, TitleDetails):
+            return {
+                "title": tmdb_data.title,
+                "type": tmdb_data.media_type,
+                "genre": ", ".join(tmdb_data.genres),
+                "language": tmdb_data.language,
+                "year": tmdb_data.year,
+                "duration": tmdb_data.duration,
+                "director": ", ".join(tmdb_data.directors),
+                "actors": ", ".join(tmdb_data.actors),
+                "tmdb_id": tmdb_data.id,
+                "poster_url": f"{self.image_base_url}{tmdb_data.poster_path}" if tmdb_data.poster_path else None,
+                "overview": tmdb_data.overview
+            }
+        elif content_type == "movie":
             return {
                 "title": tmdb_data.get("title", ""),
                 "type": "movie",
@@ -190,6 +411,11 @@ class TMDBApi:
     
     def get_genre_mapping(self) -> Dict[int, str]:
         """Get genre ID to name mapping"""
+        if self._use_catalog():
+            genre_map = self.catalog.genre_mapping()
+            if genre_map:
+                return genre_map
+        
         if not self.api_key:
             return {}
         
@@ -197,17 +423,10 @@ class TMDBApi:
         
         # Get movie genres
         try:
-            url = f"{self.base_url}/genre/movie/list"
-            params = {"api_key": self.api_key, "language": "en-US"}
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            movie_genres = response.json().get("genres", [])
+            movie_genres = self._get_json("/genre/movie/list").get("genres", [])
             
             # Get TV genres
-            url = f"{self.base_url}/genre/tv/list"
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            tv_genres = response.json().get("genres", [])
+            tv_genres = self._get_json("/genre/tv/list").get("genres", [])
             
             # Combine both
             all_genres = movie_genres + tv_genres
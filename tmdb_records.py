@@ -0,0 +1,114 @@
+import json
+from typing import Dict, Optional, Tuple
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; the standard library decoder works, just slower
+    orjson = None
+    _loads = json.loads
+
+# Keys of list results (search, discover, trending, recommendations) that the app reads
+LIST_RESULT_FIELDS = (
+    "id", "media_type", "title", "name", "genre_ids", "original_language", "overview",
+    "poster_path", "release_date", "first_air_date", "popularity", "vote_average"
+)
+
+MAX_DIRECTORS = 3
+MAX_ACTORS = 5
+
+def decode_json(body: bytes):
+    """Decode a response body, using orjson when it is installed"""
+    return _loads(body)
+
+class TitleDetails:
+    """The fields of a movie/TV details payload that the app uses.
+
+    Built right after decoding so the full payload - including the complete
+    cast and crew lists - can be dropped immediately.
+    """
+    __slots__ = (
+        "id", "media_type", "title", "genre_ids", "genres", "language", "year", "duration",
+        "directors", "actors", "poster_path", "overview", "popularity", "vote_average"
+    )
+
+    def __init__(self, id: int, media_type: str, title: str, genre_ids: Tuple[int, ...] = (),
+                 genres: Tuple[str, ...] = (), language: str = "", year: Optional[int] = None,
+                 duration: Optional[int] = None, directors: Tuple[str, ...] = (),
+                 actors: Tuple[str, ...] = (), poster_path: Optional[str] = None, overview: str = "",
+                 popularity: float = 0.0, vote_average: float = 0.0):
+        self.id = id
+        self.media_type = media_type
+        self.title = title
+        self.genre_ids = genre_ids
+        self.genres = genres
+        self.language = language
+        self.year = year
+        self.duration = duration
+        self.directors = directors
+        self.actors = actors
+        self.poster_path = poster_path
+        self.overview = overview
+        self.popularity = popularity
+        self.vote_average = vote_average
+
+    def __repr__(self):
+        return f"TitleDetails({self.media_type}:{self.id} {self.title!r})"
+
+def parse_title_details(payload: Dict, content_type: str) -> TitleDetails:
+    """Project a /movie/{id} or /tv/{id} payload (with credits appended) onto a TitleDetails"""
+    credits = payload.get("credits") or {}
+    genres = payload.get("genres") or []
+
+    if content_type == "movie":
+        title = payload.get("title", "")
+        date_field = payload.get("release_date")
+        duration = payload.get("runtime")
+        directors = []
+        for person in credits.get("crew") or []:
+            if person.get("job") == "Director":
+                directors.append(person["name"])
+                if len(directors) == MAX_DIRECTORS:
+                    break
+    else:
+        title = payload.get("name", "")
+        date_field = payload.get("first_air_date")
+        run_times = payload.get("episode_run_time")
+        duration = run_times[0] if run_times else None
+        directors = [creator["name"] for creator in (payload.get("created_by") or [])[:MAX_DIRECTORS]]
+
+    return TitleDetails(
+        id=payload.get("id"),
+        media_type="movie" if content_type == "movie" else "tv",
+        title=title,
+        genre_ids=tuple(g["id"] for g in genres if "id" in g),
+        genres=tuple(g["name"] for g in genres),
+        language=payload.get("original_language", ""),
+        year=_parse_year(date_field),
+        duration=duration,
+        directors=tuple(directors),
+        actors=tuple(actor["name"] for actor in (credits.get("cast") or [])[:MAX_ACTORS]),
+        poster_path=payload.get("poster_path"),
+        overview=payload.get("overview", ""),
+        popularity=payload.get("popularity") or 0.0,
+        vote_average=payload.get("vote_average") or 0.0
+    )
+
+def parse_list_page(payload: Dict) -> Dict:
+    """Keep only the paging info and the fields the app reads from each list result"""
+    return {
+        "page": payload.get("page", 1),
+        "total_pages": payload.get("total_pages", 1),
+        "results": [
+            {key: result[key] for key in LIST_RESULT_FIELDS if key in result}
+            for result in payload.get("results") or []
+        ]
+    }
+
+def _parse_year(date_field: Optional[str]) -> Optional[int]:
+    if not date_field:
+        return None
+    try:
+        return int(date_field[:4])
+    except ValueError:
+        return None
@@ -0,0 +1,72 @@
+from typing import Dict, List, Optional
+from title_matching import TitleMatcher
+
+FUZZY_THRESHOLD = 85  # titles scoring above this fuzz.ratio count as the same title
+
+class WatchedIndex:
+    """Everything in the library, indexed for fast "is this already in the list?" checks.
+
+    TMDB ids and exact titles are set lookups; the remaining titles are
+    fuzzy-matched against the whole library in one batch by TitleMatcher.
+    """
+
+    def __init__(self, content: List[Dict], version: Optional[str] = None):
+        self.version = version
+        self.tmdb_ids = set()
+        self.titles = set()
+        self._fuzzy_matches = {}  # the same candidates turn up in several recommendation sources
+
+        for item in content:
+            if item.get('tmdb_id'):
+                self.tmdb_ids.add(item['tmdb_id'])
+            title = (item.get('title') or '').lower()
+            if title:
+                self.titles.add(title)
+
+        self._title_list = sorted(self.titles)
+        self._matcher = TitleMatcher(self._title_list)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def state(self) -> Dict:
+        """The index as plain lists (JSON-safe), to rebuild it with from_state()"""
+        return {'tmdb_ids': sorted(self.tmdb_ids), 'titles': self._title_list}
+
+    @classmethod
+    def from_state(cls, state: Dict, version: Optional[str] = None) -> 'WatchedIndex':
+        """Rebuild an index saved with state(); ValueError if state isn't one"""
+        tmdb_ids, titles = state.get('tmdb_ids'), state.get('titles')
+        if (not isinstance(tmdb_ids, list) or not isinstance(titles, list)
+                or not all(isinstance(tmdb_id, int) for tmdb_id in tmdb_ids)
+                or not all(isinstance(title, str) for title in titles)):
+            raise ValueError("not a watched index state")
+        return cls([{'tmdb_id': tmdb_id} for tmdb_id in tmdb_ids] + [{'title': title} for title in titles], version)
+
+    def contains(self, tmdb_id: Optional[int], title: str) -> bool:
+        return self.contains_many([(tmdb_id, title)])[0]
+
+    def contains_many(self, items: List[tuple]) -> List[bool]:
+        """contains() for a list of (tmdb_id, title) pairs, fuzzy-matching the unknown titles in one batch"""
+        matches = self.find_titles([title for _, title in items])
+        return [
+            bool(tmdb_id and tmdb_id in self.tmdb_ids) or match is not None
+            for (tmdb_id, _), match in zip(items, matches)
+        ]
+
+    def find_title(self, title: str) -> Optional[str]:
+        """The library title that fuzzy-matches title (ratio > 85), if any"""
+        return self.find_titles([title])[0]
+
+    def find_titles(self, titles: List[str]) -> List[Optional[str]]:
+        titles = [(title or '').lower() for title in titles]
+        pending = list({
+            t for t in titles if t and t not in self.titles and t not in self._fuzzy_matches
+        })
+        for title, match in zip(pending, self._matcher.best_matches(pending, FUZZY_THRESHOLD)):
+            self._fuzzy_matches[title] = self._title_list[match[0]] if match else None
+
+        return [
+            title if title in self.titles else self._fuzzy_matches.get(title)
+            for title in titles
+        ]